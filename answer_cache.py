@@ -0,0 +1,93 @@
+"""
+Persistent Answer Cache for DocSense
+
+Stores completed answers on disk keyed by a digest of (documents, query) so
+that repeated questions are answered without the LLM across sessions and
+process restarts.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_CACHE_PATH = os.path.join(".cache", "answers.sqlite")
+DEFAULT_MAX_ENTRIES = 2048
+
+
+class AnswerCache:
+    """
+    SQLite-backed LRU map of cache key -> JSON-serializable value.
+
+    Each call opens its own connection, so one instance can be shared across
+    threads and sessions.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers "
+                "(key BLOB PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """
+        Look up a value, marking it recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The stored value, or None if not found
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key: bytes, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used past max_entries.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value (tuples come back as lists)
+        """
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Answer not cached on disk, not serializable: {str(e)}")
+            return
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, accessed) VALUES (?, ?, ?)",
+                (key, payload, time.time())
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE key NOT IN "
+                "(SELECT key FROM answers ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
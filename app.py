@@ -9,16 +9,27 @@ Author: AI Assistant
 Last Updated: October 2025
 """
 
+import importlib
+import json
 import logging
 import os
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
-import traceback
 
 import streamlit as st
 from dotenv import load_dotenv
 
+# Optional faster JSON for the persisted session state (stdlib json otherwise)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
@@ -29,25 +40,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Import mode modules
-try:
-    from chat_mode import get_chat_mode, ChatModeError
-    from document_mode import get_document_mode, DocumentModeError
-    from ingestion import ingest_documents, get_ingestion_stats, clear_vector_store, DocumentIngestionError, compute_file_hash
-    from chromadb_manager import get_chromadb_manager
-    CHROMADB_MANAGER_AVAILABLE = True
-except ImportError as e:
-    if "chromadb_manager" not in str(e):
-        st.error(f"Failed to import required modules: {str(e)}")
-        st.stop()
-    CHROMADB_MANAGER_AVAILABLE = False
-    logger.warning("ChromaDB manager not available")
+# Mode modules (chat_mode, document_mode, ingestion, chromadb_manager) pull in
+# the OpenAI/ChromaDB/LangChain stacks, so they are imported on first use via
+# _lazy_import() rather than on every cold start.
 
 # Constants
 MAX_FILES = 5
 MAX_TOTAL_SIZE_MB = 50
 MAX_TOTAL_SIZE_BYTES = MAX_TOTAL_SIZE_MB * 1024 * 1024
 SUPPORTED_FORMATS = ["pdf", "txt", "xlsx", "xls", "csv", "xlsm"]
+MAX_RENDERED_HISTORY = 50  # Older messages render only on request
+SOURCES_PER_PAGE = 5  # Source citations shown per expander page
+SOURCE_PREVIEW_CHARS = 400
+MAX_PROCESSED_FILES = 32  # LRU cap for remembered upload hashes
+STREAM_FLUSH_CHARS = 64  # Repaint once this many characters are pending...
+STREAM_FLUSH_INTERVAL = 0.05  # ...or this many seconds have passed
+
+# OPTIMIZATION: Processed-file hashes persisted next to the ChromaDB store
+_HASH_CACHE_PATH = os.path.join(".chromadb", "hash_cache.json")
+_HASH_CACHE_LOCK = threading.Lock()
+
+MODE_OPTIONS = {
+    '🧠 Chat Mode': 'chat',
+    '📚 Document Mode': 'document'
+}
+
+# Static HTML blocks, built once instead of on every render
+_CHAT_MODE_HTML = """
+<div class="mode-indicator chat-mode">
+    🧠 <strong>Chat Mode Active</strong><br>
+    <span style="font-size: 0.9rem;">General AI assistant - No document retrieval</span>
+</div>
+"""
+
+_DOC_MODE_HTML = """
+<div class="mode-indicator doc-mode">
+    📚 <strong>Document Mode Active</strong><br>
+    <span style="font-size: 0.9rem;">Strict RAG - Answers only from your uploaded documents</span>
+</div>
+"""
+
+_NO_FILES_HTML = f"""
+<div class="no-files-message">
+    <p><strong>📄 NO DOCUMENTS UPLOADED</strong></p>
+    <div style="margin-top: 1.2rem; font-size: 1.1rem;">
+        Upload PDF or TXT files using the sidebar to begin!
+    </div>
+    <div style="margin-top: 1rem; font-size: 0.95rem; opacity: 0.95;">
+        📁 Maximum: {MAX_FILES} files, {MAX_TOTAL_SIZE_MB}MB total<br>
+        ✨ Documents process automatically on upload
+    </div>
+    <div style="margin-top: 1.5rem; font-size: 1rem; font-weight: 600;">
+        👈 Use the sidebar to get started!
+    </div>
+</div>
+"""
 
 # Page configuration
 st.set_page_config(
@@ -58,154 +105,102 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        color: #1f77b4;
-        font-size: 2.8rem;
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-        padding: 1rem;
-        background: linear-gradient(90deg, #f0f2f6, #ffffff);
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .mode-indicator {
-        text-align: center;
-        padding: 1rem;
-        margin: 1rem 0;
-        border-radius: 12px;
-        font-size: 1.1rem;
-        font-weight: 600;
-    }
-    
-    .chat-mode {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-    }
-    
-    .doc-mode {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        color: white;
-    }
-    
-    .upload-info {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 2.5rem;
-        border-radius: 16px;
-        text-align: center;
-        margin: 3rem auto;
-        max-width: 600px;
-        box-shadow: 0 10px 30px rgba(102, 126, 234, 0.3);
-        font-size: 1.1rem;
-        line-height: 1.8;
-    }
-    
-    /* ENHANCED: No files uploaded message - highly visible in both themes */
-    .no-files-message {
-        background: linear-gradient(135deg, #FF6B6B 0%, #FF8E53 100%);
-        color: white !important;
-        padding: 2rem 2.5rem;
-        border-radius: 16px;
-        text-align: center;
-        margin: 2rem auto;
-        max-width: 650px;
-        box-shadow: 0 10px 30px rgba(255, 107, 107, 0.4);
-        font-size: 1.3rem;
-        font-weight: 700;
-        line-height: 1.8;
-        border: 3px solid rgba(255, 255, 255, 0.3);
-    }
-    
-    .no-files-message p {
-        color: white !important;
-        margin: 0;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    /* ADDED: Status indicators for visual feedback */
-    .status-ready {
-        background: #10b981;
-        color: white;
-        padding: 0.5rem 1rem;
-        border-radius: 8px;
-        display: inline-block;
-        font-weight: 600;
-        margin: 0.5rem 0;
-    }
-    
-    .status-processing {
-        background: #f59e0b;
-        color: white;
-        padding: 0.5rem 1rem;
-        border-radius: 8px;
-        display: inline-block;
-        font-weight: 600;
-        margin: 0.5rem 0;
-        animation: pulse 2s infinite;
-    }
-    
-    .status-error {
-        background: #ef4444;
-        color: white;
-        padding: 0.5rem 1rem;
-        border-radius: 8px;
-        display: inline-block;
-        font-weight: 600;
-        margin: 0.5rem 0;
-    }
-    
-    @keyframes pulse {
-        0%, 100% { opacity: 1; }
-        50% { opacity: 0.7; }
-    }
-    
-    .upload-info strong {
-        display: block;
-        font-size: 1.5rem;
-        margin-bottom: 1rem;
-        font-weight: 600;
-    }
-    
-    .success-container {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #28a745;
-        margin: 1rem 0;
-    }
-    
-    .error-container {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #dc3545;
-        margin: 1rem 0;
-    }
-    
-    .warning-container {
-        background-color: #fff3cd;
-        color: #856404;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #ffc107;
-        margin: 1rem 0;
-    }
-    
-    /* Dark mode support */
-    @media (prefers-color-scheme: dark) {
-        .upload-info {
-            background: linear-gradient(135deg, #4a5568 0%, #2d3748 100%);
-            box-shadow: 0 10px 30px rgba(0, 0, 0, 0.5);
-        }
+_CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+
+
+@st.cache_resource(show_spinner=False)
+def load_custom_css() -> str:
+    """
+    Read static/style.css once per server process.
+
+    The style block itself is still emitted on every pass because Streamlit
+    removes elements that a rerun does not re-emit; an unchanged element is
+    not re-rendered by the frontend.
+    """
+    with open(_CSS_PATH, 'r', encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+st.markdown(load_custom_css(), unsafe_allow_html=True)
+
+
+def _lazy_import(module_name: str):
+    """Import a mode module on first use (later calls hit sys.modules)."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        st.error(f"Failed to import required modules: {str(e)}")
+        st.stop()
+
+
+@st.cache_resource(show_spinner=False)
+def _chat_mode():
+    """Process-wide ChatMode instance (holds the OpenAI client)."""
+    return _lazy_import("chat_mode").get_chat_mode()
+
+
+@st.cache_resource(show_spinner=False)
+def _doc_mode():
+    """Process-wide DocumentMode instance (holds the OpenAI client and collection)."""
+    return _lazy_import("document_mode").get_document_mode()
+
+
+def _load_chromadb_manager():
+    """Import the optional ChromaDB manager module, or return None."""
+    try:
+        return importlib.import_module("chromadb_manager")
+    except ImportError:
+        logger.warning("ChromaDB manager not available")
+        return None
+
+
+def _load_hash_cache() -> Dict[str, Any]:
+    """Load the persisted processed-file hash cache, or an empty one."""
+    with _HASH_CACHE_LOCK:
+        try:
+            if ORJSON_AVAILABLE:
+                with open(_HASH_CACHE_PATH, 'rb') as f:
+                    data = orjson.loads(f.read())
+            else:
+                with open(_HASH_CACHE_PATH, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable hash cache: {str(e)}")
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_hash_cache():
+    """Atomically persist processed-file hashes so reuse survives restarts."""
+    payload = {
+        # A plain dict keeps the LRU order: orjson ignores OrderedDict.move_to_end
+        "processed_files": dict(st.session_state.processed_files),
+        "current_doc_hash": st.session_state.current_doc_hash
     }
-</style>
-""", unsafe_allow_html=True)
+    with _HASH_CACHE_LOCK:
+        try:
+            os.makedirs(os.path.dirname(_HASH_CACHE_PATH), exist_ok=True)
+            tmp_path = f"{_HASH_CACHE_PATH}.tmp"
+            if ORJSON_AVAILABLE:
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(payload))
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(payload, f)
+            os.replace(tmp_path, _HASH_CACHE_PATH)
+        except OSError as e:
+            logger.warning(f"Failed to persist hash cache: {str(e)}")
+
+
+def _remember_processed_files(doc_hash: str, filenames: str):
+    """Record a processed upload set, evicting the least recently used entries."""
+    processed_files = st.session_state.processed_files
+    processed_files[doc_hash] = filenames
+    processed_files.move_to_end(doc_hash)
+    while len(processed_files) > MAX_PROCESSED_FILES:
+        processed_files.popitem(last=False)
 
 
 def initialize_session_state():
@@ -222,13 +217,22 @@ def initialize_session_state():
     if 'doc_mode_history' not in st.session_state:
         st.session_state.doc_mode_history = []
     
+    # OPTIMIZATION: Restore processed-file hashes persisted by earlier sessions
+    needs_restore = 'current_doc_hash' not in st.session_state or 'processed_files' not in st.session_state
+    hash_cache = _load_hash_cache() if needs_restore else {}
+    
     # Document tracking
     if 'current_doc_hash' not in st.session_state:
-        st.session_state.current_doc_hash = None
+        st.session_state.current_doc_hash = hash_cache.get('current_doc_hash')
     
     # OPTIMIZATION: Track processed files to skip re-embedding
     if 'processed_files' not in st.session_state:
-        st.session_state.processed_files = {}  # {file_hash: filename}
+        # LRU-ordered {file_hash: filenames}, capped at MAX_PROCESSED_FILES
+        st.session_state.processed_files = OrderedDict(hash_cache.get('processed_files', {}))
+    
+    # OPTIMIZATION: Version token for cached ingestion stats
+    if 'stats_version' not in st.session_state:
+        st.session_state.stats_version = 0
     
     # UI preferences
     if 'show_sources' not in st.session_state:
@@ -271,185 +275,219 @@ def validate_environment() -> bool:
 
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format."""
-    if size_bytes == 0:
-        return "0 B"
-    
-    size_names = ["B", "KB", "MB", "GB"]
-    size = size_bytes
-    i = 0
-    
-    while size >= 1024 and i < len(size_names) - 1:
-        size /= 1024.0
-        i += 1
-    
-    return f"{size:.1f} {size_names[i]}"
+    if size_bytes < 1 << 10:
+        return f"{size_bytes} B"
+    if size_bytes < 1 << 20:
+        return f"{size_bytes / (1 << 10):.1f} KB"
+    if size_bytes < 1 << 30:
+        return f"{size_bytes / (1 << 20):.1f} MB"
+    return f"{size_bytes / (1 << 30):.1f} GB"
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _cached_stats(version: int, doc_hash: str) -> Dict[str, Any]:
+    """
+    Short-lived cache around get_ingestion_stats().
+
+    The arguments only act as the cache key: `version` is bumped whenever this
+    session writes or clears the vector store. The cache is process-wide and
+    the store is shared, so the TTL bounds how long other sessions' writes
+    stay invisible.
+    """
+    return _lazy_import("ingestion").get_ingestion_stats()
+
+
+def bump_stats_version():
+    """Invalidate cached ingestion stats after the vector store changes."""
+    st.session_state.stats_version = st.session_state.get('stats_version', 0) + 1
+
+
+def _on_mode_change():
+    """Mode radio callback - updates the mode before the rerun it triggers."""
+    old_mode = st.session_state.mode
+    new_mode = MODE_OPTIONS[st.session_state.mode_radio]
+    st.session_state.mode = new_mode
+    st.session_state.last_mode = old_mode
+    logger.info(f"Mode switched: {old_mode} → {new_mode}")
 
 
 def render_mode_selector():
     """Render mode selection radio buttons."""
     st.markdown("### 🧭 Select Mode")
     
-    mode_options = {
-        '🧠 Chat Mode': 'chat',
-        '📚 Document Mode': 'document'
-    }
-    
-    selected_label = '🧠 Chat Mode' if st.session_state.mode == 'chat' else '📚 Document Mode'
-    
-    mode_selection = st.radio(
+    st.radio(
         "Choose your interaction mode:",
-        options=list(mode_options.keys()),
+        options=list(MODE_OPTIONS.keys()),
         index=0 if st.session_state.mode == 'chat' else 1,
         horizontal=True,
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key="mode_radio",
+        on_change=_on_mode_change
     )
-    
-    # Update mode if changed
-    new_mode = mode_options[mode_selection]
-    if new_mode != st.session_state.mode:
-        old_mode = st.session_state.mode
-        st.session_state.mode = new_mode
-        st.session_state.last_mode = old_mode
-        logger.info(f"Mode switched: {old_mode} → {new_mode}")
-        st.rerun()
 
 
 def render_mode_info():
     """Render information about current mode."""
-    if st.session_state.mode == 'chat':
-        st.markdown("""
-        <div class="mode-indicator chat-mode">
-            🧠 <strong>Chat Mode Active</strong><br>
-            <span style="font-size: 0.9rem;">General AI assistant - No document retrieval</span>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-        <div class="mode-indicator doc-mode">
-            📚 <strong>Document Mode Active</strong><br>
-            <span style="font-size: 0.9rem;">Strict RAG - Answers only from your uploaded documents</span>
-        </div>
-        """, unsafe_allow_html=True)
-
-
+    st.markdown(_CHAT_MODE_HTML if st.session_state.mode == 'chat' else _DOC_MODE_HTML, unsafe_allow_html=True)
+
+
+def _on_rebuild_index():
+    """Rebuild Index button callback - runs before the rerun it triggers."""
+    with st.spinner("Rebuilding..."):
+        manager = _load_chromadb_manager().get_chromadb_manager()
+        manager.rebuild_index()
+    bump_stats_version()
+    st.session_state.current_doc_hash = None
+    st.session_state.processed_files = OrderedDict()
+    _save_hash_cache()
+    st.toast("✅ Rebuilt! Re-upload documents.")
+
+
+def _on_clear_documents():
+    """Clear Documents button callback - runs before the rerun it triggers."""
+    _lazy_import("ingestion").clear_vector_store()
+    bump_stats_version()
+    st.session_state.current_doc_hash = None
+    st.session_state.processed_files = OrderedDict()
+    _save_hash_cache()
+    st.session_state._last_upload_key = None
+    st.session_state.pop('_pending_upload', None)
+    st.session_state.doc_mode_history = []
+    st.toast("Documents cleared!")
+
+
+def _on_clear_chat_history(history_key: str, message: str):
+    """Clear Chat History button callback for either mode."""
+    st.session_state[history_key] = []
+    st.session_state._main_area_dirty = True
+    st.toast(message)
+
+
+@st.fragment
 def render_sidebar():
-    """Render sidebar with mode-specific controls."""
-    with st.sidebar:
-        st.markdown("## ⚙️ Settings")
-        
-        # ENHANCED: Response Detail Level toggle (Brief vs Detailed)
-        st.markdown("### 📝 Response Detail Level")
-        detail_options = {
-            'Brief (Concise)': 'brief',
-            'Detailed (Default)': 'detailed'
-        }
+    """
+    Render sidebar with mode-specific controls.
+    
+    Runs as a fragment inside `with st.sidebar:` so sidebar widgets only rerun
+    the sidebar. Chat submits are full reruns, so the sidebar (Clear buttons,
+    stats) always reflects the current history.
+    """
+    # Uploads and Clear/Rebuild callbacks change what the main area shows;
+    # promote this fragment run to a single full rerun when that happens
+    ingest_pending = st.session_state.get('_ingest_job') is not None
+    if (st.session_state.pop('_main_area_dirty', False)
+            or st.session_state.get('_rendered_stats_version') != st.session_state.stats_version
+            or st.session_state.get('_rendered_ingest_pending') != ingest_pending):
+        st.rerun()
+    
+    st.markdown("## ⚙️ Settings")
+    
+    # ENHANCED: Response Detail Level toggle (Brief vs Detailed)
+    st.markdown("### 📝 Response Detail Level")
+    detail_options = {
+        'Brief (Concise)': 'brief',
+        'Detailed (Default)': 'detailed'
+    }
+    
+    detail_selection = st.radio(
+        "Choose response style:",
+        options=list(detail_options.keys()),
+        index=list(detail_options.values()).index(st.session_state.detail_level),
+        help="Brief: Max 4 sentences | Detailed: Comprehensive research-grade answers (≥2000 tokens)",
+        horizontal=False
+    )
+    st.session_state.detail_level = detail_options[detail_selection]
+    
+    st.markdown("---")
+    
+    # Document Mode specific controls
+    if st.session_state.mode == 'document':
+        st.markdown("## 📁 Document Upload")
         
-        detail_selection = st.radio(
-            "Choose response style:",
-            options=list(detail_options.keys()),
-            index=list(detail_options.values()).index(st.session_state.detail_level),
-            help="Brief: Max 4 sentences | Detailed: Comprehensive research-grade answers (≥2000 tokens)",
-            horizontal=False
+        # AUTO-PROCESSING: File uploader with on_change callback
+        uploaded_files = st.file_uploader(
+            label="Upload Documents (PDF/TXT/Excel/CSV)",
+            type=SUPPORTED_FORMATS,
+            accept_multiple_files=True,
+            help=f"Upload up to {MAX_FILES} files, max {MAX_TOTAL_SIZE_MB}MB total\n\n✨ Documents process automatically on upload!\n\n📊 Supports: PDF, TXT, Excel (.xlsx, .xls), CSV",
+            key="document_uploader",
+            on_change=auto_process_documents  # AUTO-PROCESS ON UPLOAD
         )
-        st.session_state.detail_level = detail_options[detail_selection]
+        
+        # NO PROCESS BUTTON - auto-processing handles it!
+        
+        # Outcome of the last background ingestion (shown once)
+        ingest_message = st.session_state.pop('_ingest_message', None)
+        if ingest_message:
+            level, text = ingest_message
+            (st.success if level == "success" else st.error)(text)
         
         st.markdown("---")
         
-        # Document Mode specific controls
-        if st.session_state.mode == 'document':
-            st.markdown("## 📁 Document Upload")
-            
-            # AUTO-PROCESSING: File uploader with on_change callback
-            uploaded_files = st.file_uploader(
-                label="Upload Documents (PDF/TXT/Excel/CSV)",
-                type=SUPPORTED_FORMATS,
-                accept_multiple_files=True,
-                help=f"Upload up to {MAX_FILES} files, max {MAX_TOTAL_SIZE_MB}MB total\n\n✨ Documents process automatically on upload!\n\n📊 Supports: PDF, TXT, Excel (.xlsx, .xls), CSV",
-                key="document_uploader",
-                on_change=auto_process_documents  # AUTO-PROCESS ON UPLOAD
-            )
-            
-            # NO PROCESS BUTTON - auto-processing handles it!
-            
-            st.markdown("---")
-            
-            # Show document stats
-            st.markdown("## 📊 Document Status")
-            try:
-                stats = get_ingestion_stats()
-                if stats["total_chunks"] > 0:
-                    st.info(f"📄 Files: {stats['total_files']}\n\n🔢 Chunks: {stats['total_chunks']}")
+        # Show document stats
+        st.markdown("## 📊 Document Status")
+        try:
+            stats = _cached_stats(st.session_state.stats_version, st.session_state.current_doc_hash or "")
+            if stats["total_chunks"] > 0:
+                st.info(f"📄 Files: {stats['total_files']}\n\n🔢 Chunks: {stats['total_chunks']}")
+                
+                # Show sources toggle
+                st.session_state.show_sources = st.checkbox(
+                    "Show Source Citations",
+                    value=st.session_state.show_sources,
+                    help="Display document chunks used for answers"
+                )
+                
+                # Database Health Tools
+                chromadb_manager = _load_chromadb_manager()
+                if chromadb_manager is not None:
+                    st.markdown("---")
+                    st.markdown("### 🔧 Database Tools")
                     
-                    # Show sources toggle
-                    st.session_state.show_sources = st.checkbox(
-                        "Show Source Citations",
-                        value=st.session_state.show_sources,
-                        help="Display document chunks used for answers"
-                    )
+                    col1, col2 = st.columns(2)
                     
-                    # Database Health Tools
-                    if CHROMADB_MANAGER_AVAILABLE:
-                        st.markdown("---")
-                        st.markdown("### 🔧 Database Tools")
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            if st.button("🏥 Check Health", help="Verify database integrity"):
-                                manager = get_chromadb_manager()
-                                stats = manager.get_collection_stats()
-                                if stats.get('healthy', False):
-                                    st.success(f"✅ Healthy\n{stats['count']} docs")
-                                else:
-                                    st.warning(f"⚠️ Issues detected\n{stats.get('error', 'Unknown error')}")
-                        
-                        with col2:
-                            if st.button("🔄 Rebuild Index", help="Fix database errors"):
-                                with st.spinner("Rebuilding..."):
-                                    manager = get_chromadb_manager()
-                                    manager.rebuild_index()
-                                    st.success("✅ Rebuilt! Re-upload documents.")
-                                    st.rerun()
+                    with col1:
+                        if st.button("🏥 Check Health", help="Verify database integrity"):
+                            manager = chromadb_manager.get_chromadb_manager()
+                            stats = manager.get_collection_stats()
+                            if stats.get('healthy', False):
+                                st.success(f"✅ Healthy\n{stats['count']} docs")
+                            else:
+                                st.warning(f"⚠️ Issues detected\n{stats.get('error', 'Unknown error')}")
                     
-                    st.markdown("---")
-                    
-                    if st.button("🗑️ Clear Documents", help="Remove all uploaded documents"):
-                        clear_vector_store()
-                        st.session_state.current_doc_hash = None
-                        st.session_state.doc_mode_history = []
-                        st.success("Documents cleared!")
-                        st.rerun()
-                else:
-                    st.warning("⚠️ No documents uploaded yet")
-            except Exception as e:
-                st.error(f"Error loading stats: {str(e)}")
-        
-        else:
-            # Chat Mode info
-            st.markdown("## 💬 Chat Mode")
-            st.info("""
-            **Chat Mode** provides general AI assistance without accessing any documents.
-            
-            Perfect for:
-            • General questions
-            • Brainstorming
-            • Learning concepts
-            • Casual conversation
-            """)
-        
-        st.markdown("---")
+                    with col2:
+                        st.button("🔄 Rebuild Index", help="Fix database errors", on_click=_on_rebuild_index)
+                
+                st.markdown("---")
+                
+                st.button("🗑️ Clear Documents", help="Remove all uploaded documents", on_click=_on_clear_documents)
+            else:
+                st.warning("⚠️ No documents uploaded yet")
+        except Exception as e:
+            st.error(f"Error loading stats: {str(e)}")
+    
+    else:
+        # Chat Mode info
+        st.markdown("## 💬 Chat Mode")
+        st.info("""
+        **Chat Mode** provides general AI assistance without accessing any documents.
         
-        # Clear chat button for current mode
-        if st.session_state.mode == 'chat' and len(st.session_state.chat_mode_history) > 0:
-            if st.button("🗑️ Clear Chat History", use_container_width=True):
-                st.session_state.chat_mode_history = []
-                st.success("Chat history cleared!")
-                st.rerun()
-        elif st.session_state.mode == 'document' and len(st.session_state.doc_mode_history) > 0:
-            if st.button("🗑️ Clear Chat History", use_container_width=True):
-                st.session_state.doc_mode_history = []
-                st.success("Document chat history cleared!")
-                st.rerun()
+        Perfect for:
+        • General questions
+        • Brainstorming
+        • Learning concepts
+        • Casual conversation
+        """)
+    
+    st.markdown("---")
+    
+    # Clear chat button for current mode
+    if st.session_state.mode == 'chat' and len(st.session_state.chat_mode_history) > 0:
+        st.button("🗑️ Clear Chat History", use_container_width=True,
+                  on_click=_on_clear_chat_history, args=('chat_mode_history', "Chat history cleared!"))
+    elif st.session_state.mode == 'document' and len(st.session_state.doc_mode_history) > 0:
+        st.button("🗑️ Clear Chat History", use_container_width=True,
+                  on_click=_on_clear_chat_history, args=('doc_mode_history', "Document chat history cleared!"))
 
 
 
@@ -462,6 +500,13 @@ def auto_process_documents():
     uploaded_files = st.session_state.get('document_uploader', None)
     
     if not uploaded_files or len(uploaded_files) == 0:
+        # Files removed from the uploader are no longer waiting to be processed
+        st.session_state.pop('_pending_upload', None)
+        return
+    
+    # OPTIMIZATION: Skip hashing and ingestion when the upload set is unchanged
+    upload_key = tuple(sorted((f.name, f.size) for f in uploaded_files))
+    if st.session_state.get('_last_upload_key') == upload_key:
         return
     
     # Validate upload
@@ -469,22 +514,102 @@ def auto_process_documents():
         st.error(f"❌ Too many files. Maximum: {MAX_FILES}")
         return
     
-    total_size = sum(f.size for f in uploaded_files)
-    if total_size > MAX_TOTAL_SIZE_BYTES:
-        st.error(f"❌ Total size too large: {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)")
-        return
+    # Stop summing as soon as the running total crosses the limit
+    total_size = 0
+    for f in uploaded_files:
+        total_size += f.size
+        if total_size > MAX_TOTAL_SIZE_BYTES:
+            st.error(f"❌ Total size too large: over {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)")
+            return
+    
+    st.session_state._last_upload_key = upload_key
     
     # Process immediately
     process_documents(uploaded_files)
 
 
+@st.cache_resource(show_spinner=False)
+def get_ingest_executor() -> ThreadPoolExecutor:
+    """Process-wide worker pool for background document ingestion."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="docsense-ingest")
+
+
+def _run_ingestion(uploaded_files: List, session_doc_hash: Optional[str]):
+    """
+    Worker entry point: ingest without touching Streamlit.
+    
+    Returns the ingestion result and the parsed structured files; the script
+    thread publishes the latter to session state (render_ingest_status).
+    Import errors surface through the future rather than st.stop().
+    """
+    structured_data = {}
+    result = importlib.import_module("ingestion").ingest_documents(
+        uploaded_files, session_doc_hash, structured_data=structured_data
+    )
+    return result, structured_data
+
+
+@st.fragment(run_every=0.5)
+def render_ingest_status():
+    """
+    Poll the background ingestion job and publish its result when done.
+    
+    Only rendered while a job is in flight, so the polling stops with it.
+    """
+    job = st.session_state.get('_ingest_job')
+    if job is None:
+        return
+    
+    future = job["future"]
+    if not future.done():
+        st.info("🔄 Auto-processing documents...")
+        pending = st.session_state.get('_pending_upload')
+        if pending:
+            st.caption(f"⏳ Queued next: {', '.join(f.name for f in pending)}")
+        return
+    
+    st.session_state._ingest_job = None
+    try:
+        (total_chunks, files_processed, doc_hash), structured_data = future.result()
+    except Exception as e:
+        logger.error(f"Document processing failed: {str(e)}")
+        st.session_state._last_upload_key = None
+        st.session_state._ingest_message = ("error", f"❌ **Processing failed:** {str(e)}")
+        _start_pending_upload()
+        st.rerun()
+    
+    bump_stats_version()
+    st.session_state.current_doc_hash = doc_hash
+    st.session_state.structured_data = structured_data
+    
+    # Track processed files
+    _remember_processed_files(doc_hash, job["filenames"])
+    _save_hash_cache()
+    logger.info(f"📝 Cached embeddings: {job['filenames']} (hash: {doc_hash[:8]}...)")
+    
+    st.session_state._ingest_message = (
+        "success",
+        f"✅ **Documents processed successfully!** {files_processed} file(s), {total_chunks} chunks indexed. Ready for Q&A!"
+    )
+    _start_pending_upload()
+    st.rerun()
+
+
+def _start_pending_upload():
+    """Submit the upload that arrived while the previous job was running, if any."""
+    pending = st.session_state.pop('_pending_upload', None)
+    if pending:
+        process_documents(pending)
+
+
 def process_documents(uploaded_files: List):
     """Process uploaded documents for Document Mode with AUTO-PROCESSING."""
     try:
+        ingestion = _lazy_import("ingestion")
         session_doc_hash = st.session_state.get('current_doc_hash', None)
         
         # Compute hash
-        current_hash = compute_file_hash(uploaded_files)
+        current_hash = ingestion.compute_file_hash(uploaded_files)
         
         # OPTIMIZATION: Check if already processed
         if session_doc_hash and session_doc_hash == current_hash:
@@ -495,49 +620,145 @@ def process_documents(uploaded_files: List):
         # Additional check: individual file tracking
         if current_hash in st.session_state.processed_files:
             logger.info(f"✅ Using cached embeddings for: {st.session_state.processed_files[current_hash]}")
+            st.session_state.processed_files.move_to_end(current_hash)
             st.session_state.current_doc_hash = current_hash
             return
         
-        # Show processing indicator
-        with st.spinner("🔄 Auto-processing documents..."):
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            status_text.text("📄 Extracting text from documents...")
-            progress_bar.progress(25)
-            
-            total_chunks, files_processed, doc_hash = ingest_documents(uploaded_files, session_doc_hash)
-            st.session_state.current_doc_hash = doc_hash
-            
-            # Track processed files
-            filenames = ", ".join([f.name for f in uploaded_files])
-            st.session_state.processed_files[doc_hash] = filenames
-            logger.info(f"📝 Cached embeddings: {filenames} (hash: {doc_hash[:8]}...)")
-            
-            progress_bar.progress(75)
-            status_text.text("✨ Creating embeddings and indexing...")
-            
-            progress_bar.progress(100)
-            time.sleep(0.3)
-            progress_bar.empty()
-            status_text.empty()
+        # Don't start a second ingestion while one is still running; queue the
+        # latest upload instead and let render_ingest_status() submit it
+        if st.session_state.get('_ingest_job') is not None:
+            st.session_state._pending_upload = uploaded_files
+            st.toast("⏳ Still processing the previous upload. This upload will start once it finishes.")
+            return
         
-        # Show success message
-        st.success(f"✅ **Documents processed successfully!** {files_processed} file(s), {total_chunks} chunks indexed. Ready for Q&A!")
+        # OPTIMIZATION: Run ingestion off the script thread; render_ingest_status() polls it
+        # Similar-sized files land in the same embedding batches
+        uploaded_files_sorted = sorted(uploaded_files, key=lambda f: f.size)
+        future = get_ingest_executor().submit(
+            _run_ingestion,
+            uploaded_files_sorted,
+            session_doc_hash
+        )
+        st.session_state._ingest_job = {
+            "future": future,
+            "filenames": ", ".join([f.name for f in uploaded_files])
+        }
         
     except Exception as e:
         logger.error(f"Document processing failed: {str(e)}")
         st.error(f"❌ **Processing failed:** {str(e)}")
 
 
+def _compact_source(source: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only what the citation expander shows, with the preview precomputed."""
+    return {
+        'metadata': source.get('metadata', {}),
+        'similarity': source.get('similarity', 0.0),
+        'content_preview': source.get('content', '')[:SOURCE_PREVIEW_CHARS]
+    }
+
+
+def _set_source_page(page_key: str, page: int):
+    """on_click callback for the source pagination buttons."""
+    st.session_state[page_key] = page
+
+
+def _render_sources(sources: List[Dict[str, Any]], message_key: str):
+    """Render one page of source citations with prev/next controls."""
+    page_key = f"_src_page_{message_key}"
+    page_count = (len(sources) + SOURCES_PER_PAGE - 1) // SOURCES_PER_PAGE
+    page = min(st.session_state.get(page_key, 0), page_count - 1)
+    start = page * SOURCES_PER_PAGE
+    
+    for i, source in enumerate(sources[start:start + SOURCES_PER_PAGE], start + 1):
+        metadata = source.get('metadata', {})
+        similarity = source.get('similarity', 0.0)
+        preview = source.get('content_preview')
+        if preview is None:
+            preview = source.get('content', '')[:SOURCE_PREVIEW_CHARS]
+        st.caption(f"**[Source {i}]**: {metadata.get('source', 'Unknown')} (Relevance: {similarity:.2f})")
+        st.code(preview + "...")
+    
+    if page_count > 1:
+        col_prev, col_info, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            st.button("◀", key=f"{page_key}_prev", disabled=page == 0,
+                      on_click=_set_source_page, args=(page_key, page - 1))
+        with col_info:
+            st.caption(f"Page {page + 1} of {page_count}")
+        with col_next:
+            st.button("▶", key=f"{page_key}_next", disabled=page >= page_count - 1,
+                      on_click=_set_source_page, args=(page_key, page + 1))
+
+
+def _render_message(message: Dict[str, Any], message_key: str):
+    """Render a single chat message, with source citations when present."""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        
+        # Show sources if available
+        if message["role"] == "assistant" and "sources" in message and st.session_state.show_sources:
+            if message["sources"]:
+                with st.expander("📚 View Source Citations"):
+                    _render_sources(message["sources"], message_key)
+
+
+def _render_history(history_key: str):
+    """
+    Render the stored history for a mode, bounded to the newest messages.
+    
+    Only the last MAX_RENDERED_HISTORY messages are emitted on each rerun;
+    older ones are rendered only while the "show older" toggle is on.
+    """
+    history = st.session_state[history_key]
+    older_count = max(0, len(history) - MAX_RENDERED_HISTORY)
+    
+    if older_count:
+        if st.toggle(f"Show {older_count} older message(s)", key=f"{history_key}_show_older"):
+            for idx in range(older_count):
+                _render_message(history[idx], f"{history_key}_{idx}")
+    
+    for idx in range(older_count, len(history)):
+        _render_message(history[idx], f"{history_key}_{idx}")
+
+
+def stream_to_placeholder(response_stream, placeholder) -> str:
+    """
+    Stream chunks into a placeholder, coalescing repaints.
+    
+    Each markdown() call ships the whole response so far, so chunks are
+    buffered and flushed every STREAM_FLUSH_CHARS characters or
+    STREAM_FLUSH_INTERVAL seconds instead of once per token.
+    
+    Returns:
+        str: The complete response text
+    """
+    parts = []
+    pending = 0
+    last_flush = time.monotonic()
+    
+    for chunk in response_stream:
+        parts.append(chunk)
+        pending += len(chunk)
+        now = time.monotonic()
+        if pending >= STREAM_FLUSH_CHARS or now - last_flush > STREAM_FLUSH_INTERVAL:
+            placeholder.markdown("".join(parts) + "▌")
+            pending = 0
+            last_flush = now
+    
+    full_response = "".join(parts)
+    placeholder.markdown(full_response)
+    return full_response
+
+
 def handle_chat_mode():
     """Handle Chat Mode interface and logic."""
+    chat_module = _lazy_import("chat_mode")
+    
     st.markdown("### 💬 Chat with AI")
     
     # Display chat history
-    for message in st.session_state.chat_mode_history:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    _render_history('chat_mode_history')
     
     # Chat input
     if prompt := st.chat_input("Ask me anything..."):
@@ -556,7 +777,7 @@ def handle_chat_mode():
                     st.markdown("🤖 **Thinking...**")
                 
                 # Get chat mode
-                chat_mode = get_chat_mode()
+                chat_mode = _chat_mode()
                 
                 # Generate response
                 response_stream, metadata = chat_mode.generate_response(
@@ -568,13 +789,7 @@ def handle_chat_mode():
                 
                 # Stream response
                 response_placeholder = st.empty()
-                full_response = ""
-                
-                for chunk in response_stream:
-                    full_response += chunk
-                    response_placeholder.markdown(full_response + "▌")
-                
-                response_placeholder.markdown(full_response)
+                full_response = stream_to_placeholder(response_stream, response_placeholder)
                 
                 # Show metadata
                 detail_level = metadata.get('detail_level', 'auto')
@@ -583,13 +798,12 @@ def handle_chat_mode():
                 # Save to history
                 st.session_state.chat_mode_history.append({"role": "assistant", "content": full_response})
                 
-            except ChatModeError as e:
+            except chat_module.ChatModeError as e:
                 error_msg = f"❌ Chat Mode error: {str(e)}"
                 st.error(error_msg)
                 st.session_state.chat_mode_history.append({"role": "assistant", "content": error_msg})
             except Exception as e:
-                logger.error(f"Unexpected error in Chat Mode: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.error(f"Unexpected error in Chat Mode: {str(e)}", exc_info=True)
                 error_msg = "❌ An unexpected error occurred. Please try again."
                 st.error(error_msg)
                 st.session_state.chat_mode_history.append({"role": "assistant", "content": error_msg})
@@ -597,30 +811,18 @@ def handle_chat_mode():
 
 def handle_document_mode():
     """Handle Document Mode interface and logic."""
+    document_module = _lazy_import("document_mode")
+    
     # Check if documents are available
     try:
-        stats = get_ingestion_stats()
+        stats = _cached_stats(st.session_state.stats_version, st.session_state.current_doc_hash or "")
         has_documents = stats["total_chunks"] > 0
     except:
         has_documents = False
     
     if not has_documents:
         # Clear "No files uploaded" message
-        st.markdown("""
-        <div class="no-files-message">
-            <p><strong>📄 NO DOCUMENTS UPLOADED</strong></p>
-            <div style="margin-top: 1.2rem; font-size: 1.1rem;">
-                Upload PDF or TXT files using the sidebar to begin!
-            </div>
-            <div style="margin-top: 1rem; font-size: 0.95rem; opacity: 0.95;">
-                📁 Maximum: 5 files, 50MB total<br>
-                ✨ Documents process automatically on upload
-            </div>
-            <div style="margin-top: 1.5rem; font-size: 1rem; font-weight: 600;">
-                👈 Use the sidebar to get started!
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_NO_FILES_HTML, unsafe_allow_html=True)
         return
     
     st.markdown("### 📚 Document Q&A")
@@ -632,19 +834,7 @@ def handle_document_mode():
     st.caption(f"📊 {stats['total_files']} document(s) | {stats['total_chunks']} chunks")
     
     # Display chat history
-    for message in st.session_state.doc_mode_history:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-            
-            # Show sources if available
-            if message["role"] == "assistant" and "sources" in message and st.session_state.show_sources:
-                if message["sources"]:
-                    with st.expander("📚 View Source Citations"):
-                        for i, source in enumerate(message["sources"], 1):
-                            metadata = source.get('metadata', {})
-                            similarity = source.get('similarity', 0.0)
-                            st.caption(f"**[Source {i}]**: {metadata.get('source', 'Unknown')} (Relevance: {similarity:.2f})")
-                            st.code(source.get('content', '')[:400] + "...")
+    _render_history('doc_mode_history')
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your documents..."):
@@ -663,7 +853,7 @@ def handle_document_mode():
                     st.markdown("🔍 **Searching documents...**")
                 
                 # Get document mode
-                doc_mode = get_document_mode()
+                doc_mode = _doc_mode()
                 
                 # Generate RAG response
                 response_stream, sources, metadata = doc_mode.answer_from_documents(
@@ -675,13 +865,7 @@ def handle_document_mode():
                 
                 # Stream response
                 response_placeholder = st.empty()
-                full_response = ""
-                
-                for chunk in response_stream:
-                    full_response += chunk
-                    response_placeholder.markdown(full_response + "▌")
-                
-                response_placeholder.markdown(full_response)
+                full_response = stream_to_placeholder(response_stream, response_placeholder)
                 
                 # Track intent
                 intent = metadata.get('intent', 'document_query')
@@ -704,16 +888,15 @@ def handle_document_mode():
                 st.session_state.doc_mode_history.append({
                     "role": "assistant",
                     "content": full_response,
-                    "sources": sources
+                    "sources": [_compact_source(source) for source in sources]
                 })
                 
-            except DocumentModeError as e:
+            except document_module.DocumentModeError as e:
                 error_msg = f"❌ Error: {str(e)}"
                 st.error(error_msg)
                 st.session_state.doc_mode_history.append({"role": "assistant", "content": error_msg, "sources": []})
             except Exception as e:
-                logger.error(f"Unexpected error: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.error(f"Unexpected error: {str(e)}", exc_info=True)
                 error_msg = "❌ An unexpected error occurred. Please try again."
                 st.error(error_msg)
                 st.session_state.doc_mode_history.append({"role": "assistant", "content": error_msg, "sources": []})
@@ -742,8 +925,13 @@ def main():
         # Mode indicator
         render_mode_info()
         
-        # Sidebar
-        render_sidebar()
+        # Sidebar (fragment - must be entered from the sidebar container)
+        st.session_state._rendered_stats_version = st.session_state.stats_version
+        st.session_state._rendered_ingest_pending = st.session_state.get('_ingest_job') is not None
+        with st.sidebar:
+            render_sidebar()
+            if st.session_state._rendered_ingest_pending:
+                render_ingest_status()
         
         # Main content based on mode
         if st.session_state.mode == 'chat':
@@ -777,8 +965,7 @@ def main():
             """)
     
     except Exception as e:
-        logger.error(f"Critical error: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Critical error: {str(e)}", exc_info=True)
         st.error("🚨 Critical application error. Please check logs and restart.")
         st.stop()
 
@@ -0,0 +1,188 @@
+"""
+Shared UI helpers for the hybrid DocSense apps
+
+app_hybrid.py (in-memory document store) and app_hybrid_v2.py (vector store)
+differ only in how documents are stored and retrieved; the chat loop,
+streaming, progress and history rendering live here so both apps share one
+implementation.
+"""
+
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import streamlit as st
+
+try:
+    from chat_mode import get_chat_mode
+    from hybrid_query_engine import HybridQueryEngine
+    from table_formatter import display_response_with_visuals, extract_numerical_data
+except ImportError as e:
+    st.error(f"Failed to import modules: {str(e)}")
+    st.stop()
+
+logger = logging.getLogger(__name__)
+
+# Conversation turns (user + assistant pairs) sent back with each chat prompt
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "8"))
+
+# Seconds within which repeated rerun requests collapse into one
+RERUN_DEBOUNCE = 0.1
+
+# Newest messages rendered on every rerun; older ones sit behind a toggle
+MAX_RENDERED_HISTORY = 50
+
+# Document-processing progress repaints: minimum percent step / seconds between them
+PROGRESS_MIN_STEP = 5
+PROGRESS_MIN_INTERVAL = 0.1
+
+# Necessary condition for extract_numerical_data to find anything: a table
+# delimiter (|, tab, 2+ spaces within a line) or a "Label: <number>" pair
+_TABLE_HINT_RE = re.compile(r'[|\t]|[^\S\n]{2}|:\s*[\d,.-]')
+
+# Whitespace runs, and whitespace next to CSS punctuation where it carries no meaning
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_SPACE_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css: str) -> str:
+    """
+    Collapse a <style> block's whitespace.
+
+    The stylesheet is re-sent on every rerun, so it is minified once at
+    import time. Spaces around ':' are kept (they matter in selectors).
+    """
+    return _CSS_PUNCT_SPACE_RE.sub(r'\1', _CSS_SPACE_RE.sub(' ', css)).strip()
+
+
+def stream_to_placeholder(chunks, placeholder) -> str:
+    """
+    Stream chunks into a placeholder with st.write_stream.
+
+    write_stream sends only the new text per chunk, instead of re-sending the
+    whole response on every repaint. The caller clears the placeholder and
+    renders the formatted answer afterwards.
+
+    Returns:
+        str: The complete response text
+    """
+    with placeholder.container():
+        return st.write_stream(chunks)
+
+
+def coalesced_progress(progress_bar, progress_text):
+    """
+    Build a progress callback(current, total, message) that skips redundant repaints.
+
+    The bar and text are only updated on a PROGRESS_MIN_STEP jump, after
+    PROGRESS_MIN_INTERVAL seconds, when progress restarts (next file) or at completion.
+    """
+    last = {"pct": -1, "time": 0.0}
+
+    def update_progress(current, total, message):
+        if total <= 0:
+            return
+        pct = int((current / total) * 100)
+        now = time.monotonic()
+        step = pct - last["pct"]
+        if current != total and 0 <= step < PROGRESS_MIN_STEP and now - last["time"] <= PROGRESS_MIN_INTERVAL:
+            return
+        progress_bar.progress(pct)
+        progress_text.text(f"{message} ({current}/{total})")
+        last["pct"], last["time"] = pct, now
+
+    return update_progress
+
+
+def debounced_rerun():
+    """
+    Rerun the script unless a rerun was already requested in the last RERUN_DEBOUNCE seconds.
+
+    Collapses bursts (e.g. quick mode toggles) into a single re-execution;
+    a skipped request just lets the current run finish with the new state.
+    """
+    now = time.monotonic()
+    if now - st.session_state.get('_last_rerun', 0.0) > RERUN_DEBOUNCE:
+        st.session_state._last_rerun = now
+        st.rerun()
+
+
+def has_numerical_data(content: str) -> bool:
+    """Whether a response contains a table of numbers worth rendering with visuals."""
+    # Plain prose has none of extract_numerical_data's delimiters; skip the parse
+    if not _TABLE_HINT_RE.search(content):
+        return False
+    return _extracts_numerical_data(content)
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _extracts_numerical_data(content: str) -> bool:
+    """Run extract_numerical_data on a message (memoized per message text)."""
+    df = extract_numerical_data(content)
+    return df is not None and not df.empty
+
+
+def render_answer(content: str, visuals: Optional[bool] = None) -> bool:
+    """
+    Render an assistant answer, with tables and charts in Document Mode.
+
+    Args:
+        content: Answer text
+        visuals: Whether to render tables/charts; decided from the current
+            mode and the content when None
+
+    Returns:
+        bool: Whether visuals were rendered (store it with the message so
+        history re-renders skip the check)
+    """
+    if visuals is None:
+        visuals = st.session_state.mode == 'document' and has_numerical_data(content)
+    if visuals:
+        display_response_with_visuals(content, show_charts=True)
+    else:
+        st.markdown(content)
+    return visuals
+
+
+def render_message(message: dict):
+    """Render one stored chat message."""
+    with st.chat_message(message["role"]):
+        if message["role"] == "assistant":
+            render_answer(message["content"], message.get("visuals"))
+        else:
+            st.markdown(message["content"])
+
+
+def render_history(messages: List[Dict]):
+    """Render the newest MAX_RENDERED_HISTORY messages; older ones only on request."""
+    older_count = max(0, len(messages) - MAX_RENDERED_HISTORY)
+    if older_count and st.toggle(f"Show {older_count} older message(s)", key="show_older_messages"):
+        for message in messages[:older_count]:
+            render_message(message)
+    for message in messages[older_count:]:
+        render_message(message)
+
+
+def recent_chat_history(messages: List[Dict]) -> List[Dict]:
+    """
+    Conversation history for a chat prompt.
+
+    Returns the last CHAT_HISTORY_TURNS turns before the newest message
+    (the prompt itself), as role/content dicts.
+    """
+    recent = messages[-(2 * CHAT_HISTORY_TURNS + 1):-1]
+    return [{"role": msg["role"], "content": msg["content"]} for msg in recent]
+
+
+@st.cache_resource(show_spinner=False)
+def cached_chat_engine():
+    """Process-wide ChatMode instance (holds the API client)."""
+    return get_chat_mode()
+
+
+@st.cache_resource(show_spinner=False)
+def cached_query_engine():
+    """Process-wide HybridQueryEngine instance (holds the Mistral and GROQ clients)."""
+    return HybridQueryEngine()
@@ -11,7 +11,6 @@ Created: November 2025
 """
 
 import logging
-import os
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -27,17 +26,26 @@ logger = logging.getLogger(__name__)
 
 # Import modules
 try:
-    from chat_mode import get_chat_mode
-    from hybrid_query_engine import get_hybrid_query_engine
+    from app_common import (
+        cached_chat_engine,
+        cached_query_engine,
+        coalesced_progress,
+        debounced_rerun,
+        minify_css,
+        recent_chat_history,
+        render_answer,
+        render_history,
+        stream_to_placeholder
+    )
     from simple_document_mode import (
         get_simple_document_store,
         process_uploaded_files
     )
-    from table_formatter import display_response_with_visuals, extract_numerical_data
 except ImportError as e:
     st.error(f"Failed to import modules: {str(e)}")
     st.stop()
 
+
 # Page configuration
 st.set_page_config(
     page_title="DocSense - AI Assistant",
@@ -46,8 +54,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS (emitted on every run: Streamlit drops elements a rerun does not re-emit,
+# and an unchanged element is not re-rendered by the frontend; minified once at import)
+_CUSTOM_CSS = minify_css("""
 <style>
     .main-header {
         text-align: center;
@@ -84,7 +93,14 @@ st.markdown("""
         margin-bottom: 0.5rem;
     }
 </style>
-""", unsafe_allow_html=True)
+""")
+
+_HEADER_HTML = """
+<div class="main-header">🤖 DocSense AI Assistant</div>
+<p style="text-align: center; color: #666;">Powered by GROQ + Mistral</p>
+"""
+
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if 'mode' not in st.session_state:
@@ -95,8 +111,7 @@ if 'documents_loaded' not in st.session_state:
     st.session_state.documents_loaded = False
 
 # Header
-st.markdown('<div class="main-header">🤖 DocSense AI Assistant</div>', unsafe_allow_html=True)
-st.markdown('<p style="text-align: center; color: #666;">Powered by GROQ + Mistral</p>', unsafe_allow_html=True)
+st.markdown(_HEADER_HTML, unsafe_allow_html=True)
 
 # Sidebar
 with st.sidebar:
@@ -138,12 +153,7 @@ with st.sidebar:
                 
                 status_container = st.container()
                 
-                def update_progress(current, total, message):
-                    """Callback to update progress."""
-                    if total > 0:
-                        progress = int((current / total) * 100)
-                        progress_bar.progress(progress)
-                        progress_text.text(f"{message} ({current}/{total})")
+                update_progress = coalesced_progress(progress_bar, progress_text)
                 
                 try:
                     update_progress(0, 1, "Starting document processing...")
@@ -152,9 +162,8 @@ with st.sidebar:
                         progress_bar.progress(100)
                         progress_text.text("✓ Processing complete!")
                         st.session_state.documents_loaded = True
-                        import time
-                        time.sleep(1)
-                        st.rerun()
+                        st.toast("✓ Documents processed", icon="✅")
+                        debounced_rerun()
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
                 finally:
@@ -178,7 +187,7 @@ with st.sidebar:
                 doc_store.clear()
                 st.session_state.documents_loaded = False
                 st.session_state.messages = []
-                st.rerun()
+                debounced_rerun()
     
     st.divider()
     
@@ -193,7 +202,7 @@ with st.sidebar:
     # Clear chat button
     if st.button("🗑️ Clear Chat", use_container_width=True):
         st.session_state.messages = []
-        st.rerun()
+        debounced_rerun()
     
     st.divider()
     st.caption("DocSense v2.0 - Hybrid Architecture")
@@ -201,18 +210,8 @@ with st.sidebar:
 # Main chat interface
 st.subheader(f"{'💬 General Chat' if st.session_state.mode == 'chat' else '📚 Document Q&A'}")
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        if message["role"] == "assistant" and st.session_state.mode == 'document':
-            # Check if message contains structured data
-            df = extract_numerical_data(message["content"])
-            if df is not None and not df.empty:
-                display_response_with_visuals(message["content"], show_charts=True)
-            else:
-                st.markdown(message["content"])
-        else:
-            st.markdown(message["content"])
+# Display chat messages (older ones only on request)
+render_history(st.session_state.messages)
 
 # Chat input
 if prompt := st.chat_input("Ask me anything..."):
@@ -235,28 +234,20 @@ if prompt := st.chat_input("Ask me anything..."):
         try:
             if st.session_state.mode == 'chat':
                 # Chat Mode: Pure GROQ conversation
-                chat_engine = get_chat_mode()
+                chat_engine = cached_chat_engine()
                 
                 # Format conversation history properly
-                chat_history = []
-                for msg in st.session_state.messages[:-1]:
-                    chat_history.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
+                chat_history = recent_chat_history(st.session_state.messages)
                 
-                for chunk in chat_engine.stream_response(
-                    prompt,
-                    detail_level.lower(),
-                    chat_history
-                ):
-                    full_response += chunk
-                    response_placeholder.markdown(full_response + "▌")
+                full_response = stream_to_placeholder(
+                    chat_engine.stream_response(prompt, detail_level.lower(), chat_history),
+                    response_placeholder
+                )
                 
             else:
                 # Document Mode: Mistral retrieval + GROQ answering
                 doc_store = get_simple_document_store()
-                query_engine = get_hybrid_query_engine()
+                query_engine = cached_query_engine()
                 
                 # Search documents
                 relevant_docs = doc_store.search(prompt, top_k=5)
@@ -265,28 +256,18 @@ if prompt := st.chat_input("Ask me anything..."):
                     full_response = "❌ No relevant documents found. Please upload documents related to your question."
                 else:
                     # Use hybrid query engine
-                    for chunk in query_engine.query(
-                        prompt,
-                        relevant_docs,
-                        detail_level.lower()
-                    ):
-                        full_response += chunk
-                        response_placeholder.markdown(full_response + "▌")
+                    full_response = stream_to_placeholder(
+                        query_engine.query(prompt, relevant_docs, detail_level.lower()),
+                        response_placeholder
+                    )
             
             # Final response with visual formatting
             response_placeholder.empty()  # Clear the streaming placeholder
             
-            # Check if response contains structured data
-            df = extract_numerical_data(full_response)
-            
-            if df is not None and not df.empty and st.session_state.mode == 'document':
-                # Display with tables and charts
-                display_response_with_visuals(full_response, show_charts=True)
-            else:
-                # Regular markdown display
-                st.markdown(full_response)
+            # Tables and charts when the answer has structured data, otherwise markdown
+            visuals = render_answer(full_response)
             
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+            st.session_state.messages.append({"role": "assistant", "content": full_response, "visuals": visuals})
             
         except Exception as e:
             error_msg = f"❌ Error: {str(e)}"
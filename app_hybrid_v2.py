@@ -11,8 +11,13 @@ Created: November 2025
 Version: 2.0
 """
 
+import asyncio
+import importlib
 import logging
-import os
+import re
+import threading
+import time
+from typing import Dict, List
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -28,11 +33,17 @@ logger = logging.getLogger(__name__)
 
 # Import modules
 try:
-    from chat_mode import get_chat_mode
-    from hybrid_query_engine import get_hybrid_query_engine
-    from document_engine import process_documents_with_embeddings
-    from vector_store import get_vector_store
-    from table_formatter import display_response_with_visuals, extract_numerical_data
+    from app_common import (
+        cached_chat_engine,
+        cached_query_engine,
+        coalesced_progress,
+        debounced_rerun,
+        minify_css,
+        recent_chat_history,
+        render_answer,
+        render_history,
+        stream_to_placeholder
+    )
     from document_persistence import (
         ensure_data_folder,
         get_existing_documents,
@@ -45,6 +56,89 @@ except ImportError as e:
     st.error(f"Failed to import modules: {str(e)}")
     st.stop()
 
+# Default "Search speed vs recall" setting; mirrors vector_store.DEFAULT_CANDIDATE_MULTIPLIER
+# (not imported from there so chat-only sessions never load vector_store)
+DEFAULT_SEARCH_CANDIDATES = 20
+
+# Multi-question prompts: sentence boundary before a capitalised word, and the
+# most sub-questions searched separately (each contributes SUB_QUESTION_TOP_K hits)
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[?.!])\s+(?=[A-Z])')
+MAX_SUB_QUESTIONS = 5
+SUB_QUESTION_TOP_K = 3
+SEARCH_TOP_K = 5
+
+# document_engine and vector_store (PDF parsing, pandas, scikit-learn) are only
+# needed in Document Mode, so they are imported by _lazy_import() on first use.
+
+
+def _lazy_import(module_name: str):
+    """Import a Document Mode module on first use (later calls hit sys.modules)."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        st.error(f"Failed to import modules: {str(e)}")
+        st.stop()
+
+
+def get_vector_store():
+    """Session vector store, importing vector_store on first use."""
+    return _lazy_import("vector_store").get_vector_store()
+
+
+def process_documents_with_embeddings(uploaded_files, progress_callback=None) -> bool:
+    """Process documents into the vector store, importing document_engine on first use."""
+    return _lazy_import("document_engine").process_documents_with_embeddings(
+        uploaded_files,
+        progress_callback=progress_callback
+    )
+
+
+def _split_questions(prompt: str) -> List[str]:
+    """Return the separate questions in a prompt (at most MAX_SUB_QUESTIONS), or [] if it asks one."""
+    questions = [part for part in _SENTENCE_SPLIT_RE.split(prompt.strip()) if part.endswith('?')]
+    return questions[:MAX_SUB_QUESTIONS] if len(questions) >= 2 else []
+
+
+def _merge_hits(hit_lists: List[List[Dict]]) -> List[Dict]:
+    """
+    Interleave per-question results, dropping repeats, up to SEARCH_TOP_K.
+    
+    Round-robin order gives every question a chunk within the first few
+    documents (the query engine only reads the top ones).
+    """
+    merged, seen = [], set()
+    for rank in range(max(map(len, hit_lists), default=0)):
+        for hits in hit_lists:
+            if rank < len(hits) and id(hits[rank]) not in seen:
+                seen.add(id(hits[rank]))
+                merged.append(hits[rank])
+    return merged[:SEARCH_TOP_K]
+
+
+async def _retrieve_and_prepare(vector_store, query_engine, prompt: str, candidate_multiplier: int):
+    """
+    Run the document search while the query engine warms its connections.
+    
+    A prompt with several questions gets one search per question, all run
+    concurrently, so K questions cost about one search's latency. The
+    warm-up runs on its own daemon thread and is never waited for (the
+    default executor would be joined when asyncio.run() returns).
+    """
+    threading.Thread(target=query_engine.prewarm, name="hybrid-prewarm", daemon=True).start()
+    
+    questions = _split_questions(prompt)
+    if questions:
+        searches = [
+            asyncio.to_thread(vector_store.semantic_search, question, SUB_QUESTION_TOP_K, 0.3, candidate_multiplier)
+            for question in questions
+        ]
+    else:
+        searches = [asyncio.to_thread(vector_store.semantic_search, prompt, SEARCH_TOP_K, 0.3, candidate_multiplier)]
+    
+    hit_lists = await asyncio.gather(*searches)
+    return _merge_hits(hit_lists)
+
+
 # Page configuration
 st.set_page_config(
     page_title="AI Assistant",
@@ -53,8 +147,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS (emitted on every run: Streamlit drops elements a rerun does not re-emit,
+# and an unchanged element is not re-rendered by the frontend; minified once at import)
+_CUSTOM_CSS = minify_css("""
 <style>
     .main-header {
         text-align: center;
@@ -100,10 +195,14 @@ st.markdown("""
         margin-bottom: 1rem;
     }
 </style>
-""", unsafe_allow_html=True)
+""")
+
+_HEADER_HTML = '<div class="main-header">🧠 AI Assistant <span class="version-badge">v2.0</span></div>'
+
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
 
 # Main header
-st.markdown('<div class="main-header">🧠 AI Assistant <span class="version-badge">v2.0</span></div>', unsafe_allow_html=True)
+st.markdown(_HEADER_HTML, unsafe_allow_html=True)
 
 # Initialize session state
 if 'messages' not in st.session_state:
@@ -125,6 +224,10 @@ if 'detail_level' not in st.session_state:
 if 'debug_mode' not in st.session_state:
     st.session_state.debug_mode = False
 
+# Retrieval candidates re-ranked per result (Advanced settings)
+if 'search_candidates' not in st.session_state:
+    st.session_state.search_candidates = DEFAULT_SEARCH_CANDIDATES
+
 # Track auto-loaded documents
 if 'auto_loaded' not in st.session_state:
     st.session_state.auto_loaded = False
@@ -200,9 +303,8 @@ if st.session_state.rag_status == 'processed' and not st.session_state.sidebar_m
     # Auto-hide after processing complete (simulate 300ms delay with counter)
     if st.session_state.processing_complete_counter < 1:
         st.session_state.processing_complete_counter += 1
-        import time
         time.sleep(0.3)
-        st.rerun()
+        debounced_rerun()
     else:
         show_sidebar = False
 elif st.session_state.rag_status in ['uploading', 'processing', 'error', 'idle']:
@@ -215,7 +317,7 @@ with col_toggle:
     if st.button("☰" if not show_sidebar else "✕", key="sidebar_toggle", help="Toggle Sidebar"):
         st.session_state.sidebar_manual_toggle = not st.session_state.sidebar_manual_toggle
         show_sidebar = not show_sidebar
-        st.rerun()
+        debounced_rerun()
 
 # Sidebar (conditionally rendered)
 if show_sidebar:
@@ -233,10 +335,10 @@ if show_sidebar:
         
         # Update mode
         new_mode = 'chat' if mode == "💬 Chat Mode" else 'document'
+        # History is kept across mode switches; "🗑️ Clear" starts a new chat
         if new_mode != st.session_state.mode:
             st.session_state.mode = new_mode
-            st.session_state.messages = []
-            st.rerun()
+            debounced_rerun()
         
         # Mode description
         if st.session_state.mode == 'chat':
@@ -267,7 +369,7 @@ if show_sidebar:
                                 delete_document(filename)
                                 st.session_state.documents_loaded = False
                                 st.session_state.rag_status = 'idle'
-                                st.rerun()
+                                debounced_rerun()
             
             st.caption("Upload new PDF or TXT files")
             
@@ -297,11 +399,7 @@ if show_sidebar:
                     progress_bar = st.progress(0)
                     progress_text = st.empty()
                     
-                    def update_progress(current, total, message):
-                        if total > 0:
-                            progress = int((current / total) * 100)
-                            progress_bar.progress(progress)
-                            progress_text.text(f"{message} ({current}/{total})")
+                    update_progress = coalesced_progress(progress_bar, progress_text)
                     
                     try:
                         success = process_documents_with_embeddings(
@@ -355,6 +453,16 @@ if show_sidebar:
             value=st.session_state.get("detail_level", "Detailed")
         )
         
+        # Advanced retrieval tuning
+        with st.expander("⚡ Advanced"):
+            st.session_state.search_candidates = st.slider(
+                "Search speed vs recall",
+                min_value=1,
+                max_value=128,
+                value=st.session_state.search_candidates,
+                help="Candidates re-ranked per result. Lower is faster; higher finds more entity matches."
+            )
+        
         # Debug panel
         with st.expander("🔧 Debug Info"):
             st.session_state.debug_mode = st.checkbox("Enable Debug Mode", value=st.session_state.debug_mode)
@@ -383,7 +491,7 @@ with col2:
     # Clear chat button
     if st.session_state.messages and st.button("🗑️ Clear", help="Clear chat history"):
         st.session_state.messages = []
-        st.rerun()
+        debounced_rerun()
 
 # Show welcome message when no chat history
 if len(st.session_state.messages) == 0:
@@ -398,18 +506,8 @@ if len(st.session_state.messages) == 0:
         unsafe_allow_html=True
     )
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        if message["role"] == "assistant" and st.session_state.mode == 'document':
-            # Check if response contains numerical data for visualization
-            df = extract_numerical_data(message["content"])
-            if df is not None and not df.empty:
-                display_response_with_visuals(message["content"], show_charts=True)
-            else:
-                st.markdown(message["content"])
-        else:
-            st.markdown(message["content"])
+# Display chat messages (older ones only on request)
+render_history(st.session_state.messages)
 
 # Chat input with proper error handling
 if prompt := st.chat_input("Ask me anything..."):
@@ -436,23 +534,15 @@ if prompt := st.chat_input("Ask me anything..."):
                 if st.session_state.mode == 'chat':
                     # Chat Mode: Pure GROQ conversation
                     try:
-                        chat_engine = get_chat_mode()
+                        chat_engine = cached_chat_engine()
                         
-                        chat_history = []
-                        for msg in st.session_state.messages[:-1]:
-                            chat_history.append({
-                                "role": msg["role"],
-                                "content": msg["content"]
-                            })
+                        chat_history = recent_chat_history(st.session_state.messages)
                         
                         # Stream response
-                        for chunk in chat_engine.stream_response(
-                            prompt,
-                            st.session_state.detail_level.lower(),
-                            chat_history
-                        ):
-                            full_response += chunk
-                            response_placeholder.markdown(full_response + "▌")
+                        full_response = stream_to_placeholder(
+                            chat_engine.stream_response(prompt, st.session_state.detail_level.lower(), chat_history),
+                            response_placeholder
+                        )
                     
                     except Exception as e:
                         logger.error(f"Chat mode error: {str(e)}", exc_info=True)
@@ -468,26 +558,20 @@ if prompt := st.chat_input("Ask me anything..."):
                         if stats['total_documents'] == 0:
                             raise Exception("No documents in vector store. Please upload and process documents first.")
                         
-                        # Semantic + keyword search
-                        relevant_docs = vector_store.semantic_search(
-                            prompt,
-                            top_k=5,
-                            keyword_boost=0.3
-                        )
+                        # Semantic + keyword search, overlapped with query engine warm-up
+                        query_engine = cached_query_engine()
+                        relevant_docs = asyncio.run(_retrieve_and_prepare(
+                            vector_store, query_engine, prompt, st.session_state.search_candidates
+                        ))
                         
                         if not relevant_docs:
                             full_response = "❌ No relevant documents found. Please try rephrasing your question or upload documents related to your query."
                         else:
                             # Use hybrid query engine
-                            query_engine = get_hybrid_query_engine()
-                            
-                            for chunk in query_engine.query(
-                                prompt,
-                                relevant_docs,
-                                st.session_state.detail_level.lower()
-                            ):
-                                full_response += chunk
-                                response_placeholder.markdown(full_response + "▌")
+                            full_response = stream_to_placeholder(
+                                query_engine.query(prompt, relevant_docs, st.session_state.detail_level.lower()),
+                                response_placeholder
+                            )
                     
                     except Exception as e:
                         logger.error(f"Document mode error: {str(e)}", exc_info=True)
@@ -497,17 +581,10 @@ if prompt := st.chat_input("Ask me anything..."):
             response_placeholder.empty()
             
             # Check for numerical data and display with visuals if available
-            if st.session_state.mode == 'document':
-                df = extract_numerical_data(full_response)
-                if df is not None and not df.empty:
-                    display_response_with_visuals(full_response, show_charts=True)
-                else:
-                    st.markdown(full_response)
-            else:
-                st.markdown(full_response)
+            visuals = render_answer(full_response)
             
             # Save assistant response to history
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+            st.session_state.messages.append({"role": "assistant", "content": full_response, "visuals": visuals})
             
         except Exception as e:
             # Display error prominently
@@ -532,7 +609,7 @@ if prompt := st.chat_input("Ask me anything..."):
                 """)
     
     # Force rerun to display the new messages properly
-    st.rerun()
+    debounced_rerun()
 
 # Footer
 st.divider()
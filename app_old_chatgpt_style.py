@@ -18,11 +18,15 @@ Author: AI Assistant
 Created: August 2025
 """
 
+import hashlib
+import importlib
 import logging
 import os
+import re
 import sys
 import time
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
 import traceback
 
 import streamlit as st
@@ -31,10 +35,10 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Import custom modules
+# Import custom modules (ingestion and query_engine pull in chromadb, langchain,
+# PyMuPDF and openai; they are imported on first use so the page renders first)
 try:
-    from ingestion import ingest_documents, get_ingestion_stats, clear_vector_store, DocumentIngestionError
-    from query_engine import get_query_engine, QueryEngineError
+    from answer_cache import AnswerCache
 except ImportError as e:
     st.error(f"Failed to import required modules: {str(e)}")
     st.stop()
@@ -46,11 +50,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def _lazy_import(module_name: str):
+    """
+    Import a document module on first use (later calls hit sys.modules).
+    
+    Also used for exception types in except clauses, which Python only
+    evaluates once something has been raised.
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        st.error(f"Failed to import required modules: {str(e)}")
+        st.stop()
+
+
+def get_ingestion_stats() -> Dict[str, Any]:
+    """Vector store statistics, importing ingestion on first use."""
+    return _lazy_import("ingestion").get_ingestion_stats()
+
+
+def get_store_fingerprint() -> str:
+    """Token identifying the stored corpus, importing ingestion on first use."""
+    return _lazy_import("ingestion").get_store_fingerprint()
+
+
+def clear_vector_store() -> None:
+    """Clear the vector store, importing ingestion on first use."""
+    _lazy_import("ingestion").clear_vector_store()
+
+
+def ingest_documents(uploaded_files: List, session_doc_hash: Optional[str] = None,
+                     progress_callback=None, extraction_callback=None) -> Tuple[int, int, str]:
+    """Ingest documents into the vector store, importing ingestion on first use."""
+    return _lazy_import("ingestion").ingest_documents(
+        uploaded_files,
+        session_doc_hash,
+        progress_callback=progress_callback,
+        extraction_callback=extraction_callback
+    )
+
+
+def get_query_engine():
+    """Process-wide query engine, importing query_engine on first use."""
+    return _lazy_import("query_engine").get_query_engine()
+
 # Constants
 MAX_FILES = 5
 MAX_TOTAL_SIZE_MB = 50
 MAX_TOTAL_SIZE_BYTES = MAX_TOTAL_SIZE_MB * 1024 * 1024
 SUPPORTED_FORMATS = ["pdf", "txt"]  # Supported file formats
+QUERY_CACHE_SIZE = 128  # Answers kept per session for repeated questions
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', os.path.join(".cache", "answers.sqlite"))  # Shared across sessions and restarts
+STREAM_FLUSH_INTERVAL = 0.05  # Seconds between repaints of a streaming response
+_SIZE_UNITS = ("B", "KB", "MB", "GB")  # format_file_size units, 1024 apart
+MAX_RENDERED_HISTORY = 50  # Newest messages rendered on every rerun; older ones sit behind a toggle
+CONTEXT_MAX_MESSAGES = 3  # Previous messages sent with a follow-up question
+CONTEXT_TOKEN_BUDGET = 512  # Prompt tokens spent on that conversation context
+CHARS_PER_TOKEN = 4  # Rough English average; no tokenizer for the OpenRouter models
 
 # Page configuration
 st.set_page_config(
@@ -63,8 +120,9 @@ st.set_page_config(
     }
 )
 
-# Custom CSS for professional styling
-st.markdown("""
+# Custom CSS for professional styling. Emitted on every run (Streamlit drops elements a
+# rerun does not re-emit), so comments and whitespace are stripped once at import.
+_CUSTOM_CSS = re.sub(r'\s+', ' ', re.sub(r'/\*.*?\*/', '', """
 <style>
     .main-header {
         text-align: center;
@@ -114,33 +172,6 @@ st.markdown("""
         margin: 0.5rem 0;
     }
     
-    .error-container {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #dc3545;
-        margin: 1rem 0;
-    }
-    
-    .success-container {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #28a745;
-        margin: 1rem 0;
-    }
-    
-    .warning-container {
-        background-color: #fff3cd;
-        color: #856404;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #ffc107;
-        margin: 1rem 0;
-    }
-    
     .answer-container {
         background-color: #ffffff;
         color: #212529;
@@ -219,7 +250,9 @@ st.markdown("""
         border: 1px solid #dee2e6;
     }
 </style>
-""", unsafe_allow_html=True)
+""", flags=re.S)).strip()
+
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
 
 
 def validate_environment() -> bool:
@@ -261,18 +294,12 @@ def format_file_size(size_bytes: int) -> str:
     Returns:
         Formatted size string
     """
-    if size_bytes == 0:
+    if size_bytes <= 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    size = size_bytes
-    i = 0
-    
-    while size >= 1024 and i < len(size_names) - 1:
-        size /= 1024.0
-        i += 1
-    
-    return f"{size:.1f} {size_names[i]}"
+    # Unit index straight from the bit length: each unit is 2**10 of the previous
+    i = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {_SIZE_UNITS[i]}"
 
 
 def display_upload_info(uploaded_files: List) -> bool:
@@ -303,13 +330,12 @@ def display_upload_info(uploaded_files: List) -> bool:
     
     # Validate file count
     if len(uploaded_files) > MAX_FILES:
-        st.markdown(f"""
-        <div class="error-container">
-            ❌ <strong>Too many files</strong><br>
-            You uploaded {len(uploaded_files)} files, but the maximum is {MAX_FILES}.
-            Please remove some files and try again.
-        </div>
-        """, unsafe_allow_html=True)
+        st.error(
+            f"**Too many files**  \n"
+            f"You uploaded {len(uploaded_files)} files, but the maximum is {MAX_FILES}. "
+            "Please remove some files and try again.",
+            icon="❌"
+        )
         return False
     
     # Calculate total size
@@ -317,23 +343,21 @@ def display_upload_info(uploaded_files: List) -> bool:
     
     # Validate total size
     if total_size > MAX_TOTAL_SIZE_BYTES:
-        st.markdown(f"""
-        <div class="error-container">
-            ❌ <strong>Upload size too large</strong><br>
-            Total size: {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)<br>
-            Please reduce the total file size and try again.
-        </div>
-        """, unsafe_allow_html=True)
+        st.error(
+            f"**Upload size too large**  \n"
+            f"Total size: {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)  \n"
+            "Please reduce the total file size and try again.",
+            icon="❌"
+        )
         return False
     
     # Display file information
-    st.markdown(f"""
-    <div class="success-container">
-        ✅ <strong>Upload validated successfully</strong><br>
-        Files: {len(uploaded_files)} / {MAX_FILES}<br>
-        Total size: {format_file_size(total_size)} / {MAX_TOTAL_SIZE_MB}MB
-    </div>
-    """, unsafe_allow_html=True)
+    st.success(
+        f"**Upload validated successfully**  \n"
+        f"Files: {len(uploaded_files)} / {MAX_FILES}  \n"
+        f"Total size: {format_file_size(total_size)} / {MAX_TOTAL_SIZE_MB}MB",
+        icon="✅"
+    )
     
     # Show individual file details
     with st.expander("📋 View uploaded files", expanded=False):
@@ -405,8 +429,7 @@ def process_uploaded_files(uploaded_files: List) -> bool:
             progress_bar.progress(15)
             
             # Compute hash first to check if we need to reprocess
-            from ingestion import compute_file_hash
-            current_hash = compute_file_hash(uploaded_files)
+            current_hash = _lazy_import("ingestion").compute_file_hash(uploaded_files)
             
             if session_doc_hash and session_doc_hash == current_hash:
                 # Documents unchanged - skip processing
@@ -416,26 +439,40 @@ def process_uploaded_files(uploaded_files: List) -> bool:
                 progress_bar.empty()
                 status_text.empty()
                 
-                st.markdown("""
-                <div class="success-container">
-                    ✅ <strong>Documents already processed!</strong><br>
-                    Using cached embeddings from previous upload.<br>
-                    🎯 Ready for questions!
-                </div>
-                """, unsafe_allow_html=True)
+                st.success(
+                    "**Documents already processed!**  \n"
+                    "Using cached embeddings from previous upload.  \n"
+                    "🎯 Ready for questions!",
+                    icon="✅"
+                )
                 return True
             
             # Documents changed or first upload - process them
             status_text.text("Extracting text from documents...")
             progress_bar.progress(25)
             
+            def update_extraction(done: int, total: int):
+                # Parallel PDF extraction fills the 25-75% band
+                progress_bar.progress(25 + int(50 * done / total))
+                status_text.text(f"Extracting text from documents... ({done}/{total})")
+            
+            def update_embedding(embedded: int, total: int, cache_hits: int):
+                # Called once per embeddings batch; fills the 75-95% band
+                progress_bar.progress(75 + int(20 * embedded / max(total, 1)))
+                status_text.text(f"Generating embeddings... ({embedded}/{total}, {cache_hits} cached)")
+            
             # Process files with hash tracking
-            total_chunks, files_processed, doc_hash = ingest_documents(uploaded_files, session_doc_hash)
+            total_chunks, files_processed, doc_hash = ingest_documents(
+                uploaded_files,
+                session_doc_hash,
+                progress_callback=update_embedding,
+                extraction_callback=update_extraction
+            )
             
             # Store hash in session state
             st.session_state.current_doc_hash = doc_hash
             
-            progress_bar.progress(75)
+            progress_bar.progress(95)
             status_text.text("Finalizing vector store...")
             
             progress_bar.progress(100)
@@ -447,35 +484,28 @@ def process_uploaded_files(uploaded_files: List) -> bool:
             
             change_indicator = "🔄 Updated" if session_doc_hash else "✨ New"
             
-            st.markdown(f"""
-            <div class="success-container">
-                ✅ <strong>{change_indicator} - Processing completed successfully!</strong><br>
-                📄 Files processed: {files_processed}<br>
-                🔢 Text chunks created: {total_chunks}<br>
-                🎯 Ready for questions!
-            </div>
-            """, unsafe_allow_html=True)
+            st.success(
+                f"**{change_indicator} - Processing completed successfully!**  \n"
+                f"📄 Files processed: {files_processed}  \n"
+                f"🔢 Text chunks created: {total_chunks}  \n"
+                "🎯 Ready for questions!",
+                icon="✅"
+            )
             
             return True
             
-    except DocumentIngestionError as e:
+    except _lazy_import("ingestion").DocumentIngestionError as e:
         logger.error(f"Document ingestion error: {str(e)}")
-        st.markdown(f"""
-        <div class="error-container">
-            ❌ <strong>Processing failed</strong><br>
-            {str(e)}
-        </div>
-        """, unsafe_allow_html=True)
+        st.error(f"**Processing failed**  \n{str(e)}", icon="❌")
         return False
     except Exception as e:
         logger.error(f"Unexpected error during processing: {str(e)}")
         logger.error(traceback.format_exc())
-        st.markdown(f"""
-        <div class="error-container">
-            ❌ <strong>Unexpected error occurred</strong><br>
-            Please try again or contact support if the problem persists.
-        </div>
-        """, unsafe_allow_html=True)
+        st.error(
+            "**Unexpected error occurred**  \n"
+            "Please try again or contact support if the problem persists.",
+            icon="❌"
+        )
         return False
 
 
@@ -533,6 +563,174 @@ def display_answer_and_sources(answer: str, sources: List, show_sources: bool):
                 """, unsafe_allow_html=True)
 
 
+def stream_to_placeholder(answer_stream, placeholder) -> str:
+    """
+    Stream chunks into a placeholder, coalescing repaints.
+    
+    Each markdown() call ships the whole answer so far, so chunks are
+    buffered and flushed at most every STREAM_FLUSH_INTERVAL seconds
+    instead of once per token.
+    
+    Returns:
+        str: The complete answer text
+    """
+    parts = []
+    last_flush = time.monotonic()
+    
+    for chunk in answer_stream:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now - last_flush > STREAM_FLUSH_INTERVAL:
+            placeholder.markdown("".join(parts) + "▌")
+            last_flush = now
+    
+    full_answer = "".join(parts)
+    placeholder.markdown(full_answer)
+    return full_answer
+
+
+def render_chat_message(message: Dict[str, Any], show_sources: bool) -> None:
+    """Render one stored chat message, with its sources when requested."""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        # Show sources if available and user wants them
+        if show_sources and message["role"] == "assistant" and message.get("sources"):
+            with st.expander("📚 View Sources"):
+                for i, source in enumerate(message["sources"], 1):
+                    metadata = source.get('metadata', {})
+                    st.caption(f"**Source {i}**: {metadata.get('source', 'Unknown')} (Chunk {metadata.get('chunk_index', 'N/A')})")
+                    st.code(source.get('content', '')[:300] + "...")
+
+
+def render_chat_history(messages: List[Dict[str, Any]], show_sources: bool) -> None:
+    """
+    Render the newest MAX_RENDERED_HISTORY messages; older ones only on request.
+    
+    Every rerun re-emits the whole history, so long conversations are capped
+    instead of re-sending every answer and source expander per interaction.
+    """
+    older_count = max(0, len(messages) - MAX_RENDERED_HISTORY)
+    if older_count and st.toggle(f"Show {older_count} older message(s)", key="show_older_messages"):
+        for message in messages[:older_count]:
+            render_chat_message(message, show_sources)
+    for message in messages[older_count:]:
+        render_chat_message(message, show_sources)
+
+
+def build_conversation_context(messages: List[Dict[str, Any]]) -> str:
+    """
+    Format the most recent messages as conversation context for a follow-up question.
+    
+    Walks back from the newest message, keeping at most CONTEXT_MAX_MESSAGES
+    within CONTEXT_TOKEN_BUDGET tokens; the oldest message that only partly
+    fits is cut short rather than dropped.
+    
+    Args:
+        messages: Conversation so far, excluding the current question
+        
+    Returns:
+        str: "role: content" lines, oldest first (empty if there is no history)
+    """
+    budget = CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN
+    lines = []
+    for msg in reversed(messages[-CONTEXT_MAX_MESSAGES:]):
+        line = f"{msg['role']}: {msg['content']}"
+        if len(line) > budget:
+            if budget > len(msg['role']) + 2:
+                lines.append(line[:budget].rstrip() + "…")
+            break
+        lines.append(line)
+        budget -= len(line) + 1
+    return "\n".join(reversed(lines))
+
+
+def query_cache_key(query: str, store_fingerprint: str) -> bytes:
+    """
+    Build the answer-cache key for a query against the current documents.
+    
+    Args:
+        query: Query text as sent to the engine (including any conversation context)
+        store_fingerprint: get_store_fingerprint() of the shared vector store ("" without
+            documents), so clearing or re-ingesting from any session invalidates
+        
+    Returns:
+        16-byte BLAKE2b digest
+    """
+    normalized = " ".join(query.lower().split())
+    return hashlib.blake2b(f"{store_fingerprint}\0{normalized}".encode("utf-8"), digest_size=16).digest()
+
+
+@st.cache_resource
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Get the persistent answer cache shared by all sessions.
+    
+    Returns:
+        Optional[AnswerCache]: The cache, or None if it cannot be opened
+    """
+    try:
+        return AnswerCache(ANSWER_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Answer cache unavailable, caching per session only: {str(e)}")
+        return None
+
+
+def get_cached_answer(key: bytes) -> Optional[Tuple[str, List, Dict[str, Any]]]:
+    """
+    Return the cached (answer, sources, metrics) for a key, marking it recently used.
+    
+    The session LRU is checked first, then the on-disk cache (answers from
+    other sessions or before a restart).
+    """
+    cache = st.session_state.query_cache
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    
+    answer_cache = get_answer_cache()
+    if answer_cache is None:
+        return None
+    try:
+        stored = answer_cache.get(key)
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed: {str(e)}")
+        return None
+    if stored is None:
+        return None
+    
+    answer, sources, metrics = stored
+    cache[key] = (answer, sources, metrics)
+    while len(cache) > QUERY_CACHE_SIZE:
+        cache.popitem(last=False)
+    return cache[key]
+
+
+def store_cached_answer(key: bytes, answer: str, sources: List, metrics: Dict[str, Any],
+                        persist: bool = True) -> None:
+    """
+    Cache a completed answer, evicting the least recently used past QUERY_CACHE_SIZE.
+    
+    With persist=False the answer stays in this session (used for turns that are
+    not grounded in an identified document store, which must not be replayed to
+    other users).
+    """
+    # Error text from the engine is not worth replaying
+    if not answer.strip() or answer.strip().startswith("❌"):
+        return
+    cache = st.session_state.query_cache
+    cache[key] = (answer, sources, metrics)
+    cache.move_to_end(key)
+    while len(cache) > QUERY_CACHE_SIZE:
+        cache.popitem(last=False)
+    
+    answer_cache = get_answer_cache() if persist else None
+    if answer_cache is not None:
+        try:
+            answer_cache.set(key, (answer, sources, metrics))
+        except Exception as e:
+            logger.warning(f"Answer cache write failed: {str(e)}")
+
+
 def handle_question_answering():
     """Handle the question answering interface and logic."""
     try:
@@ -540,12 +738,11 @@ def handle_question_answering():
         stats = get_ingestion_stats()
         
         if stats["total_chunks"] == 0:
-            st.markdown("""
-            <div class="warning-container">
-                ⚠️ <strong>No documents available</strong><br>
-                Please upload and process some PDF files before asking questions.
-            </div>
-            """, unsafe_allow_html=True)
+            st.warning(
+                "**No documents available**  \n"
+                "Please upload and process some PDF files before asking questions.",
+                icon="⚠️"
+            )
             return
         
         # Question input
@@ -576,37 +773,43 @@ def handle_question_answering():
                     st.markdown("### 💭 ")
                     st.markdown("🤖 **Analyzing your question and searching document context...**")
                 
-                # Get query engine
-                query_engine = get_query_engine()
-                
-                # STEP 1: Retrieve chunks with visible spinner
-                with st.spinner("� Retrieving relevant sections from your documents..."):
-                    answer_stream, sources, metrics = query_engine.answer_question_streaming(
-                        question.strip(),
-                        thinking_placeholder=thinking_placeholder
-                    )
-                
-                # STEP 2: Prepare for streaming
-                # If retrieval took time but model not started yet, show different message
-                if thinking_placeholder:
-                    with thinking_placeholder.container():
-                        st.markdown("### 💭 ")
-                        st.markdown("🧩 **Deep model reasoning in progress...**")
-                        st.caption("_Synthesizing information from multiple sources_")
-                
-                # STEP 3: Stream the answer with live updates
-                st.markdown("### 💬 Answer")
-                answer_placeholder = st.empty()
-                full_answer = ""
+                store_fingerprint = get_store_fingerprint()
+                cache_key = query_cache_key(question.strip(), store_fingerprint)
+                cached = get_cached_answer(cache_key)
                 
-                # Stream response in real-time (thinking placeholder cleared on first token)
-                for chunk in answer_stream:
-                    full_answer += chunk
-                    # Update with cursor to show it's live
-                    answer_placeholder.markdown(full_answer + "▌")
-                
-                # Remove cursor and show final answer
-                answer_placeholder.markdown(full_answer)
+                if cached:
+                    # Same question against the same documents - replay the answer
+                    full_answer, sources, metrics = cached
+                    thinking_placeholder.empty()
+                    st.markdown("### 💬 Answer")
+                    st.markdown(full_answer)
+                else:
+                    # Get query engine
+                    query_engine = get_query_engine()
+                    
+                    # STEP 1: Retrieve chunks with visible spinner
+                    with st.spinner("� Retrieving relevant sections from your documents..."):
+                        answer_stream, sources, metrics = query_engine.answer_question_streaming(
+                            question.strip(),
+                            thinking_placeholder=thinking_placeholder
+                        )
+                    
+                    # STEP 2: Prepare for streaming
+                    # If retrieval took time but model not started yet, show different message
+                    if thinking_placeholder:
+                        with thinking_placeholder.container():
+                            st.markdown("### 💭 ")
+                            st.markdown("🧩 **Deep model reasoning in progress...**")
+                            st.caption("_Synthesizing information from multiple sources_")
+                    
+                    # STEP 3: Stream the answer with live updates
+                    st.markdown("### 💬 Answer")
+                    answer_placeholder = st.empty()
+                    
+                    # Stream response in real-time (thinking placeholder cleared on first token)
+                    full_answer = stream_to_placeholder(answer_stream, answer_placeholder)
+                    store_cached_answer(cache_key, full_answer, sources, metrics,
+                                        persist=bool(store_fingerprint))
                 
                 # Display performance metrics
                 st.caption(f"⚡ Retrieved {metrics.get('chunks_used', 0)} chunks in {metrics.get('retrieval_time', 0):.2f}s")
@@ -627,23 +830,17 @@ def handle_question_answering():
                         with st.expander(f"📄 Source {i}: {source_name} (Chunk {chunk_index})"):
                             st.markdown(f"```\n{content}...\n```")
                     
-            except QueryEngineError as e:
+            except _lazy_import("query_engine").QueryEngineError as e:
                 logger.error(f"Query engine error: {str(e)}")
-                st.markdown(f"""
-                <div class="error-container">
-                    ❌ <strong>Question processing failed</strong><br>
-                    {str(e)}
-                </div>
-                """, unsafe_allow_html=True)
+                st.error(f"**Question processing failed**  \n{str(e)}", icon="❌")
             except Exception as e:
                 logger.error(f"Unexpected error during question answering: {str(e)}")
                 logger.error(traceback.format_exc())
-                st.markdown("""
-                <div class="error-container">
-                    ❌ <strong>An unexpected error occurred</strong><br>
-                    Please try again or rephrase your question.
-                </div>
-                """, unsafe_allow_html=True)
+                st.error(
+                    "**An unexpected error occurred**  \n"
+                    "Please try again or rephrase your question.",
+                    icon="❌"
+                )
                 
     except Exception as e:
         logger.error(f"Error in question answering interface: {str(e)}")
@@ -695,9 +892,8 @@ def render_sidebar():
         
         # Clear session button
         if st.button("🔄 Reset Session", help="Clear all uploaded files and cached data"):
-            # Clear session state
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            # Clear session state (one mutation rather than a delete per key)
+            st.session_state.clear()
             st.success("Session reset successfully!")
             st.rerun()
 
@@ -716,8 +912,8 @@ def main() -> None:
         # INITIALIZE SESSION STATE - ChatGPT style
         if 'messages' not in st.session_state:
             st.session_state.messages = []
-        if 'query_cache' not in st.session_state:
-            st.session_state.query_cache = {}
+        if not isinstance(st.session_state.get('query_cache'), OrderedDict):
+            st.session_state.query_cache = OrderedDict()  # LRU of answers, see query_cache_key()
         if 'show_sources' not in st.session_state:
             st.session_state.show_sources = False
         if 'documents_processed' not in st.session_state:
@@ -757,18 +953,8 @@ def main() -> None:
         else:
             st.caption("💡 Upload documents to unlock document-based Q&A, or chat normally")
         
-        # Display chat history (ChatGPT style)
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-                # Show sources if available and user wants them
-                if message["role"] == "assistant" and "sources" in message and st.session_state.show_sources:
-                    if message["sources"]:
-                        with st.expander("📚 View Sources"):
-                            for i, source in enumerate(message["sources"], 1):
-                                metadata = source.get('metadata', {})
-                                st.caption(f"**Source {i}**: {metadata.get('source', 'Unknown')} (Chunk {metadata.get('chunk_index', 'N/A')})")
-                                st.code(source.get('content', '')[:300] + "...")
+        # Display chat history (ChatGPT style; older messages only on request)
+        render_chat_history(st.session_state.messages, st.session_state.show_sources)
         
         # Chat input (always visible, like ChatGPT)
         prompt_placeholder = "Ask a question about your documents..." if has_documents else "Chat with DocSense AI..."
@@ -798,33 +984,36 @@ def main() -> None:
                     # Get query engine
                     query_engine = get_query_engine()
                     
-                    # Build context from recent messages (last 3-5 for memory)
-                    context_messages = st.session_state.messages[-6:-1] if len(st.session_state.messages) > 1 else []
-                    context_text = ""
-                    if context_messages:
-                        context_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in context_messages[-3:]])
+                    # Build context from recent messages (last 3, within the token budget)
+                    context_text = build_conversation_context(st.session_state.messages[:-1])
                     
                     # Add context to query if available
                     enhanced_query = prompt
                     if context_text:
                         enhanced_query = f"Previous context:\n{context_text}\n\nCurrent question: {prompt}"
                     
-                    # SMART RETRIEVAL: Let query engine decide whether to use documents
-                    answer_stream, sources, metrics = query_engine.answer_question_streaming(
-                        enhanced_query,
-                        thinking_placeholder=thinking_placeholder
-                    )
-                    
-                    # Stream the response
+                    # No-document chat turns are only cached in this session
+                    store_fingerprint = get_store_fingerprint() if has_documents else ""
+                    cache_key = query_cache_key(enhanced_query, store_fingerprint)
+                    cached = get_cached_answer(cache_key)
                     response_placeholder = st.empty()
-                    full_response = ""
-                    
-                    for chunk in answer_stream:
-                        full_response += chunk
-                        response_placeholder.markdown(full_response + "▌")
                     
-                    # Final answer
-                    response_placeholder.markdown(full_response)
+                    if cached:
+                        # Same question, context and documents - replay the answer
+                        full_response, sources, metrics = cached
+                        thinking_placeholder.empty()
+                        response_placeholder.markdown(full_response)
+                    else:
+                        # SMART RETRIEVAL: Let query engine decide whether to use documents
+                        answer_stream, sources, metrics = query_engine.answer_question_streaming(
+                            enhanced_query,
+                            thinking_placeholder=thinking_placeholder
+                        )
+                        
+                        # Stream the response
+                        full_response = stream_to_placeholder(answer_stream, response_placeholder)
+                        store_cached_answer(cache_key, full_response, sources, metrics,
+                                            persist=bool(store_fingerprint))
                     
                     # Performance metrics (only if documents were used)
                     if metrics.get('document_used', False):
@@ -840,7 +1029,7 @@ def main() -> None:
                         "sources": sources if sources else []
                     })
                     
-                except QueryEngineError as e:
+                except _lazy_import("query_engine").QueryEngineError as e:
                     error_msg = f"❌ Query failed: {str(e)}"
                     st.error(error_msg)
                     st.session_state.messages.append({
@@ -9,11 +9,14 @@ Author: AI Assistant
 Last Updated: October 2025
 """
 
+import importlib
 import logging
 import os
+import queue
 import sys
 import time
-from typing import List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 import traceback
 
 import streamlit as st
@@ -22,14 +25,9 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Import mode modules
-try:
-    from chat_mode import get_chat_mode, ChatModeError
-    from document_mode import get_document_mode, DocumentModeError
-    from ingestion import ingest_documents, get_ingestion_stats, clear_vector_store, DocumentIngestionError, compute_file_hash
-except ImportError as e:
-    st.error(f"Failed to import required modules: {str(e)}")
-    st.stop()
+# Mode modules (chat_mode, document_mode, ingestion, semantic_cache) pull in
+# the OpenAI/ChromaDB/LangChain stacks, so they are imported on first use via
+# _lazy_import() rather than on every cold start.
 
 # Configure logging
 logging.basicConfig(
@@ -43,6 +41,26 @@ MAX_FILES = 5
 MAX_TOTAL_SIZE_MB = 50
 MAX_TOTAL_SIZE_BYTES = MAX_TOTAL_SIZE_MB * 1024 * 1024
 SUPPORTED_FORMATS = ["pdf", "txt"]
+MAX_HISTORY_MESSAGES = 40  # Per-mode history kept in session state
+PROMPT_HISTORY_MESSAGES = 6  # Most recent messages sent to the LLM
+SOURCE_PREVIEW_CHARS = 400
+FILE_SIZE_UNITS = ("B", "KB", "MB", "GB")
+STREAM_FLUSH_INTERVAL = 0.05  # Seconds between repaints of a streaming response
+
+# Widget label -> state value mappings, plus the lookups the widgets need
+MODE_OPTIONS = {
+    '🧠 Chat Mode': 'chat',
+    '📚 Document Mode': 'document'
+}
+MODE_LABELS = list(MODE_OPTIONS)
+
+DETAIL_OPTIONS = {
+    'Auto (Adaptive)': 'auto',
+    'Brief': 'brief',
+    'Detailed': 'detailed'
+}
+DETAIL_LABELS = list(DETAIL_OPTIONS)
+DETAIL_INDEX_BY_VALUE = {value: i for i, value in enumerate(DETAIL_OPTIONS.values())}
 
 # Page configuration
 st.set_page_config(
@@ -52,8 +70,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS (emitted on every run: Streamlit drops elements a rerun does not re-emit,
+# and an unchanged element is not re-rendered by the frontend)
+_CUSTOM_CSS = """
 <style>
     .main-header {
         text-align: center;
@@ -141,7 +160,33 @@ st.markdown("""
         }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Static HTML blocks for the mode indicator
+_CHAT_MODE_HTML = """
+<div class="mode-indicator chat-mode">
+    🧠 <strong>Chat Mode Active</strong><br>
+    <span style="font-size: 0.9rem;">General AI assistant - No document retrieval</span>
+</div>
+"""
+
+_DOC_MODE_HTML = """
+<div class="mode-indicator doc-mode">
+    📚 <strong>Document Mode Active</strong><br>
+    <span style="font-size: 0.9rem;">Strict RAG - Answers only from your uploaded documents</span>
+</div>
+"""
+
+st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
+
+
+def _lazy_import(module_name: str):
+    """Import a mode module on first use (later calls hit sys.modules)."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        st.error(f"Failed to import required modules: {str(e)}")
+        st.stop()
 
 
 def initialize_session_state():
@@ -168,6 +213,13 @@ def initialize_session_state():
     
     if 'detail_level' not in st.session_state:
         st.session_state.detail_level = 'auto'
+    
+    # Background ingestion
+    if 'ingest_job' not in st.session_state:
+        st.session_state.ingest_job = None
+    
+    if 'ingest_result' not in st.session_state:
+        st.session_state.ingest_result = None
 
 
 def validate_environment() -> bool:
@@ -199,60 +251,108 @@ def format_file_size(size_bytes: int) -> str:
     if size_bytes == 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    size = size_bytes
-    i = 0
+    # Unit index straight from the bit length: each unit is 10 bits wider
+    i = min((size_bytes.bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {FILE_SIZE_UNITS[i]}"
+
+
+@st.cache_data(ttl=5, show_spinner=False)
+def _cached_stats(doc_hash: Optional[str]) -> Dict[str, Any]:
+    """
+    Short-lived cache around get_ingestion_stats().
     
-    while size >= 1024 and i < len(size_names) - 1:
-        size /= 1024.0
-        i += 1
+    Keyed on the session's document hash so reruns reuse one stats scan;
+    cleared explicitly whenever documents are processed or removed.
+    """
+    return _lazy_import("ingestion").get_ingestion_stats()
+
+
+def _on_mode_change():
+    """Mode radio callback - updates the mode before the rerun it triggers."""
+    new_mode = MODE_OPTIONS[st.session_state.mode_radio]
+    if new_mode != st.session_state.mode:
+        st.session_state.mode = new_mode
+        logger.info(f"Mode switched to: {new_mode}")
+
+
+def _append_history(history_key: str, message: Dict[str, Any]):
+    """Append to a mode's history, keeping only the newest MAX_HISTORY_MESSAGES."""
+    history = st.session_state[history_key]
+    history.append(message)
+    del history[:-MAX_HISTORY_MESSAGES]
+
+
+def _source_reference(source: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a retrieved source to what history needs to re-render it.
     
-    return f"{size:.1f} {size_names[i]}"
+    Vector-store chunks keep only their id (content is fetched on demand);
+    synthetic sources without an id keep just the displayed preview.
+    """
+    reference = {
+        'metadata': source.get('metadata', {}),
+        'similarity': source.get('similarity', 0.0)
+    }
+    if source.get('id'):
+        reference['id'] = source['id']
+    else:
+        reference['content'] = source.get('content', '')[:SOURCE_PREVIEW_CHARS]
+    return reference
+
+
+@st.cache_data(show_spinner=False)
+def get_chunk_by_id(chunk_id: str, doc_hash: Optional[str]) -> str:
+    """
+    Fetch a stored chunk's text from the vector store.
+    
+    Chunk ids repeat across uploads of the same filename, so the cache is also
+    keyed on the document hash and cleared whenever documents change.
+    """
+    try:
+        result = _lazy_import("ingestion").get_collection().get(ids=[chunk_id])
+        documents = result.get('documents') or []
+        return documents[0] if documents else ""
+    except Exception as e:
+        logger.warning(f"Failed to load chunk '{chunk_id}': {str(e)}")
+        return ""
 
 
 def render_mode_selector():
     """Render mode selection radio buttons."""
     st.markdown("### 🧭 Select Mode")
     
-    mode_options = {
-        '🧠 Chat Mode': 'chat',
-        '📚 Document Mode': 'document'
-    }
-    
-    selected_label = '🧠 Chat Mode' if st.session_state.mode == 'chat' else '📚 Document Mode'
-    
-    mode_selection = st.radio(
+    # Widget change already reruns the script; the callback updates state first
+    st.radio(
         "Choose your interaction mode:",
-        options=list(mode_options.keys()),
+        options=MODE_LABELS,
         index=0 if st.session_state.mode == 'chat' else 1,
         horizontal=True,
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key="mode_radio",
+        on_change=_on_mode_change
     )
-    
-    # Update mode if changed
-    new_mode = mode_options[mode_selection]
-    if new_mode != st.session_state.mode:
-        st.session_state.mode = new_mode
-        logger.info(f"Mode switched to: {new_mode}")
-        st.rerun()
 
 
 def render_mode_info():
     """Render information about current mode."""
-    if st.session_state.mode == 'chat':
-        st.markdown("""
-        <div class="mode-indicator chat-mode">
-            🧠 <strong>Chat Mode Active</strong><br>
-            <span style="font-size: 0.9rem;">General AI assistant - No document retrieval</span>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-        <div class="mode-indicator doc-mode">
-            📚 <strong>Document Mode Active</strong><br>
-            <span style="font-size: 0.9rem;">Strict RAG - Answers only from your uploaded documents</span>
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown(_CHAT_MODE_HTML if st.session_state.mode == 'chat' else _DOC_MODE_HTML, unsafe_allow_html=True)
+
+
+def validate_upload(uploaded_files: List) -> Tuple[bool, str]:
+    """
+    Check an upload set against the file count and total size limits.
+    
+    Returns:
+        Tuple[bool, str]: (is_valid, message to display)
+    """
+    if len(uploaded_files) > MAX_FILES:
+        return False, f"❌ Too many files. Maximum: {MAX_FILES}"
+    
+    total_size = sum(f.size for f in uploaded_files)
+    if total_size > MAX_TOTAL_SIZE_BYTES:
+        return False, f"❌ Total size too large: {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)"
+    
+    return True, f"✅ {len(uploaded_files)} file(s) validated ({format_file_size(total_size)})"
 
 
 def render_sidebar():
@@ -262,21 +362,14 @@ def render_sidebar():
         
         # Detail level control
         st.markdown("### Response Style")
-        detail_options = {
-            'Auto (Adaptive)': 'auto',
-            'Brief': 'brief',
-            'Detailed': 'detailed'
-        }
-        
-        detail_label = [k for k, v in detail_options.items() if v == st.session_state.detail_level][0]
-        
         detail_selection = st.selectbox(
             "Response Detail Level",
-            options=list(detail_options.keys()),
-            index=list(detail_options.values()).index(st.session_state.detail_level),
+            options=DETAIL_LABELS,
+            index=DETAIL_INDEX_BY_VALUE[st.session_state.detail_level],
             help="Auto adapts to query complexity, Brief for concise answers, Detailed for comprehensive analysis"
         )
-        st.session_state.detail_level = detail_options[detail_selection]
+        if st.session_state.detail_level != DETAIL_OPTIONS[detail_selection]:
+            st.session_state.detail_level = DETAIL_OPTIONS[detail_selection]
         
         st.markdown("---")
         
@@ -293,25 +386,33 @@ def render_sidebar():
             )
             
             if uploaded_files:
-                # Validate upload
-                if len(uploaded_files) > MAX_FILES:
-                    st.error(f"❌ Too many files. Maximum: {MAX_FILES}")
+                # Validate upload (once per distinct upload set)
+                upload_signature = tuple((f.name, f.size) for f in uploaded_files)
+                if st.session_state.get('_uploader_sig') != upload_signature:
+                    st.session_state._uploader_sig = upload_signature
+                    st.session_state._uploader_validation = validate_upload(uploaded_files)
+                is_valid, validation_message = st.session_state._uploader_validation
+                
+                if not is_valid:
+                    st.error(validation_message)
                 else:
-                    total_size = sum(f.size for f in uploaded_files)
-                    if total_size > MAX_TOTAL_SIZE_BYTES:
-                        st.error(f"❌ Total size too large: {format_file_size(total_size)} (limit: {MAX_TOTAL_SIZE_MB}MB)")
-                    else:
-                        st.success(f"✅ {len(uploaded_files)} file(s) validated ({format_file_size(total_size)})")
-                        
-                        if st.button("🚀 Process Documents", use_container_width=True):
-                            process_documents(uploaded_files)
+                    st.success(validation_message)
+                    
+                    if st.button("🚀 Process Documents", use_container_width=True):
+                        process_documents(uploaded_files)
+            
+            if st.session_state.ingest_job is not None:
+                render_ingest_progress()
+            elif st.session_state.ingest_result:
+                st.markdown(st.session_state.ingest_result, unsafe_allow_html=True)
+                st.session_state.ingest_result = None
             
             st.markdown("---")
             
             # Show document stats
             st.markdown("## 📊 Document Status")
             try:
-                stats = get_ingestion_stats()
+                stats = _cached_stats(st.session_state.current_doc_hash)
                 if stats["total_chunks"] > 0:
                     st.info(f"📄 Files: {stats['total_files']}\n\n🔢 Chunks: {stats['total_chunks']}")
                     
@@ -323,7 +424,9 @@ def render_sidebar():
                     )
                     
                     if st.button("🗑️ Clear Documents", help="Remove all uploaded documents"):
-                        clear_vector_store()
+                        _lazy_import("ingestion").clear_vector_store()
+                        _cached_stats.clear()
+                        get_chunk_by_id.clear()
                         st.session_state.current_doc_hash = None
                         st.session_state.doc_mode_history = []
                         st.success("Documents cleared!")
@@ -361,71 +464,177 @@ def render_sidebar():
                 st.rerun()
 
 
+@st.cache_resource(show_spinner=False)
+def get_ingest_executor() -> ThreadPoolExecutor:
+    """Process-wide worker thread for hashing and ingesting uploads off the script thread."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="docsense-ingest")
+
+
+def _run_ingestion(uploaded_files: List, session_doc_hash: Optional[str],
+                   progress_queue: "queue.Queue") -> Dict[str, Any]:
+    """
+    Worker entry point: hash the uploads and ingest them if they changed.
+    
+    Progress is reported as (percent, message) tuples on progress_queue. Never
+    touches Streamlit: parsed structured files come back in the result for
+    render_ingest_progress to store, and import errors surface via the future.
+    """
+    ingestion = importlib.import_module("ingestion")
+    
+    progress_queue.put((15, "Checking for changes..."))
+    current_hash = ingestion.compute_file_hash(uploaded_files)
+    if session_doc_hash and session_doc_hash == current_hash:
+        return {"unchanged": True, "doc_hash": current_hash}
+    
+    progress_queue.put((35, "Extracting text..."))
+    
+    def report_embedding_progress(embedded: int, total: int, cache_hits: int):
+        progress_queue.put((
+            35 + int(55 * embedded / total),
+            f"Embedded {embedded}/{total} chunks (cache hits: {cache_hits})"
+        ))
+    
+    structured_data = {}
+    total_chunks, files_processed, doc_hash = ingestion.ingest_documents(
+        uploaded_files, session_doc_hash, progress_callback=report_embedding_progress,
+        structured_data=structured_data
+    )
+    progress_queue.put((90, "Finalizing..."))
+    return {
+        "unchanged": False,
+        "doc_hash": doc_hash,
+        "total_chunks": total_chunks,
+        "files_processed": files_processed,
+        "structured_data": structured_data
+    }
+
+
 def process_documents(uploaded_files: List):
-    """Process uploaded documents for Document Mode."""
+    """Start processing uploaded documents for Document Mode in the background."""
+    if st.session_state.ingest_job is not None:
+        st.info("⏳ Documents are already being processed...")
+        return
+    
+    progress_queue = queue.Queue()
+    session_doc_hash = st.session_state.get('current_doc_hash', None)
+    future = get_ingest_executor().submit(
+        _run_ingestion, uploaded_files, session_doc_hash, progress_queue
+    )
+    st.session_state.ingest_job = {
+        "future": future,
+        "progress": progress_queue,
+        "status": (0, "Queued..."),
+        "session_doc_hash": session_doc_hash
+    }
+
+
+@st.fragment(run_every=0.5)
+def render_ingest_progress():
+    """
+    Poll the background ingestion job and publish its result when done.
+    
+    Only called while a job is in flight, so the polling stops with it.
+    """
+    job = st.session_state.ingest_job
+    
+    # Keep only the latest progress update
+    while not job["progress"].empty():
+        job["status"] = job["progress"].get_nowait()
+    
+    future = job["future"]
+    if not future.done():
+        percent, message = job["status"]
+        st.progress(percent, text=message)
+        return
+    
+    st.session_state.ingest_job = None
     try:
-        session_doc_hash = st.session_state.get('current_doc_hash', None)
-        
-        with st.spinner("🔄 Processing documents..."):
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            status_text.text("Checking for changes...")
-            progress_bar.progress(15)
-            
-            # Compute hash
-            current_hash = compute_file_hash(uploaded_files)
-            
-            if session_doc_hash and session_doc_hash == current_hash:
-                status_text.text("Documents unchanged - using cache...")
-                progress_bar.progress(100)
-                time.sleep(0.5)
-                progress_bar.empty()
-                status_text.empty()
-                
-                st.markdown("""
-                <div class="success-container">
-                    ✅ <strong>Documents already processed!</strong><br>
-                    Using cached embeddings from previous upload.
-                </div>
-                """, unsafe_allow_html=True)
-                return
-            
-            status_text.text("Extracting text...")
-            progress_bar.progress(35)
-            
-            total_chunks, files_processed, doc_hash = ingest_documents(uploaded_files, session_doc_hash)
-            st.session_state.current_doc_hash = doc_hash
-            
-            progress_bar.progress(90)
-            status_text.text("Finalizing...")
-            
-            progress_bar.progress(100)
-            progress_bar.empty()
-            status_text.empty()
-            
-            change_indicator = "🔄 Updated" if session_doc_hash else "✨ New"
-            
-            st.markdown(f"""
-            <div class="success-container">
-                ✅ <strong>{change_indicator} - Processing complete!</strong><br>
-                📄 Files: {files_processed} | 🔢 Chunks: {total_chunks}<br>
-                🎯 Ready for document-based Q&A!
-            </div>
-            """, unsafe_allow_html=True)
-            
+        result = future.result()
     except Exception as e:
         logger.error(f"Document processing failed: {str(e)}")
-        st.markdown(f"""
+        st.session_state.ingest_result = f"""
         <div class="error-container">
             ❌ <strong>Processing failed</strong><br>
             {str(e)}
         </div>
-        """, unsafe_allow_html=True)
+        """
+        st.rerun()
+    
+    if result["unchanged"]:
+        st.session_state.ingest_result = """
+        <div class="success-container">
+            ✅ <strong>Documents already processed!</strong><br>
+            Using cached embeddings from previous upload.
+        </div>
+        """
+    else:
+        _cached_stats.clear()
+        get_chunk_by_id.clear()
+        st.session_state.current_doc_hash = result["doc_hash"]
+        st.session_state.structured_data = result["structured_data"]
+        change_indicator = "🔄 Updated" if job["session_doc_hash"] else "✨ New"
+        st.session_state.ingest_result = f"""
+        <div class="success-container">
+            ✅ <strong>{change_indicator} - Processing complete!</strong><br>
+            📄 Files: {result["files_processed"]} | 🔢 Chunks: {result["total_chunks"]}<br>
+            🎯 Ready for document-based Q&A!
+        </div>
+        """
+    # Full rerun so the stats and main area pick up the new documents
+    st.rerun()
+
+
+@st.cache_resource(show_spinner=False)
+def get_chat_mode():
+    """Process-wide ChatMode instance (holds the OpenAI clients)."""
+    return _lazy_import("chat_mode").get_chat_mode()
+
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache():
+    """Process-wide semantic cache of Document Mode answers."""
+    return _lazy_import("semantic_cache").SemanticCache()
+
+
+def embed_query(query: str) -> Optional[List[float]]:
+    """Embed a query with the ingestion embedder, or None if embedding fails."""
+    ingestion = _lazy_import("ingestion")
+    try:
+        return ingestion.generate_embeddings([query])[0]
+    except ingestion.DocumentIngestionError as e:
+        logger.warning(f"Query embedding failed, skipping semantic cache: {str(e)}")
+        return None
+
+
+def stream_to_placeholder(response_stream, placeholder) -> str:
+    """
+    Stream chunks into a placeholder, coalescing repaints.
+    
+    Each markdown() call ships the whole response so far, so chunks are
+    buffered and flushed at most every STREAM_FLUSH_INTERVAL seconds
+    instead of once per token.
+    
+    Returns:
+        str: The complete response text
+    """
+    parts = []
+    last_flush = time.monotonic()
+    
+    for chunk in response_stream:
+        parts.append(chunk)
+        now = time.monotonic()
+        if now - last_flush > STREAM_FLUSH_INTERVAL:
+            placeholder.markdown("".join(parts) + "▌")
+            last_flush = now
+    
+    full_response = "".join(parts)
+    placeholder.markdown(full_response)
+    return full_response
 
 
 def handle_chat_mode():
     """Handle Chat Mode interface and logic."""
+    chat_module = _lazy_import("chat_mode")
     st.markdown("### 💬 Chat with AI")
     
     # Display chat history
@@ -436,7 +645,7 @@ def handle_chat_mode():
     # Chat input
     if prompt := st.chat_input("Ask me anything..."):
         # Add user message
-        st.session_state.chat_mode_history.append({"role": "user", "content": prompt})
+        _append_history('chat_mode_history', {"role": "user", "content": prompt})
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -456,44 +665,39 @@ def handle_chat_mode():
                 response_stream, metadata = chat_mode.generate_response(
                     query=prompt,
                     detail_level=st.session_state.detail_level,
-                    conversation_history=st.session_state.chat_mode_history,
+                    conversation_history=st.session_state.chat_mode_history[-PROMPT_HISTORY_MESSAGES:],
                     thinking_placeholder=thinking_placeholder
                 )
                 
                 # Stream response
                 response_placeholder = st.empty()
-                full_response = ""
-                
-                for chunk in response_stream:
-                    full_response += chunk
-                    response_placeholder.markdown(full_response + "▌")
-                
-                response_placeholder.markdown(full_response)
+                full_response = stream_to_placeholder(response_stream, response_placeholder)
                 
                 # Show metadata
                 detail_level = metadata.get('detail_level', 'auto')
                 st.caption(f"💬 Chat Mode | {detail_level.capitalize()} response")
                 
                 # Save to history
-                st.session_state.chat_mode_history.append({"role": "assistant", "content": full_response})
+                _append_history('chat_mode_history', {"role": "assistant", "content": full_response})
                 
-            except ChatModeError as e:
+            except chat_module.ChatModeError as e:
                 error_msg = f"❌ Chat Mode error: {str(e)}"
                 st.error(error_msg)
-                st.session_state.chat_mode_history.append({"role": "assistant", "content": error_msg})
+                _append_history('chat_mode_history', {"role": "assistant", "content": error_msg})
             except Exception as e:
                 logger.error(f"Unexpected error in Chat Mode: {str(e)}")
                 logger.error(traceback.format_exc())
                 error_msg = "❌ An unexpected error occurred. Please try again."
                 st.error(error_msg)
-                st.session_state.chat_mode_history.append({"role": "assistant", "content": error_msg})
+                _append_history('chat_mode_history', {"role": "assistant", "content": error_msg})
 
 
 def handle_document_mode():
     """Handle Document Mode interface and logic."""
+    document_module = _lazy_import("document_mode")
     # Check if documents are available
     try:
-        stats = get_ingestion_stats()
+        stats = _cached_stats(st.session_state.current_doc_hash)
         has_documents = stats["total_chunks"] > 0
     except:
         has_documents = False
@@ -528,13 +732,16 @@ def handle_document_mode():
                         for i, source in enumerate(message["sources"], 1):
                             metadata = source.get('metadata', {})
                             similarity = source.get('similarity', 0.0)
+                            content = source.get('content')
+                            if content is None:
+                                content = get_chunk_by_id(source['id'], st.session_state.current_doc_hash)
                             st.caption(f"**[Source {i}]**: {metadata.get('source', 'Unknown')} (Chunk {metadata.get('chunk_index', 'N/A')}, Relevance: {similarity:.2f})")
-                            st.code(source.get('content', '')[:400] + "...")
+                            st.code(content[:SOURCE_PREVIEW_CHARS] + "...")
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your documents..."):
         # Add user message
-        st.session_state.doc_mode_history.append({"role": "user", "content": prompt})
+        _append_history('doc_mode_history', {"role": "user", "content": prompt})
         
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -547,26 +754,43 @@ def handle_document_mode():
                 with thinking_placeholder.container():
                     st.markdown("🔍 **Searching documents...**")
                 
-                # Get document mode
-                doc_mode = get_document_mode()
-                
-                # Generate RAG response
-                response_stream, sources, metadata = doc_mode.answer_from_documents(
-                    query=prompt,
-                    detail_level=st.session_state.detail_level,
-                    conversation_history=st.session_state.doc_mode_history,
-                    thinking_placeholder=thinking_placeholder
+                # OPTIMIZATION: Serve semantically equivalent questions from cache
+                semantic_cache = get_semantic_cache()
+                # The prompt carries the prior turns, so answers are only shared within the same conversation
+                prompt_history = st.session_state.doc_mode_history[-PROMPT_HISTORY_MESSAGES:]
+                cache_scope = (
+                    st.session_state.current_doc_hash,
+                    st.session_state.detail_level,
+                    _lazy_import("semantic_cache").conversation_digest(prompt_history[:-1])
                 )
+                query_embedding = embed_query(prompt)
+                cached = None
+                if query_embedding is not None:
+                    cached = semantic_cache.lookup(cache_scope, query_embedding)
+                
+                if cached is not None:
+                    cached_response, sources, metadata = cached
+                    thinking_placeholder.empty()
+                    response_stream = iter([cached_response])
+                else:
+                    # Get document mode
+                    doc_mode = document_module.get_document_mode()
+                    
+                    # Generate RAG response
+                    response_stream, retrieved_sources, metadata = doc_mode.answer_from_documents(
+                        query=prompt,
+                        detail_level=st.session_state.detail_level,
+                        conversation_history=prompt_history,
+                        thinking_placeholder=thinking_placeholder
+                    )
+                    sources = [_source_reference(source) for source in retrieved_sources]
                 
                 # Stream response
                 response_placeholder = st.empty()
-                full_response = ""
-                
-                for chunk in response_stream:
-                    full_response += chunk
-                    response_placeholder.markdown(full_response + "▌")
+                full_response = stream_to_placeholder(response_stream, response_placeholder)
                 
-                response_placeholder.markdown(full_response)
+                if cached is None and query_embedding is not None and not metadata.get('error'):
+                    semantic_cache.store(cache_scope, query_embedding, (full_response, sources, metadata))
                 
                 # Show metadata if successful
                 if not metadata.get('error'):
@@ -575,22 +799,22 @@ def handle_document_mode():
                     st.caption(f"📚 Document Mode | Retrieved {chunks_retrieved} chunks | {detail_level.capitalize()} response")
                 
                 # Save to history
-                st.session_state.doc_mode_history.append({
+                _append_history('doc_mode_history', {
                     "role": "assistant",
                     "content": full_response,
                     "sources": sources
                 })
                 
-            except DocumentModeError as e:
+            except document_module.DocumentModeError as e:
                 error_msg = f"❌ Document Mode error: {str(e)}"
                 st.error(error_msg)
-                st.session_state.doc_mode_history.append({"role": "assistant", "content": error_msg, "sources": []})
+                _append_history('doc_mode_history', {"role": "assistant", "content": error_msg, "sources": []})
             except Exception as e:
                 logger.error(f"Unexpected error in Document Mode: {str(e)}")
                 logger.error(traceback.format_exc())
                 error_msg = "❌ An unexpected error occurred. Please try again."
                 st.error(error_msg)
-                st.session_state.doc_mode_history.append({"role": "assistant", "content": error_msg, "sources": []})
+                _append_history('doc_mode_history', {"role": "assistant", "content": error_msg, "sources": []})
 
 
 def main():
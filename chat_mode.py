@@ -15,12 +15,18 @@ Author: AI Assistant
 Created: October 2025
 """
 
+import asyncio
+import importlib.util
 import logging
 import os
-from typing import Generator, Dict, Any, Tuple
+import re
+import threading
+from functools import lru_cache
+from typing import AsyncGenerator, Generator, Dict, Any, Tuple
 import time
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI, RateLimitError
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -31,6 +37,10 @@ logger = logging.getLogger(__name__)
 
 # Constants
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "llama-3.3-70b-versatile")
+# Models tried in order when the current one is rate limited (comma-separated)
+FALLBACK_MODELS = [
+    model.strip() for model in os.getenv("OPENAI_FALLBACK_MODELS", "").split(",") if model.strip()
+]
 MAX_RETRIES = 3
 
 # Response depth settings - GROQ OPTIMIZED FOR CHATGPT-LIKE QUALITY
@@ -42,6 +52,128 @@ TOP_P = 0.9
 FREQUENCY_PENALTY = 0.3
 PRESENCE_PENALTY = 0.3
 
+# Query complexity patterns, one alternation per bucket. Greetings must be whole
+# words ("hi" is not "this"); keywords match at a word start ("detail" in "detailed")
+CASUAL_PATTERN = re.compile(
+    r"\b(?:hello|hi|hey|thanks|thank you|bye|good morning|good evening"
+    r"|how are you|what's up|whats up|sup)\b"
+)
+ANALYTICAL_PATTERN = re.compile(r"\b(?:why|how|explain|compare|analyze|discuss|describe|elaborate)")
+DETAILED_PATTERN = re.compile(
+    r"\b(?:why|how does|how can|how to|explain|compare|contrast|analyze|discuss|describe"
+    r"|elaborate|detail|comprehensive|in depth|what are the implications|what factors"
+    r"|reasoning|pros and cons|advantages and disadvantages)"
+)
+COMPLEXITY_CACHE_SIZE = 512
+
+# System prompts (module-level so the same string is sent every turn)
+SYSTEM_PROMPT_DETAILED = """You are a helpful, intelligent AI assistant — like ChatGPT.
+
+**Your Purpose:**
+- Provide clear, informative, and well-reasoned responses
+- Think deeply and explain concepts thoroughly when asked
+- Be conversational yet professional
+- Use natural language without robotic patterns
+
+**Important:**
+- You are in CHAT MODE (no document access)
+- If asked about uploaded files or documents, respond:
+  "You're in Chat Mode — switch to Document Mode to analyze your uploaded files."
+- Answer general knowledge questions naturally and comprehensively
+- Structure detailed responses with clear paragraphs and logical flow"""
+SYSTEM_PROMPT_BRIEF = """You are a helpful AI assistant in CHAT MODE.
+
+Be concise, friendly, and to the point. If asked about documents, remind the user to switch to Document Mode."""
+HISTORY_MAX_MESSAGES = 10
+
+# HTTP connection pool shared by every ChatMode (HTTP/2 only if 'h2' is installed)
+HTTP_MAX_CONNECTIONS = 128
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 64
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Streaming: deltas per yielded chunk start at MIN and grow by GROWTH up to MAX;
+# a batch is also flushed once FLUSH_INTERVAL seconds have passed
+STREAM_MIN_BATCH = 1
+STREAM_MAX_BATCH = 32
+STREAM_BATCH_GROWTH = 3.0
+STREAM_FLUSH_INTERVAL = 0.04
+
+
+@lru_cache(maxsize=COMPLEXITY_CACHE_SIZE)
+def _classify_query(query_lower: str) -> str:
+    """Classify a lowercased query as 'detailed' or 'brief' (memoized per query)."""
+    # Casual/greeting keywords → brief
+    if CASUAL_PATTERN.search(query_lower):
+        return 'brief'
+    
+    # Very short queries (≤5 words) → brief unless analytical
+    if len(query_lower.split()) <= 5 and not ANALYTICAL_PATTERN.search(query_lower):
+        return 'brief'
+    
+    # Analytical keywords → detailed
+    if DETAILED_PATTERN.search(query_lower):
+        return 'detailed'
+    
+    # Default to brief for efficiency
+    return 'brief'
+
+
+_stream_loop = None
+_stream_loop_lock = threading.Lock()
+
+
+def _get_stream_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared event loop that runs async streams for sync callers."""
+    global _stream_loop
+    with _stream_loop_lock:
+        if _stream_loop is None:
+            _stream_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_stream_loop.run_forever, name="chat-mode-stream-loop", daemon=True
+            ).start()
+        return _stream_loop
+
+
+def _http_client_options() -> Dict[str, Any]:
+    """Pool settings for the httpx clients behind the OpenAI clients."""
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        "timeout": HTTP_TIMEOUT,
+    }
+
+
+@lru_cache(maxsize=None)
+def _get_client(base_url: str, api_key: str) -> OpenAI:
+    """Process-wide OpenAI client per endpoint, reusing pooled connections."""
+    return OpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        http_client=httpx.Client(**_http_client_options())
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_async_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client per endpoint (used on the stream loop only)."""
+    return AsyncOpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        http_client=httpx.AsyncClient(**_http_client_options())
+    )
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an API error is a 429 / rate limit response."""
+    if isinstance(error, RateLimitError):
+        return True
+    error_str = str(error)
+    return '429' in error_str or 'rate limit' in error_str.lower() or 'rate_limit' in error_str
+
 
 class ChatModeError(Exception):
     """Custom exception for chat mode errors."""
@@ -74,11 +206,9 @@ class ChatMode:
             if not self.api_key:
                 raise ChatModeError("OPENAI_API_KEY not set")
             
-            # Initialize OpenRouter client
-            self.client = OpenAI(
-                base_url=self.base_url,
-                api_key=self.api_key
-            )
+            # Shared OpenRouter clients (async client serves the streams)
+            self.client = _get_client(self.base_url, self.api_key)
+            self.aclient = _get_async_client(self.base_url, self.api_key)
             
             logger.info(f"✓ Chat Mode initialized with model: {model_name}")
             
@@ -96,41 +226,7 @@ class ChatMode:
         Returns:
             'detailed' or 'brief'
         """
-        query_lower = query.lower().strip()
-        
-        # Casual/greeting keywords → brief
-        casual_patterns = [
-            'hello', 'hi', 'hey', 'thanks', 'thank you', 'bye',
-            'good morning', 'good evening', 'how are you',
-            'what\'s up', 'whats up', 'sup'
-        ]
-        
-        if any(pattern in query_lower for pattern in casual_patterns):
-            return 'brief'
-        
-        # Very short queries (≤5 words) → brief unless analytical
-        if len(query.split()) <= 5:
-            analytical_keywords = [
-                'why', 'how', 'explain', 'compare', 'analyze',
-                'discuss', 'describe', 'elaborate'
-            ]
-            if not any(kw in query_lower for kw in analytical_keywords):
-                return 'brief'
-        
-        # Analytical keywords → detailed
-        detailed_triggers = [
-            'why', 'how does', 'how can', 'how to', 'explain',
-            'compare', 'contrast', 'analyze', 'discuss', 'describe',
-            'elaborate', 'detail', 'comprehensive', 'in depth',
-            'what are the implications', 'what factors', 'reasoning',
-            'pros and cons', 'advantages and disadvantages'
-        ]
-        
-        if any(trigger in query_lower for trigger in detailed_triggers):
-            return 'detailed'
-        
-        # Default to brief for efficiency
-        return 'brief'
+        return _classify_query(query.lower().strip())
     
     def build_prompt(self, query: str, detail_level: str, conversation_history: list = None) -> list:
         """
@@ -144,72 +240,61 @@ class ChatMode:
         Returns:
             List of message dicts for OpenAI API
         """
-        # Conditional system message
-        if detail_level == 'detailed':
-            system_message = """You are a helpful, intelligent AI assistant — like ChatGPT.
-
-**Your Purpose:**
-- Provide clear, informative, and well-reasoned responses
-- Think deeply and explain concepts thoroughly when asked
-- Be conversational yet professional
-- Use natural language without robotic patterns
-
-**Important:**
-- You are in CHAT MODE (no document access)
-- If asked about uploaded files or documents, respond:
-  "You're in Chat Mode — switch to Document Mode to analyze your uploaded files."
-- Answer general knowledge questions naturally and comprehensively
-- Structure detailed responses with clear paragraphs and logical flow"""
-        else:
-            system_message = """You are a helpful AI assistant in CHAT MODE.
-
-Be concise, friendly, and to the point. If asked about documents, remind the user to switch to Document Mode."""
+        # Static system message: identical prefix every turn, so the provider can reuse its prefill
+        system_message = SYSTEM_PROMPT_DETAILED if detail_level == 'detailed' else SYSTEM_PROMPT_BRIEF
         
         # Build message list
         messages = [{"role": "system", "content": system_message}]
         
         # Add conversation history (last 5 exchanges)
         if conversation_history:
-            messages.extend(conversation_history[-10:])
+            messages.extend(conversation_history[-HISTORY_MAX_MESSAGES:])
         
         # Add current query
         messages.append({"role": "user", "content": query})
         
         return messages
     
-    def stream_response(
+    async def astream_response(
         self,
         query: str,
         detail_level: str = 'auto',
         conversation_history: list = None,
-        thinking_placeholder=None
-    ) -> Generator[str, None, None]:
+        cap_brief: bool = True
+    ) -> AsyncGenerator[str, None]:
         """
-        Stream conversational response from the LLM.
+        Stream conversational response from the LLM without blocking a thread.
         
         Args:
             query: User's question
             detail_level: 'auto', 'brief', or 'detailed'
             conversation_history: Previous conversation messages
-            thinking_placeholder: Streamlit placeholder to clear on first token
+            cap_brief: Cap 'brief' answers at BRIEF_MAX_TOKENS; False when the
+                level was auto-detected, so 'auto' only picks the prompt
             
         Yields:
-            Text chunks as they arrive
+            Text chunks: the first token as soon as it arrives, then deltas
+            coalesced into batches that grow from STREAM_MIN_BATCH to
+            STREAM_MAX_BATCH (or whatever arrived within STREAM_FLUSH_INTERVAL)
         """
+        pending = []
         try:
             # Auto-detect complexity if needed
             if detail_level == 'auto':
                 detected_level = self.detect_query_complexity(query)
                 logger.info(f"Auto-detected complexity: {detected_level} for query: {query[:50]}...")
+                cap_brief = False
             else:
                 detected_level = detail_level
             
-            # Set generation parameters based on detail level
+            # Set generation parameters based on detail level. An auto-detected
+            # 'brief' keeps the concise prompt but not the short cap, so the model
+            # decides the length and a misclassified question is never truncated
             if detected_level == 'detailed':
                 max_tokens = DETAILED_MAX_TOKENS
                 temperature = DETAILED_TEMPERATURE
             else:
-                max_tokens = BRIEF_MAX_TOKENS
+                max_tokens = BRIEF_MAX_TOKENS if cap_brief else DETAILED_MAX_TOKENS
                 temperature = BRIEF_TEMPERATURE
             
             # Build messages
@@ -221,48 +306,117 @@ Be concise, friendly, and to the point. If asked about documents, remind the use
             start_time = time.time()
             first_token_received = False
             
-            # Create streaming completion
-            stream = self.client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": self.site_url,
-                    "X-Title": self.site_name,
-                },
-                model=self.model_name,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=TOP_P,
-                frequency_penalty=FREQUENCY_PENALTY,
-                presence_penalty=PRESENCE_PENALTY,
-                stream=True
-            )
+            # Create streaming completion, falling back to the next model on a 429
+            models = [self.model_name] + [m for m in FALLBACK_MODELS if m != self.model_name]
+            for model_index, model in enumerate(models):
+                is_last_model = model_index == len(models) - 1
+                # Fail over at once instead of letting the SDK retry a rate-limited model
+                client = self.aclient if is_last_model else self.aclient.with_options(max_retries=0)
+                try:
+                    stream = await client.chat.completions.create(
+                        extra_headers={
+                            "HTTP-Referer": self.site_url,
+                            "X-Title": self.site_name,
+                        },
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        top_p=TOP_P,
+                        frequency_penalty=FREQUENCY_PENALTY,
+                        presence_penalty=PRESENCE_PENALTY,
+                        stream=True
+                    )
+                    break
+                except Exception as e:
+                    if is_last_model or not _is_rate_limit_error(e):
+                        raise
+                    logger.warning(f"⚠️ {model} rate limited, falling back to {models[model_index + 1]}")
+            
+            # Stream the response: first token at once, then growing batches of deltas
+            batch_size = STREAM_MIN_BATCH
+            last_flush = time.monotonic()
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content
+                if not content:
+                    continue
+                
+                # First token goes out unbatched
+                if not first_token_received:
+                    first_token_time = time.time() - start_time
+                    logger.info(f"⚡ First token in {first_token_time:.2f}s")
+                    first_token_received = True
+                    yield content
+                    last_flush = time.monotonic()
+                    continue
+                
+                pending.append(content)
+                now = time.monotonic()
+                if len(pending) >= batch_size or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield "".join(pending)
+                    pending = []
+                    last_flush = now
+                    batch_size = min(int(batch_size * STREAM_BATCH_GROWTH), STREAM_MAX_BATCH)
             
-            # Stream the response
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    # Clear thinking placeholder on first token
-                    if not first_token_received:
-                        first_token_time = time.time() - start_time
-                        logger.info(f"⚡ First token in {first_token_time:.2f}s")
-                        if thinking_placeholder:
-                            thinking_placeholder.empty()
-                        first_token_received = True
-                    
-                    yield chunk.choices[0].delta.content
+            if pending:
+                yield "".join(pending)
             
         except Exception as e:
+            # Keep what was already generated before the error message
+            if pending:
+                yield "".join(pending)
             error_str = str(e)
-            if '429' in error_str or 'rate limit' in error_str.lower():
+            if _is_rate_limit_error(e):
                 logger.error(f"⚠️ Rate limit exceeded: {error_str}")
-                if thinking_placeholder:
-                    thinking_placeholder.empty()
-                yield "\n\n⚠️ **Rate Limit Exceeded**\n\nThe free model has reached its rate limit. Please:\n1. Wait a few minutes and try again\n2. Or switch to a different model in the .env file\n3. Or add credits to your OpenRouter account"
+                yield "\n\n⚠️ **Rate Limit Exceeded**\n\nThe free model has reached its rate limit. Please:\n1. Wait a few minutes and try again\n2. Or switch to a different model (or set OPENAI_FALLBACK_MODELS) in the .env file\n3. Or add credits to your OpenRouter account"
             else:
                 logger.error(f"Chat Mode streaming failed: {error_str}")
-                if thinking_placeholder:
-                    thinking_placeholder.empty()
                 yield f"\n\n❌ Error: Failed to generate response. Please try again."
     
+    def stream_response(
+        self,
+        query: str,
+        detail_level: str = 'auto',
+        conversation_history: list = None,
+        thinking_placeholder=None,
+        cap_brief: bool = True
+    ) -> Generator[str, None, None]:
+        """
+        Stream conversational response from the LLM (sync wrapper for Streamlit).
+        
+        Drives astream_response on a shared background event loop, so the
+        calling thread only waits for chunks and Streamlit calls stay on it.
+        
+        Args:
+            query: User's question
+            detail_level: 'auto', 'brief', or 'detailed'
+            conversation_history: Previous conversation messages
+            thinking_placeholder: Streamlit placeholder to clear on first chunk
+            cap_brief: Passed to astream_response
+            
+        Yields:
+            Text chunks as produced by astream_response
+        """
+        loop = _get_stream_loop()
+        response_stream = self.astream_response(query, detail_level, conversation_history, cap_brief)
+        first_chunk = True
+        try:
+            while True:
+                try:
+                    chunk = asyncio.run_coroutine_threadsafe(response_stream.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+                
+                # Clear thinking placeholder on first chunk (answer or error message)
+                if first_chunk:
+                    if thinking_placeholder:
+                        thinking_placeholder.empty()
+                    first_chunk = False
+                yield chunk
+        finally:
+            # Close the HTTP stream if the caller stopped early
+            asyncio.run_coroutine_threadsafe(response_stream.aclose(), loop).result()
+    
     def generate_response(
         self,
         query: str,
@@ -287,15 +441,17 @@ Be concise, friendly, and to the point. If asked about documents, remind the use
         # Auto-detect if needed
         if detail_level == 'auto':
             detected_level = self.detect_query_complexity(query)
+            logger.info(f"Auto-detected complexity: {detected_level} for query: {query[:50]}...")
         else:
             detected_level = detail_level
         
-        # Stream the response
+        # Stream with the resolved level; an auto-detected 'brief' is not capped
         response_stream = self.stream_response(
             query,
             detected_level,
             conversation_history,
-            thinking_placeholder
+            thinking_placeholder,
+            cap_brief=detail_level != 'auto'
         )
         
         # Metadata
@@ -8,23 +8,329 @@ Author: GitHub Copilot
 Date: October 24, 2025
 """
 
+import copy
+import hashlib
+import json
 import logging
 import os
+import queue
+import re
 import shutil
+import sqlite3
+import threading
 import time
-from typing import Optional, List, Dict, Any, Callable
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Optional, List, Dict, Any, Callable, Tuple
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 from chromadb.api.models.Collection import Collection
 import streamlit as st
 
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
 logger = logging.getLogger(__name__)
 
+# Optional sqlite-vec KNN index (enabled with DOCSENSE_USE_SQLITE_VEC=true)
+try:
+    import sqlite_vec
+    SQLITE_VEC_AVAILABLE = True
+except ImportError:
+    SQLITE_VEC_AVAILABLE = False
+
 # Constants
 CHROMADB_PERSIST_DIR = ".chromadb"
 COLLECTION_NAME = "document_chunks"
 MAX_QUERY_RETRIES = 3
 LARGE_FILE_THRESHOLD = 10_000_000  # 10MB
+QUERY_CACHE_SIZE = 1024  # Query results kept for repeated questions
+QUERY_CACHE_TTL = 300.0  # Seconds a cached query result stays valid
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Query embeddings kept in memory
+QUERY_BATCH_MAX = 16  # Concurrent queries sent to Chroma in one call
+QUERY_BATCH_TIMEOUT = 30.0  # Seconds a caller waits for its batched query
+ADD_BATCH_SIZE = 1024  # Documents per collection.add call (bounds memory on bulk loads)
+MMR_FETCH_K = 20  # Candidates fetched before MMR diversification
+MMR_LAMBDA = 0.5  # 1.0 = pure relevance, 0.0 = pure diversity
+# HNSW index parameters, fixed when the collection is created (search_ef is
+# applied per query: raising it trades a few ms of search for better recall,
+# which is the right side of the tradeoff for chat RAG)
+HNSW_METADATA = {
+    "hnsw:space": "cosine",  # More stable for embeddings
+    "hnsw:M": int(os.getenv("CHROMADB_HNSW_M", "32")),
+    "hnsw:construction_ef": int(os.getenv("CHROMADB_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMADB_HNSW_SEARCH_EF", "100")),
+    "hnsw:num_threads": int(os.getenv("CHROMADB_HNSW_NUM_THREADS", str(os.cpu_count() or 1))),
+}
+USE_SQLITE_VEC = os.getenv("DOCSENSE_USE_SQLITE_VEC", "false").lower() == "true"
+SQLITE_VEC_FILENAME = "vec_chunks.sqlite"  # Kept inside the Chroma persist dir
+SQLITE_VEC_INT8 = os.getenv("DOCSENSE_SQLITE_VEC_INT8", "true").lower() == "true"  # Store int8 vectors
+SQLITE_VEC_RERANK_FACTOR = 4  # int8 candidates per result, re-ranked with Chroma's fp32 vectors
+# Per-query fields of a Chroma query result (one list entry per query embedding)
+_PER_QUERY_RESULT_FIELDS = ("ids", "embeddings", "documents", "uris", "data", "metadatas", "distances")
+QUERY_EMBEDDING_CACHE_PATH = os.getenv(
+    'QUERY_EMBEDDING_CACHE_PATH', os.path.join(".cache", "query_embeddings.sqlite")
+)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU of Chroma query results with a TTL.
+    
+    Writes to the collection call invalidate(), which bumps a generation
+    counter: entries from an older generation are never returned, and a
+    query that was already running when the collection changed cannot
+    store its (stale) result.
+    """
+    
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(query_texts: List[str], n_results: int, where: Optional[Dict[str, Any]], count: int) -> tuple:
+        """Key a query by its texts, result count, metadata filter and the collection size."""
+        digest = hashlib.sha256("\0".join(query_texts).encode("utf-8")).hexdigest()
+        where_key = json.dumps(where, sort_keys=True, default=str) if where else None
+        return (digest, n_results, where_key, count)
+    
+    def lookup(self, key: tuple) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Look up a cached result.
+        
+        Returns:
+            (copy of the result or None, generation to pass to store())
+        """
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, generation
+            entry_generation, stored_at, result = entry
+            if entry_generation != generation or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None, generation
+            self._entries.move_to_end(key)
+        # Callers may edit the result lists in place
+        return copy.deepcopy(result), generation
+    
+    def store(self, key: tuple, result: Dict[str, Any], generation: int) -> None:
+        """Cache a result fetched during the given generation, evicting the least recently used."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (generation, time.monotonic(), copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self) -> None:
+        """Drop all cached results (the collection changed)."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class _BatchQueryScheduler:
+    """
+    Coalesces concurrent embedding queries into single collection.query calls.
+    
+    One worker thread takes the next queued query plus whatever else is
+    already waiting (up to QUERY_BATCH_MAX), groups them by collection,
+    n_results and filter, and fans each result back out. There is no timed
+    wait: a lone query goes out immediately, and queries that arrive while
+    Chroma is busy are sent together on the next round.
+    """
+    
+    def __init__(self):
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+    
+    def query(self, collection: Collection, query_embeddings: List[List[float]],
+              n_results: int, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run a query through the batcher and wait (up to QUERY_BATCH_TIMEOUT) for its result."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((collection, query_embeddings, n_results, where, future))
+        try:
+            return future.result(timeout=QUERY_BATCH_TIMEOUT)
+        except FuturesTimeoutError:
+            future.cancel()  # Dropped by the worker if it has not been picked up yet
+            raise
+    
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="chromadb-query-batcher", daemon=True)
+                self._worker.start()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < QUERY_BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # Claim the requests; ones cancelled after a caller timed out are skipped
+            batch = [request for request in batch if request[4].set_running_or_notify_cancel()]
+            
+            # Any failure resolves the batch's pending futures instead of
+            # killing the worker and leaving their callers waiting
+            try:
+                groups: Dict[tuple, list] = {}
+                for request in batch:
+                    collection, _, n_results, where, _ = request
+                    group_key = (id(collection), n_results, json.dumps(where, sort_keys=True, default=str) if where else None)
+                    groups.setdefault(group_key, []).append(request)
+                
+                for requests in groups.values():
+                    self._execute(requests)
+            except Exception as e:
+                logger.error(f"Batched query failed: {str(e)}")
+                for request in batch:
+                    if not request[4].done():
+                        request[4].set_exception(e)
+    
+    @staticmethod
+    def _execute(requests: list):
+        collection, _, n_results, where, _ = requests[0]
+        embeddings = [vector for request in requests for vector in request[1]]
+        try:
+            results = collection.query(query_embeddings=embeddings, n_results=n_results, where=where)
+        except Exception as e:
+            for request in requests:
+                request[4].set_exception(e)
+            return
+        
+        if len(requests) > 1:
+            logger.debug(f"Batched {len(requests)} queries into one Chroma call")
+        start = 0
+        for _, query_embeddings, _, _, future in requests:
+            end = start + len(query_embeddings)
+            future.set_result({
+                key: value[start:end] if key in _PER_QUERY_RESULT_FIELDS and value is not None else value
+                for key, value in results.items()
+            })
+            start = end
+
+
+def _quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row so its largest component is ±127 and round to int8."""
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127.0
+    return np.round(vectors / np.where(scales == 0, 1.0, scales)).astype(np.int8)
+
+
+class _SqliteVecIndex:
+    """
+    Shadow KNN index of the collection's embeddings in a sqlite-vec vec0 table.
+    
+    Holds ids and vectors only; documents, metadata and the fp32 vectors stay
+    in Chroma. With quantize=True vectors are stored as int8 (a quarter of the
+    float32 size); per-vector scales are not kept because cosine distance,
+    the collection's "hnsw:space", ignores them. The table is (re)created on
+    write whenever the dimension or element type changes.
+    """
+    
+    def __init__(self, path: str, quantize: bool = False):
+        self._lock = threading.Lock()
+        self._element_type = "INT8" if quantize else "FLOAT"
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.enable_load_extension(True)
+        sqlite_vec.load(self._conn)
+        self._conn.enable_load_extension(False)
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_chunks'").fetchone()
+        match = re.search(r"(float|int8)\[(\d+)\]", row[0], re.IGNORECASE) if row else None
+        self._column: Optional[Tuple[str, int]] = (match.group(1).upper(), int(match.group(2))) if match else None
+    
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return _quantize_int8(vectors) if self._element_type == "INT8" else vectors
+    
+    def _vector_sql(self) -> str:
+        return "vec_int8(?)" if self._element_type == "INT8" else "?"
+    
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DROP TABLE IF EXISTS vec_chunks")
+            self._column = None
+    
+    def upsert(self, ids: List[str], embeddings: List[List[float]]):
+        if not ids:
+            return
+        vectors = self._encode(np.asarray(embeddings, dtype=np.float32))
+        with self._lock, self._conn:
+            column = (self._element_type, vectors.shape[1])
+            if self._column != column:
+                self._conn.execute("DROP TABLE IF EXISTS vec_chunks")
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE vec_chunks USING vec0("
+                    f"chunk_id TEXT PRIMARY KEY, embedding {column[0]}[{column[1]}] distance_metric=cosine)"
+                )
+                self._column = column
+            # vec0 has no upsert: replace rows explicitly
+            self._conn.executemany("DELETE FROM vec_chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.executemany(
+                f"INSERT INTO vec_chunks (chunk_id, embedding) VALUES (?, {self._vector_sql()})",
+                [(chunk_id, vector.tobytes()) for chunk_id, vector in zip(ids, vectors)]
+            )
+    
+    def search(self, query_embedding: List[float], k: int) -> List[str]:
+        """Return the ids of the k nearest vectors, nearest first."""
+        blob = self._encode(np.asarray([query_embedding], dtype=np.float32))[0].tobytes()
+        with self._lock:
+            if self._column is None:
+                return []
+            rows = self._conn.execute(
+                f"SELECT chunk_id FROM vec_chunks WHERE embedding MATCH {self._vector_sql()} AND k = ? "
+                "ORDER BY distance",
+                (blob, k)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _mmr_select(embeddings: np.ndarray, query_embedding: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Pick k row indices by maximal marginal relevance.
+    
+    Rows are normalized once; each round costs one matrix-vector product
+    against the last pick, with the running max similarity kept in an array.
+    
+    Args:
+        embeddings: Candidate vectors, shape (n, dim)
+        query_embedding: Query vector, shape (dim,)
+        k: Number of rows to pick
+        lambda_mult: Weight of relevance against diversity
+        
+    Returns:
+        Picked row indices in selection order
+    """
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+    query_norm = np.linalg.norm(query_embedding)
+    relevance = embeddings @ (query_embedding / (query_norm or 1.0))
+    
+    max_similarity = np.zeros(len(embeddings), dtype=embeddings.dtype)
+    selected = np.zeros(len(embeddings), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(embeddings))):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        index = int(np.argmax(scores))
+        similarity = embeddings @ embeddings[index]
+        # The first pick sets the running max (similarities may be negative)
+        max_similarity = np.maximum(max_similarity, similarity) if picked else similarity
+        picked.append(index)
+        selected[index] = True
+    return picked
 
 
 class ChromaDBManager:
@@ -38,7 +344,152 @@ class ChromaDBManager:
         self._client: Optional[chromadb.Client] = None
         self._collection: Optional[Collection] = None
         self._rebuild_callback: Optional[Callable] = None
+        self._query_cache = QueryCache()
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+        self._query_embedding_store: Optional[EmbeddingCache] = None
+        self._query_batcher = _BatchQueryScheduler()
+        self._cached_count: Optional[int] = None
+        self._writer_state = threading.local()
+        self._write_pool = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="chromadb-writer",
+            initializer=lambda: setattr(self._writer_state, "active", True)
+        )
+        # sqlite-vec shadow index: serves queries only while it mirrors the
+        # collection, i.e. its synced generation equals the current one
+        self._vec_index: Optional[_SqliteVecIndex] = None
+        self._vec_index_failed = False
+        self._vec_lock = threading.Lock()
+        self._vec_generation = 0
+        self._vec_synced_generation: Optional[int] = None
+        self._vec_sync_pending = False
+        self._verified = False  # Integrity check passed since the last rebuild/error
+        
+    def invalidate_query_cache(self):
+        """Forget cached query results and count; call after writing to the collection directly."""
+        self._cached_count = None
+        self._query_cache.invalidate()
+        self._vec_generation += 1
+    
+    def _get_count(self, collection: Collection) -> int:
+        """Collection size, counted once and then kept until the collection changes."""
+        if self._cached_count is None:
+            self._cached_count = collection.count()
+        return self._cached_count
+        
+    def _get_vec_index(self) -> Optional[_SqliteVecIndex]:
+        """The sqlite-vec shadow index, or None if disabled or unavailable."""
+        if not USE_SQLITE_VEC or self._vec_index_failed:
+            return None
+        with self._vec_lock:
+            if self._vec_index is None and not self._vec_index_failed:
+                try:
+                    if not SQLITE_VEC_AVAILABLE:
+                        raise ImportError("sqlite-vec is not installed")
+                    os.makedirs(self.persist_dir, exist_ok=True)
+                    self._vec_index = _SqliteVecIndex(
+                        os.path.join(self.persist_dir, SQLITE_VEC_FILENAME), quantize=SQLITE_VEC_INT8
+                    )
+                    logger.info("✓ sqlite-vec index enabled")
+                except Exception as e:
+                    logger.warning(f"sqlite-vec index unavailable, querying Chroma: {str(e)}")
+                    self._vec_index_failed = True
+            return self._vec_index
+    
+    def _schedule_vec_sync(self, collection: Collection):
+        """Rebuild the sqlite-vec index from the collection on the writer thread (once at a time)."""
+        with self._vec_lock:
+            if self._vec_sync_pending:
+                return
+            self._vec_sync_pending = True
+        self._write_pool.submit(self._sync_vec_index, collection)
+    
+    def _sync_vec_index(self, collection: Collection):
+        """Copy every embedding in the collection into the sqlite-vec index."""
+        generation = self._vec_generation
+        try:
+            index = self._get_vec_index()
+            if index is None:
+                return
+            index.clear()
+            offset = 0
+            while True:
+                page = collection.get(include=["embeddings"], limit=ADD_BATCH_SIZE, offset=offset)
+                if not page["ids"]:
+                    break
+                index.upsert(page["ids"], page["embeddings"])
+                offset += len(page["ids"])
+            self._vec_synced_generation = generation
+            logger.info(f"✓ sqlite-vec index synced ({offset} vectors)")
+        except Exception as e:
+            logger.warning(f"sqlite-vec sync failed, querying Chroma: {str(e)}")
+        finally:
+            with self._vec_lock:
+                self._vec_sync_pending = False
+    
+    def _vec_query(
+        self,
+        collection: Collection,
+        query_embeddings: List[List[float]],
+        n_results: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Answer an unfiltered query from the sqlite-vec index.
+        
+        Returns:
+            Results shaped like collection.query's, or None to query Chroma
+            (index disabled, out of sync, or failing)
+        """
+        index = self._get_vec_index()
+        if index is None:
+            return None
+        if self._vec_synced_generation != self._vec_generation:
+            self._schedule_vec_sync(collection)
+            return None
+        
+        # Quantized distances only pick candidates; the exact fp32 cosine ranks them
+        fetch_k = n_results * SQLITE_VEC_RERANK_FACTOR if SQLITE_VEC_INT8 else n_results
+        try:
+            hits = [index.search(vector, fetch_k) for vector in query_embeddings]
+            all_ids = list(dict.fromkeys(chunk_id for ids in hits for chunk_id in ids))
+            if not all_ids:
+                return None
+            stored = collection.get(ids=all_ids, include=["documents", "metadatas", "embeddings"])
+        except Exception as e:
+            logger.warning(f"sqlite-vec query failed, querying Chroma: {str(e)}")
+            return None
+        
+        if len(stored["ids"]) != len(all_ids):
+            # Index references chunks Chroma no longer has
+            self._vec_synced_generation = None
+            return None
+        
+        position = {chunk_id: row for row, chunk_id in enumerate(stored["ids"])}
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
         
+        rows_per_query, distances_per_query = [], []
+        for query_embedding, ids in zip(query_embeddings, hits):
+            rows = np.fromiter((position[chunk_id] for chunk_id in ids), dtype=np.intp, count=len(ids))
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            distances = 1.0 - vectors[rows] @ (query_vector / (np.linalg.norm(query_vector) or 1.0))
+            order = np.argsort(distances, kind="stable")[:n_results]
+            rows_per_query.append(rows[order])
+            distances_per_query.append(distances[order].tolist())
+        
+        return {
+            "ids": [[stored["ids"][row] for row in rows] for rows in rows_per_query],
+            "embeddings": None,
+            "documents": [[stored["documents"][row] for row in rows] for rows in rows_per_query],
+            "uris": None,
+            "data": None,
+            "metadatas": [[stored["metadatas"][row] for row in rows] for rows in rows_per_query],
+            "distances": distances_per_query,
+            "included": ["documents", "metadatas", "distances"],
+        }
+    
     def set_rebuild_callback(self, callback: Callable):
         """Set callback function to rebuild documents after reset."""
         self._rebuild_callback = callback
@@ -113,9 +564,10 @@ class ChromaDBManager:
             client = self.get_client()
             self._collection = client.get_or_create_collection(
                 name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}  # More stable for embeddings
+                metadata=HNSW_METADATA
             )
             logger.info(f"✓ Collection '{self.collection_name}' initialized")
+            self._warm_embedding_function(self._collection)
             return self._collection
             
         except Exception as e:
@@ -123,17 +575,105 @@ class ChromaDBManager:
             # Try with fresh client
             self._collection = self.get_client(force_rebuild=True).get_or_create_collection(
                 name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+                metadata=HNSW_METADATA
             )
             return self._collection
     
+    def _warm_embedding_function(self, collection: Collection):
+        """
+        Load the collection's embedding model in the background.
+        
+        Chroma's default embedding function (ONNX Runtime MiniLM) downloads
+        and loads its model on first call; doing that now keeps it off the
+        first user query.
+        """
+        embedding_function = getattr(collection, "_embedding_function", None)
+        if embedding_function is None:
+            return
+        
+        def warm():
+            try:
+                embedding_function(["warm up"])
+                logger.info(f"✓ Embedding function {type(embedding_function).__name__} loaded")
+            except Exception as e:
+                logger.warning(f"Embedding function warm-up failed: {str(e)}")
+        
+        threading.Thread(target=warm, name="chromadb-embedding-warmup", daemon=True).start()
+    
+    def _get_query_embedding_store(self) -> Optional[EmbeddingCache]:
+        """On-disk query embedding cache, or None if it cannot be opened."""
+        if self._query_embedding_store is None:
+            try:
+                self._query_embedding_store = EmbeddingCache(QUERY_EMBEDDING_CACHE_PATH)
+            except Exception as e:
+                logger.warning(f"Query embedding cache unavailable: {str(e)}")
+        return self._query_embedding_store
+    
+    def _embed_queries(self, query_texts: List[str], collection: Collection) -> Optional[List[List[float]]]:
+        """
+        Embed query texts with the collection's embedding function, reusing earlier results.
+        
+        Vectors are looked up in memory, then on disk (keyed by SHA-256 of the
+        text and the embedding function), so a repeated query is never re-embedded.
+        
+        Args:
+            query_texts: Query strings
+            collection: Collection whose embedding function indexed the documents
+            
+        Returns:
+            One vector per query, or None if the collection has no usable
+            embedding function (the caller then passes query_texts to Chroma)
+        """
+        embedding_function = getattr(collection, "_embedding_function", None)
+        if embedding_function is None:
+            return None
+        
+        model = type(embedding_function).__name__
+        keys = [embedding_cache_key(text, model) for text in query_texts]
+        with self._query_embeddings_lock:
+            vectors = {key: self._query_embeddings[key] for key in keys if key in self._query_embeddings}
+            for key in vectors:
+                self._query_embeddings.move_to_end(key)
+        
+        store = self._get_query_embedding_store()
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and store is not None:
+            vectors.update(store.get_many(missing))
+        
+        to_embed = {key: text for key, text in zip(keys, query_texts) if key not in vectors}
+        if to_embed:
+            try:
+                embedded = embedding_function(list(to_embed.values()))
+            except Exception as e:
+                logger.warning(f"Query embedding failed, letting Chroma embed: {str(e)}")
+                return None
+            new_vectors = {key: [float(x) for x in vector] for key, vector in zip(to_embed, embedded)}
+            vectors.update(new_vectors)
+            if store is not None:
+                store.set_many(new_vectors.items())
+        
+        with self._query_embeddings_lock:
+            for key in keys:
+                self._query_embeddings[key] = vectors[key]
+                self._query_embeddings.move_to_end(key)
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        
+        return [vectors[key] for key in keys]
+    
     def verify_index_integrity(self) -> bool:
         """
         Verify that the ChromaDB index is healthy and usable.
         
+        Runs once: after a pass the result is kept until rebuild_index, reset
+        or a query hits an HNSW error.
+        
         Returns:
             bool: True if index is healthy, False otherwise
         """
+        if self._verified:
+            return True
+        
         try:
             collection = self.get_collection()
             count = collection.count()
@@ -142,12 +682,14 @@ class ChromaDBManager:
                 logger.warning("Collection is empty - may need to reprocess documents")
                 return True  # Empty is valid, just needs documents
             
-            # Try a simple query to verify HNSW index works
+            # Search the HNSW index with a stored vector (peek is a plain read, no embedding)
             try:
+                sample = collection.peek(limit=1)
                 collection.query(
-                    query_texts=["test query"],
-                    n_results=min(1, count)
+                    query_embeddings=[list(sample["embeddings"][0])],
+                    n_results=1
                 )
+                self._verified = True
                 logger.info(f"✓ Index integrity verified ({count} documents)")
                 return True
             except Exception as query_error:
@@ -183,7 +725,7 @@ class ChromaDBManager:
         
         try:
             collection = self.get_collection()
-            count = collection.count()
+            count = self._get_count(collection)
             
             if count == 0:
                 logger.warning("Collection is empty - no documents to query")
@@ -192,13 +734,30 @@ class ChromaDBManager:
             # Adjust n_results if it exceeds collection size
             safe_n_results = min(n_results, count)
             
-            # Execute query
-            results = collection.query(
-                query_texts=query_texts,
-                n_results=safe_n_results,
-                where=where
-            )
+            # Repeated queries skip embedding and the HNSW search
+            cache_key = QueryCache.make_key(query_texts, safe_n_results, where, count)
+            cached, generation = self._query_cache.lookup(cache_key)
+            if cached is not None:
+                logger.debug("Query cache hit")
+                return cached
+            
+            # Execute query (with cached query embeddings when available)
+            query_embeddings = self._embed_queries(query_texts, collection)
+            results = None
+            if query_embeddings is not None and where is None:
+                # Unfiltered queries use the sqlite-vec index when enabled and in sync
+                results = self._vec_query(collection, query_embeddings, safe_n_results)
+            if results is None and query_embeddings is not None:
+                # Concurrent sessions' queries share one Chroma call
+                results = self._query_batcher.query(collection, query_embeddings, safe_n_results, where)
+            elif results is None:
+                results = collection.query(
+                    query_texts=query_texts,
+                    n_results=safe_n_results,
+                    where=where
+                )
             
+            self._query_cache.store(cache_key, results, generation)
             return results
             
         except Exception as e:
@@ -212,6 +771,7 @@ class ChromaDBManager:
                 "database error"
             ]):
                 logger.warning(f"HNSW error detected (attempt {retry_count + 1}): {str(e)}")
+                self._verified = False
                 
                 # Strategy 1: Try with smaller n_results
                 if n_results > 1:
@@ -237,36 +797,140 @@ class ChromaDBManager:
             logger.error(f"Query failed: {str(e)}")
             return None
     
+    def mmr_query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        fetch_k: int = MMR_FETCH_K,
+        lambda_mult: float = MMR_LAMBDA,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Query with maximal marginal relevance, trading relevance for diversity.
+        
+        Fetches fetch_k candidates with their embeddings and re-ranks them in
+        NumPy. Falls back to safe_query if the query cannot be embedded or the
+        candidate query fails.
+        
+        Args:
+            query_text: Query string
+            n_results: Number of results to return
+            fetch_k: Number of nearest candidates to diversify
+            lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+            where: Metadata filter
+            
+        Returns:
+            Query results for the single query (same shape as safe_query) or None
+        """
+        try:
+            collection = self.get_collection()
+            count = self._get_count(collection)
+            
+            if count == 0:
+                logger.warning("Collection is empty - no documents to query")
+                return None
+            
+            query_embeddings = self._embed_queries([query_text], collection)
+            if query_embeddings is None:
+                return self.safe_query([query_text], n_results=n_results, where=where)
+            
+            candidates = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=min(max(fetch_k, n_results), count),
+                where=where,
+                include=["embeddings", "documents", "metadatas", "distances"]
+            )
+        except Exception as e:
+            logger.warning(f"MMR query failed, falling back to plain query: {str(e)}")
+            return self.safe_query([query_text], n_results=n_results, where=where)
+        
+        picked = _mmr_select(
+            np.asarray(candidates["embeddings"][0], dtype=np.float32),
+            np.asarray(query_embeddings[0], dtype=np.float32),
+            n_results,
+            lambda_mult
+        )
+        return {
+            key: [[value[0][i] for i in picked]] if key in _PER_QUERY_RESULT_FIELDS and value is not None else value
+            for key, value in candidates.items()
+        }
+    
     def safe_add(
         self,
         documents: List[str],
         metadatas: List[Dict[str, Any]],
-        ids: List[str],
-        retry_count: int = 0
+        ids: List[str]
     ) -> bool:
         """
-        Add documents with automatic error recovery.
+        Add documents with automatic error recovery, waiting for the write.
         
         Args:
             documents: List of document texts
             metadatas: List of metadata dicts
             ids: List of document IDs
-            retry_count: Current retry attempt
             
         Returns:
             bool: True if successful, False otherwise
         """
+        return self.safe_add_async(documents, metadatas, ids).result()
+    
+    def safe_add_async(
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str]
+    ) -> "Future[bool]":
+        """
+        Queue an add on the manager's writer thread and return immediately.
+        
+        Writes run one at a time (a failed add may rebuild the index, which
+        must not interleave with another write), off the Streamlit script thread.
+        Called from the writer thread itself (e.g. by the rebuild callback),
+        the add runs inline, since a queued job would wait behind the caller.
+        
+        Args:
+            documents: List of document texts
+            metadatas: List of metadata dicts
+            ids: List of document IDs
+            
+        Returns:
+            Future resolving to True if successful, False otherwise
+        """
+        if getattr(self._writer_state, "active", False):
+            future: "Future[bool]" = Future()
+            try:
+                future.set_result(self._add_with_retry(documents, metadatas, ids))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._write_pool.submit(self._add_with_retry, documents, metadatas, ids)
+    
+    def _add_with_retry(
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+        retry_count: int = 0
+    ) -> bool:
+        """Add documents, rebuilding the index and retrying once on failure (runs on the writer thread)."""
         if retry_count >= MAX_QUERY_RETRIES:
             logger.error("Max add retries reached")
             return False
         
         try:
             collection = self.get_collection()
-            collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # Add in ADD_BATCH_SIZE slices; one huge add spikes memory and can exceed Chroma's batch limit
+            for start in range(0, len(documents), ADD_BATCH_SIZE):
+                end = start + ADD_BATCH_SIZE
+                collection.add(
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end]
+                )
+            # Chroma skips ids it already has, so re-read the count on next use
+            self._cached_count = None
+            self._query_cache.invalidate()
+            self._shadow_add(collection, ids)
             logger.info(f"✓ Added {len(documents)} documents to collection")
             return True
             
@@ -276,16 +940,33 @@ class ChromaDBManager:
             if retry_count == 0:
                 logger.warning("Rebuilding index and retrying...")
                 self.rebuild_index()
-                return self.safe_add(documents, metadatas, ids, retry_count + 1)
+                return self._add_with_retry(documents, metadatas, ids, retry_count + 1)
             
             return False
     
+    def _shadow_add(self, collection: Collection, ids: List[str]):
+        """Mirror newly added chunks into the sqlite-vec index (runs on the writer thread)."""
+        if self._vec_synced_generation != self._vec_generation:
+            return  # Not serving yet; the next sync copies everything
+        index = self._get_vec_index()
+        if index is None:
+            return
+        try:
+            for start in range(0, len(ids), ADD_BATCH_SIZE):
+                added = collection.get(ids=ids[start:start + ADD_BATCH_SIZE], include=["embeddings"])
+                index.upsert(added["ids"], added["embeddings"])
+        except Exception as e:
+            logger.warning(f"sqlite-vec write failed, index will resync: {str(e)}")
+            self._vec_synced_generation = None
+    
     def rebuild_index(self):
         """
         Rebuild the ChromaDB index from scratch.
         """
         try:
             logger.warning("🔄 Rebuilding ChromaDB index...")
+            self.invalidate_query_cache()
+            self._verified = False
             
             # Reset client
             client = self.get_client()
@@ -315,10 +996,16 @@ class ChromaDBManager:
         Complete reset of ChromaDB - removes all data.
         """
         try:
+            self.invalidate_query_cache()
+            self._verified = False
             if self._client:
                 self._client.reset()
             self._client = None
             self._collection = None
+            with self._vec_lock:
+                if self._vec_index is not None:
+                    self._vec_index.close()
+                    self._vec_index = None
             
             if os.path.exists(self.persist_dir):
                 shutil.rmtree(self.persist_dir)
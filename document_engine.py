@@ -18,6 +18,9 @@ from tank_analyzer import extract_tank_deliveries, format_tank_data_for_llm
 
 logger = logging.getLogger(__name__)
 
+# Pages extracted between progress callbacks
+PROGRESS_BATCH_PAGES = 16
+
 
 def process_documents_with_embeddings(
     uploaded_files: List,
@@ -56,9 +59,12 @@ def process_documents_with_embeddings(
                 total_pages = len(pdf_reader.pages)
                 logger.info(f"PDF has {total_pages} pages - extracting with pypdf")
                 
+                # Page text is kept for the structured-data pass below
+                page_texts = []
+                
                 for page_num, page in enumerate(pdf_reader.pages):
-                    # Update progress
-                    if progress_callback:
+                    # Update progress once per batch of pages, not per page
+                    if progress_callback and (page_num % PROGRESS_BATCH_PAGES == 0 or page_num + 1 == total_pages):
                         progress_callback(
                             page_num + 1,
                             total_pages,
@@ -69,6 +75,7 @@ def process_documents_with_embeddings(
                         logger.info(f"Processing page {page_num + 1}/{total_pages}")
                     
                     text = page.extract_text()
+                    page_texts.append(text)
                     
                     if text and text.strip():
                         # Split into chunks
@@ -92,11 +99,8 @@ def process_documents_with_embeddings(
                         "Extracting structured data..."
                     )
                 
-                pdf_file.seek(0)
-                full_text = ""
-                pdf_reader = pypdf.PdfReader(pdf_file)
-                for page in pdf_reader.pages:  # Process ALL pages for tank extraction
-                    full_text += page.extract_text() + "\n"
+                # Reuse the extracted pages instead of parsing the PDF a second time
+                full_text = "".join(text + "\n" for text in page_texts)  # ALL pages for tank extraction
                 
                 # Parse production metrics
                 prod_df = extract_production_metrics(full_text)
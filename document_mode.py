@@ -55,6 +55,7 @@ from typing import List, Dict, Any, Tuple, Generator, Optional
 import time
 import asyncio
 import hashlib
+from dataclasses import dataclass
 
 import chromadb
 from openai import OpenAI
@@ -124,6 +125,41 @@ class DocumentModeError(Exception):
     pass
 
 
+@dataclass
+class RetrievalBatch:
+    """
+    One query's Chroma results kept column-wise (the layout Chroma returns).
+    
+    Hits are addressed by position, so filtering runs on the distance array
+    and per-chunk dicts are only built for the chunks that survive it.
+    """
+    ids: List[str]
+    docs: List[str]
+    metas: List[Dict[str, Any]]
+    dists: np.ndarray
+    
+    @classmethod
+    def from_results(cls, results: Optional[Dict[str, Any]], query_index: int = 0) -> "RetrievalBatch":
+        """Wrap the columns of a collection.query / safe_query result without copying them."""
+        results = results or {}
+        docs = results['documents'][query_index] if results.get('documents') else []
+        count = len(docs)
+        ids = results['ids'][query_index] if results.get('ids') else [f'chunk_{i}' for i in range(count)]
+        metas = results['metadatas'][query_index] if results.get('metadatas') else [{} for _ in range(count)]
+        if results.get('distances'):
+            dists = np.asarray(results['distances'][query_index], dtype=np.float32)
+        else:
+            dists = np.ones(count, dtype=np.float32)
+        return cls(ids=ids, docs=docs, metas=metas, dists=dists)
+    
+    def __len__(self) -> int:
+        return len(self.docs)
+    
+    def similarities(self) -> np.ndarray:
+        """Similarity per hit: 1 - distance (capped at 1), or 1 / (1 + |distance|) if negative."""
+        return np.where(self.dists < 0, 1.0 / (1.0 + np.abs(self.dists)), 1.0 - np.minimum(self.dists, 1.0))
+
+
 class DocumentMode:
     """
     Strict RAG mode - answers ONLY from uploaded documents.
@@ -468,23 +504,13 @@ class DocumentMode:
                 logger.warning(f"⏱️ Retrieval timeout ({elapsed:.2f}s > {timeout}s)")
                 return []
             
-            # Step 2: Parse candidates
+            # Step 2: Parse candidates (threshold applied to the whole distance column)
             candidates = []
-            if results and results.get('documents') and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
-                    distance = results['distances'][0][i] if results.get('distances') else 1.0
-                    
-                    # Convert distance to similarity
-                    if distance < 0:
-                        similarity = 1.0 / (1.0 + abs(distance))
-                    else:
-                        similarity = 1.0 - min(distance, 1.0)
-                    
-                    # Apply threshold
-                    if similarity < SIMILARITY_THRESHOLD:
-                        continue
-                    
-                    content = results['documents'][0][i]
+            batch = RetrievalBatch.from_results(results)
+            if len(batch):
+                similarities = batch.similarities()
+                for i in np.flatnonzero(similarities >= SIMILARITY_THRESHOLD):
+                    content = batch.docs[i]
                     
                     # OPTIMIZATION: Truncate each chunk to MAX_CONTEXT_TOKENS (~800-1000 tokens)
                     words = content.split()
@@ -493,9 +519,9 @@ class DocumentMode:
                     
                     candidate = {
                         'content': content,
-                        'metadata': results['metadatas'][0][i] if results.get('metadatas') else {},
-                        'similarity': similarity,
-                        'id': results['ids'][0][i] if results.get('ids') else f'chunk_{i}'
+                        'metadata': batch.metas[i],
+                        'similarity': float(similarities[i]),
+                        'id': batch.ids[i]
                     }
                     candidates.append(candidate)
             
@@ -977,8 +1003,14 @@ This output must read like a professional research report, not a chatbot summary
 
 Even in brief mode, responses should feel intelligent and purposeful."""
         
-        # Build messages
+        # Build messages: system prompt and retrieved context first, so the prefix
+        # stays byte-identical across turns and can hit provider prefix caching
         messages = [{"role": "system", "content": system_message}]
+        if retrieved_context:
+            messages.append({
+                "role": "system",
+                "content": f"📚 **Retrieved Document Context:**\n{retrieved_context}"
+            })
         
         # Add conversation history (last 3 exchanges = 6 messages)
         # Filter out custom properties (like 'sources') that Groq API doesn't support
@@ -988,12 +1020,11 @@ Even in brief mode, responses should feel intelligent and purposeful."""
                 clean_msg = {"role": msg["role"], "content": msg["content"]}
                 messages.append(clean_msg)
         
-        # User message with context - ADAPTIVE TO DATA TYPE
-        context_part = f"\n\n📚 **Retrieved Document Context:**\n{retrieved_context}\n\n---\n\n" if retrieved_context else ""
+        # User message - ADAPTIVE TO DATA TYPE
         
         if data_type == 'numeric':
             # V3.5 NUMERIC EXTRACTION - STRICT NO-PROSE MODE
-            user_message = f"""{context_part}**User Question:**
+            user_message = f"""**User Question:**
 {query}
 
 ---
@@ -1074,7 +1105,7 @@ Even in brief mode, responses should feel intelligent and purposeful."""
 
         elif data_type == 'mixed':
             # HYBRID - Text summary + numeric table
-            user_message = f"""{context_part}**User Question:**
+            user_message = f"""**User Question:**
 {query}
 
 ---
@@ -1103,7 +1134,7 @@ Begin:"""
 
         elif detail_level == 'detailed':
             # TEXT DETAILED - Full research-grade analysis
-            user_message = f"""{context_part}**User Question:**
+            user_message = f"""**User Question:**
 {query}
 
 ---
@@ -1145,7 +1176,7 @@ Begin your analysis:"""
         
         else:
             # TEXT BRIEF - Concise but intelligent
-            user_message = f"""{context_part}**User Question:**
+            user_message = f"""**User Question:**
 {query}
 
 ---
@@ -0,0 +1,89 @@
+"""
+Persistent Embedding Cache for DocSense
+
+Stores chunk embeddings on disk keyed by SHA-256 of (model, text) so that
+re-ingesting a document only embeds the chunks that actually changed.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from contextlib import closing
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_CACHE_PATH = os.path.join(".cache", "embeddings.sqlite")
+LOOKUP_BATCH_SIZE = 500  # Stay under SQLite's bound-parameter limit
+
+
+def embedding_cache_key(text: str, model: str) -> str:
+    """Return the cache key for a text embedded with a given model."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed map of cache key -> embedding vector.
+
+    Vectors are stored as packed float32 arrays. Each call opens its own
+    connection, so one instance can be shared across threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up embeddings for the given keys.
+
+        Args:
+            keys: Cache keys to look up
+
+        Returns:
+            Dict of key -> embedding for the keys that were found
+        """
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with closing(self._connect()) as conn:
+            for start in range(0, len(unique_keys), LOOKUP_BATCH_SIZE):
+                batch = unique_keys[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        """
+        Store embeddings, replacing any existing entries with the same key.
+
+        Args:
+            items: (key, embedding) pairs
+        """
+        rows = [(key, sqlite3.Binary(array("f", vector).tobytes())) for key, vector in items]
+        if not rows:
+            return
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -34,6 +34,7 @@ GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "mistralai/mistral-7b-instruct:free")
 TOP_K_RESULTS = 5
 MAX_RETRIES = 3
+PREWARM_TIMEOUT = 2.0  # Seconds; warm-up must never hold up a query for long
 
 
 class HybridQueryEngineError(Exception):
@@ -68,12 +69,30 @@ class HybridQueryEngine:
                 api_key=os.getenv("GROQ_API_KEY")
             )
             
+            self._warmed = False
+            
             logger.info("✓ Hybrid Query Engine initialized (Mistral + GROQ)")
             
         except Exception as e:
             logger.error(f"Failed to initialize Hybrid Query Engine: {str(e)}")
             raise HybridQueryEngineError(f"Initialization failed: {str(e)}")
     
+    def prewarm(self):
+        """
+        Open the HTTP connections to both providers ahead of the first query.
+        
+        Best effort and only done once per engine: a cheap models listing
+        pulls DNS + TLS setup out of the query's time-to-first-token.
+        """
+        if self._warmed:
+            return
+        self._warmed = True
+        for name, client in (("Mistral", self.mistral_client), ("GROQ", self.groq_client)):
+            try:
+                client.with_options(timeout=PREWARM_TIMEOUT, max_retries=0).models.list()
+            except Exception as e:
+                logger.debug(f"{name} prewarm skipped: {str(e)}")
+    
     def _validate_environment(self):
         """Validate required environment variables."""
         required_vars = ["GROQ_API_KEY", "OPENROUTER_API_KEY"]
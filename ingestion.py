@@ -8,22 +8,31 @@ Author: GitHub Copilot
 Date: August 11, 2025
 """
 
+import hashlib
 import logging
 import os
 import io
-from typing import List, Dict, Any, Optional, Tuple, BinaryIO, Union
+import multiprocessing
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, BinaryIO, Union, Callable
 import traceback
 
 import fitz  # PyMuPDF
 import chromadb
 from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import streamlit as st
 from dotenv import load_dotenv
 from openai import OpenAI
 import pandas as pd
 
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
 # Load environment variables
 load_dotenv()
 
@@ -65,7 +74,27 @@ CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))  # Added overlap for contin
 MAX_RETRIES = 3
 COLLECTION_NAME = "document_chunks"
 CHROMADB_PERSIST_DIR = ".chromadb"
+CHROMADB_ADD_BATCH_SIZE = 1024  # Chunks per collection.add call
+# Token rewritten on every store write/clear; identifies the stored corpus across sessions and restarts
+STORE_FINGERPRINT_PATH = os.path.join(CHROMADB_PERSIST_DIR, "store_fingerprint")
 SUPPORTED_FILE_TYPES = ['.pdf', '.txt', '.xlsx', '.xls', '.csv', '.xlsm']
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB slices for streaming file hashes
+SPILL_CHUNK_SIZE = 1 << 20  # 1 MiB slices when copying uploads to temp files for extraction workers
+PARALLEL_HASH_THRESHOLD = 4 * 1024 * 1024  # Smaller files hash inline
+FILE_DIGEST_CACHE_SIZE = 256  # Upload digests remembered between compute_file_hash calls
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 128))  # Texts per embeddings request
+EMBEDDING_MAX_BATCH_CHARS = 200_000  # Characters per embeddings request (~50K tokens, under the per-request limit)
+EMBEDDING_MAX_WORKERS = 4  # Concurrent embeddings requests
+EXTRACTION_MAX_WORKERS = min(4, os.cpu_count() or 1)  # Processes parsing PDFs in parallel
+# Plain-text extraction: no image blocks, no whitespace preservation (collapsed anyway), page-clipped
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_MEDIABOX_CLIP
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(".cache", "embeddings.sqlite"))
+
+# Worker threads for hashing several large uploads at once
+_HASH_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="docsense-hash")
+
+# (file_id, name, size) -> content digest; a Streamlit upload's file_id never changes content
+_FILE_DIGESTS: Dict[Tuple[str, str, int], str] = {}
 
 
 class DocumentIngestionError(Exception):
@@ -159,12 +188,13 @@ def get_file_extension(filename: str) -> str:
     return os.path.splitext(filename.lower())[1]
 
 
-def extract_text_from_pdf(pdf_file: BinaryIO, filename: str) -> str:
+def extract_text_from_pdf(pdf_file: Union[BinaryIO, str], filename: str) -> str:
     """
     Extract text from a PDF file using PyMuPDF with robust error handling.
     
     Args:
-        pdf_file: Binary file object containing PDF data
+        pdf_file: Binary file object containing PDF data, or a path to the
+            PDF on disk (opened by PyMuPDF directly, without reading it into memory)
         filename: Name of the PDF file for error reporting
         
     Returns:
@@ -177,12 +207,16 @@ def extract_text_from_pdf(pdf_file: BinaryIO, filename: str) -> str:
     try:
         logger.info(f"Starting PDF text extraction for '{filename}'")
         
-        # Read PDF content into memory
-        pdf_bytes = pdf_file.read()
-        pdf_file.seek(0)  # Reset file pointer for potential reuse
-        
-        # Open PDF document from bytes
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        if isinstance(pdf_file, str):
+            # Open PDF document from disk
+            doc = fitz.open(pdf_file, filetype="pdf")
+        else:
+            # Read PDF content into memory
+            pdf_bytes = pdf_file.read()
+            pdf_file.seek(0)  # Reset file pointer for potential reuse
+            
+            # Open PDF document from bytes
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         
         if doc.page_count == 0:
             raise DocumentIngestionError(f"PDF file '{filename}' contains no pages")
@@ -193,7 +227,9 @@ def extract_text_from_pdf(pdf_file: BinaryIO, filename: str) -> str:
         for page_num in range(doc.page_count):
             try:
                 page = doc[page_num]
-                page_text = page.get_text()
+                # A page with no fonts (figures, scans) cannot show text; skip
+                # interpreting its graphics-only content stream entirely
+                page_text = page.get_text("text", flags=PDF_TEXT_FLAGS) if page.get_fonts() else ""
                 
                 # Clean and validate text
                 if page_text and page_text.strip():
@@ -332,7 +368,8 @@ def extract_text_from_file(file_obj: BinaryIO, filename: str) -> str:
         )
 
 
-def process_structured_data_file(file_obj: BinaryIO, filename: str) -> Tuple[str, Dict[str, Any]]:
+def process_structured_data_file(file_obj: BinaryIO, filename: str,
+                                 structured_data: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
     """
     Process structured data file (Excel, CSV, tabular PDF) and return markdown representation.
     
@@ -345,6 +382,8 @@ def process_structured_data_file(file_obj: BinaryIO, filename: str) -> Tuple[str
     Args:
         file_obj: Binary file object
         filename: Name of the file
+        structured_data: Dict to store the parsed DataFrame in (defaults to
+            st.session_state.structured_data; pass one from worker threads)
         
     Returns:
         Tuple[str, Dict]: (markdown_text, metadata_dict)
@@ -376,11 +415,13 @@ def process_structured_data_file(file_obj: BinaryIO, filename: str) -> Tuple[str
         # Get metadata
         metadata = get_structured_data_summary(df, filename)
         
-        # Store DataFrame in session state for direct access
-        if 'structured_data' not in st.session_state:
-            st.session_state.structured_data = {}
+        # Store DataFrame for direct access (session state unless the caller gave a dict)
+        if structured_data is None:
+            if 'structured_data' not in st.session_state:
+                st.session_state.structured_data = {}
+            structured_data = st.session_state.structured_data
         
-        st.session_state.structured_data[filename] = {
+        structured_data[filename] = {
             'dataframe': df,
             'metadata': metadata,
             'markdown': markdown_text
@@ -428,6 +469,112 @@ def extract_text_from_file(file_obj: BinaryIO, filename: str) -> str:
         )
 
 
+@st.cache_resource
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Get the process pool used to parse several PDFs at once.
+    
+    PyMuPDF is not thread-safe, so PDFs are parsed in worker processes.
+    Workers are spawned (forking the multi-threaded Streamlit server is
+    unsafe) and kept for the life of the server, so their import cost is
+    paid once.
+    """
+    return ProcessPoolExecutor(
+        max_workers=EXTRACTION_MAX_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _extract_and_chunk_pdf(pdf_path: str, filename: str) -> Tuple[str, List[str]]:
+    """Extract and chunk one PDF (runs in an extraction pool worker)."""
+    text = extract_text_from_pdf(pdf_path, filename)
+    return text, chunk_text(text, filename)
+
+
+def _spill_to_temp_file(file_obj: BinaryIO) -> str:
+    """
+    Copy an upload to a temporary PDF file in SPILL_CHUNK_SIZE slices.
+    
+    Workers open the path instead of receiving the whole file pickled
+    through the pool's pipe. The caller deletes the file.
+    
+    Returns:
+        str: Path of the temporary file
+    """
+    file_obj.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="docsense-", suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(file_obj, tmp, SPILL_CHUNK_SIZE)
+    file_obj.seek(0)
+    return tmp.name
+
+
+def extract_pdfs_in_parallel(uploaded_files: List[BinaryIO],
+                             progress_callback: Optional[Callable[[int, int], None]] = None
+                             ) -> Dict[int, Union[Tuple[str, List[str]], Exception]]:
+    """
+    Extract and chunk the uploaded PDFs in worker processes.
+    
+    Only used when there are at least two PDFs; a single PDF is cheaper to
+    parse inline than to ship to a worker.
+    
+    Args:
+        uploaded_files: List of uploaded file objects
+        progress_callback: Optional callback(files_done, total_files)
+        
+    Returns:
+        Dict of file index -> (text, chunks), or the DocumentIngestionError that
+        file raised; files missing from the dict are extracted inline
+    """
+    pdf_indices = [
+        i for i, file_obj in enumerate(uploaded_files)
+        if get_file_extension(getattr(file_obj, 'name', '')) == '.pdf'
+    ]
+    if len(pdf_indices) < 2:
+        return {}
+    
+    futures = {}
+    spill_paths: List[str] = []
+    try:
+        try:
+            pool = get_extraction_pool()
+            for i in pdf_indices:
+                file_obj = uploaded_files[i]
+                spill_paths.append(_spill_to_temp_file(file_obj))
+                futures[pool.submit(_extract_and_chunk_pdf, spill_paths[-1], file_obj.name)] = i
+        except Exception as e:
+            # Pool unusable (e.g. a worker died): drop it and extract inline
+            logger.warning(f"Parallel PDF extraction unavailable, extracting inline: {str(e)}")
+            get_extraction_pool.clear()
+            return {}
+        
+        results: Dict[int, Union[Tuple[str, List[str]], Exception]] = {}
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except DocumentIngestionError as e:
+                results[index] = e
+            except Exception as e:
+                # Worker failure rather than a bad PDF: leave this file to inline extraction
+                logger.warning(f"Extraction worker failed for file {index}: {str(e)}")
+                if isinstance(e, BrokenProcessPool):
+                    get_extraction_pool.clear()
+            if progress_callback:
+                progress_callback(done, len(futures))
+        
+        logger.info(f"Extracted {len(futures)} PDFs in parallel ({EXTRACTION_MAX_WORKERS} workers)")
+        return results
+    finally:
+        # Results of a partial submission are discarded; don't start the rest
+        for future in futures:
+            future.cancel()
+        for path in spill_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
 def chunk_text(text: str, filename: str) -> List[str]:
     """
     Split text into overlapping chunks for optimal embedding and retrieval.
@@ -527,13 +674,74 @@ def test_openrouter_connection() -> bool:
         return False
 
 
+@st.cache_resource
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Get the persistent embedding cache.
+    
+    Returns:
+        Optional[EmbeddingCache]: The cache, or None if it cannot be opened
+    """
+    try:
+        return EmbeddingCache(EMBEDDING_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Embedding cache unavailable, embedding without it: {str(e)}")
+        return None
+
+
+def _embed_batch(client: OpenAI, model: str, batch: List[str]) -> List[List[float]]:
+    """Embed one batch of texts in a single request, with retries."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = client.embeddings.create(input=batch, model=model)
+            # Responses carry an index per input; keep the input order
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            if attempt < MAX_RETRIES - 1:
+                logger.warning(f"Embedding batch attempt {attempt + 1} failed: {str(e)}. Retrying...")
+                # Back off exponentially so 429s and 5xx have time to clear
+                time.sleep(2 ** attempt)
+                continue
+            raise
+
+
+def _embedding_batches(texts: List[str], indices: List[int]) -> List[List[int]]:
+    """
+    Group text indices into embeddings requests.
+    
+    Each batch holds at most EMBEDDING_BATCH_SIZE texts and, unless a single
+    text is larger, at most EMBEDDING_MAX_BATCH_CHARS characters.
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_chars = 0
+    for i in indices:
+        size = len(texts[i])
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or batch_chars + size > EMBEDDING_MAX_BATCH_CHARS):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(i)
+        batch_chars += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 @st.cache_data
-def generate_embeddings(texts: List[str]) -> List[List[float]]:
+def generate_embeddings(texts: List[str],
+                        _progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[float]]:
     """
     Generate embeddings for text chunks using OpenAI's embedding model via OpenRouter.
     
+    Vectors already in the on-disk embedding cache are reused; the rest are
+    sent in batches of up to EMBEDDING_BATCH_SIZE texts (and
+    EMBEDDING_MAX_BATCH_CHARS characters), with up to EMBEDDING_MAX_WORKERS
+    requests in flight at once.
+    
     Args:
         texts: List of text chunks to embed
+        _progress_callback: Optional callback(embedded, total, cache_hits),
+            called from the calling thread (not part of the cache key)
         
     Returns:
         List[List[float]]: List of embedding vectors
@@ -544,39 +752,50 @@ def generate_embeddings(texts: List[str]) -> List[List[float]]:
     try:
         validate_environment()
         
-        logger.info(f"Starting embedding generation for {len(texts)} text chunks")
-        
-        # For now, we'll use the LangChain OpenAI embeddings wrapper
-        # Note: OpenRouter may not support embeddings for all models
-        # We might need to use a different service for embeddings
+        if not texts:
+            return []
         
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-        
-        # Try using OpenAI embeddings (this might need adjustment for OpenRouter)
-        embedding_kwargs = {
-            "model": os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002"),
-            "openai_api_key": api_key
-        }
+        logger.info(f"Starting embedding generation for {len(texts)} text chunks")
         
-        if base_url:
-            embedding_kwargs["openai_api_base"] = base_url
+        model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
         
         try:
-            embeddings_model = OpenAIEmbeddings(**embedding_kwargs)
+            # Reuse vectors for chunks embedded in earlier runs
+            cache = get_embedding_cache()
+            keys = [embedding_cache_key(text, model) for text in texts]
+            cached = cache.get_many(keys) if cache else {}
+            embeddings: List[Optional[List[float]]] = [cached.get(key) for key in keys]
+            miss_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            cache_hits = len(texts) - len(miss_indices)
             
-            # Generate embeddings with retry logic
-            for attempt in range(MAX_RETRIES):
-                try:
-                    embeddings = embeddings_model.embed_documents(texts)
-                    logger.info(f"Generated embeddings for {len(texts)} text chunks using {embedding_kwargs['model']}")
-                    return embeddings
-                except Exception as e:
-                    if attempt < MAX_RETRIES - 1:
-                        logger.warning(f"Embedding generation attempt {attempt + 1} failed: {str(e)}. Retrying...")
-                        continue
-                    else:
-                        raise
+            if _progress_callback:
+                _progress_callback(cache_hits, len(texts), cache_hits)
+            
+            if miss_indices:
+                client = OpenAI(
+                    base_url=os.getenv("OPENAI_BASE_URL") or None,
+                    api_key=os.getenv("OPENAI_API_KEY")
+                )
+                batches = _embedding_batches(texts, miss_indices)
+                
+                embedded = cache_hits
+                with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_WORKERS, len(batches))) as pool:
+                    futures = [pool.submit(_embed_batch, client, model, [texts[i] for i in batch])
+                               for batch in batches]
+                    # Collect in submission order so vectors line up with texts
+                    for batch, future in zip(batches, futures):
+                        vectors = future.result()
+                        for i, vector in zip(batch, vectors):
+                            embeddings[i] = vector
+                        if cache:
+                            cache.set_many((keys[i], vector) for i, vector in zip(batch, vectors))
+                        embedded += len(batch)
+                        if _progress_callback:
+                            _progress_callback(embedded, len(texts), cache_hits)
+            
+            logger.info(f"Generated embeddings for {len(texts)} text chunks using {model} "
+                        f"({cache_hits} from cache, {len(miss_indices)} embedded)")
+            return embeddings
                         
         except Exception as embedding_error:
             logger.warning(f"Failed to generate embeddings via OpenRouter: {str(embedding_error)}")
@@ -602,6 +821,41 @@ def generate_embeddings(texts: List[str]) -> List[List[float]]:
         raise DocumentIngestionError(f"Embedding generation failed: {str(e)}")
 
 
+def _invalidate_query_cache() -> None:
+    """Drop the ChromaDB manager's cached query results after writing to the collection."""
+    if CHROMADB_MANAGER_AVAILABLE:
+        get_chromadb_manager().invalidate_query_cache()
+
+
+def _bump_store_fingerprint() -> None:
+    """Record that the stored corpus changed (see get_store_fingerprint)."""
+    try:
+        os.makedirs(os.path.dirname(STORE_FINGERPRINT_PATH), exist_ok=True)
+        tmp_path = f"{STORE_FINGERPRINT_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, STORE_FINGERPRINT_PATH)
+    except OSError as e:
+        logger.warning(f"Could not update store fingerprint: {str(e)}")
+
+
+def get_store_fingerprint() -> str:
+    """
+    Get the token identifying the corpus currently in the vector store.
+    
+    It changes whenever documents are ingested or cleared and is persisted with
+    the store, so every session and process sees the same value.
+    
+    Returns:
+        str: Fingerprint, or "" if the store has never been written by this version
+    """
+    try:
+        with open(STORE_FINGERPRINT_PATH, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
 def clear_vector_store() -> None:
     """
     Clear all data from the vector store collection.
@@ -616,6 +870,8 @@ def clear_vector_store() -> None:
         all_items = collection.get()
         if all_items['ids']:
             collection.delete(ids=all_items['ids'])
+            _invalidate_query_cache()
+            _bump_store_fingerprint()
             logger.info(f"Cleared {len(all_items['ids'])} items from vector store")
         else:
             logger.info("Vector store was already empty")
@@ -625,28 +881,97 @@ def clear_vector_store() -> None:
         raise DocumentIngestionError(f"Failed to clear vector store: {str(e)}")
 
 
+def _hash_file_content(file_obj: BinaryIO) -> str:
+    """
+    Hash a single file's content in HASH_CHUNK_SIZE slices.
+    
+    Args:
+        file_obj: Uploaded file object
+        
+    Returns:
+        BLAKE2b hex digest of the file content
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    
+    if hasattr(file_obj, 'getbuffer'):
+        # UploadedFile/BytesIO: hash zero-copy slices of the underlying buffer
+        buffer = file_obj.getbuffer()
+        try:
+            for offset in range(0, len(buffer), HASH_CHUNK_SIZE):
+                hasher.update(buffer[offset:offset + HASH_CHUNK_SIZE])
+        finally:
+            buffer.release()
+    else:
+        file_obj.seek(0)
+        hasher.update(file_obj.read())
+        file_obj.seek(0)
+    
+    return hasher.hexdigest()
+
+
+def _file_digest(file_obj: BinaryIO) -> str:
+    """
+    Content digest of one upload, memoized by its Streamlit file_id.
+    
+    The same upload is hashed by the app's change check and again by
+    ingest_documents, and on every "Process" click; only the first pays.
+    Objects without a file_id are always hashed.
+    """
+    file_id = getattr(file_obj, 'file_id', None)
+    if file_id is None:
+        return _hash_file_content(file_obj)
+    
+    key = (file_id, getattr(file_obj, 'name', 'unknown'), getattr(file_obj, 'size', 0))
+    digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        digest = _hash_file_content(file_obj)
+        if len(_FILE_DIGESTS) >= FILE_DIGEST_CACHE_SIZE:
+            _FILE_DIGESTS.clear()
+        _FILE_DIGESTS[key] = digest
+    return digest
+
+
 def compute_file_hash(uploaded_files: List[BinaryIO]) -> str:
     """
-    Compute a combined hash for all uploaded files to detect document changes.
+    Compute a combined content hash for all uploaded files to detect document changes.
+    
+    Files are hashed in HASH_CHUNK_SIZE slices so a large upload set is never
+    copied into a second buffer, and are ordered by (name, size) so the result
+    does not depend on upload order. When several files exceed
+    PARALLEL_HASH_THRESHOLD they are hashed concurrently on _HASH_POOL
+    (hashlib releases the GIL on large buffers). Per-file digests are
+    memoized by upload (see _file_digest), so repeat calls are cheap.
     
     Args:
         uploaded_files: List of uploaded file objects
         
     Returns:
-        MD5 hash representing all files
+        BLAKE2b hex digest representing all files
     """
-    import hashlib
+    ordered_files = sorted(
+        uploaded_files,
+        key=lambda f: (getattr(f, 'name', 'unknown'), getattr(f, 'size', 0))
+    )
     
-    hash_content = ""
-    for file_obj in uploaded_files:
+    large_files = sum(1 for f in ordered_files if getattr(f, 'size', 0) >= PARALLEL_HASH_THRESHOLD)
+    if large_files > 1:
+        digests = list(_HASH_POOL.map(_file_digest, ordered_files))
+    else:
+        digests = [_file_digest(f) for f in ordered_files]
+    
+    hasher = hashlib.blake2b(digest_size=16)
+    for file_obj, digest in zip(ordered_files, digests):
         filename = getattr(file_obj, 'name', 'unknown')
         file_size = getattr(file_obj, 'size', 0)
-        hash_content += f"{filename}:{file_size};"
+        hasher.update(f"{filename}:{file_size}:{digest};".encode())
     
-    return hashlib.md5(hash_content.encode()).hexdigest()
+    return hasher.hexdigest()
 
 
-def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[str] = None) -> Tuple[int, int, str]:
+def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[str] = None,
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     extraction_callback: Optional[Callable[[int, int], None]] = None,
+                     structured_data: Optional[Dict[str, Any]] = None) -> Tuple[int, int, str]:
     """
     Extract, chunk, embed, and store document texts in ChromaDB vector database.
     
@@ -666,6 +991,11 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
     Args:
         uploaded_files: List of uploaded document file objects
         session_doc_hash: Hash of previously processed documents (from session state)
+        progress_callback: Optional callback(embedded, total, cache_hits) for embedding progress
+        extraction_callback: Optional callback(files_done, total_files) for parallel PDF extraction
+        structured_data: Optional dict that receives parsed structured files instead of
+            st.session_state.structured_data (background threads must not touch session state;
+            the caller publishes it from the script thread)
         
     Returns:
         Tuple[int, int, str]: (total_chunks_processed, total_files_processed, document_hash)
@@ -699,8 +1029,8 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
         # Clear previous data
         clear_vector_store()
         
-        # Clear structured data from session state
-        if 'structured_data' in st.session_state:
+        # Clear structured data from session state (a caller-provided dict starts empty)
+        if structured_data is None and 'structured_data' in st.session_state:
             st.session_state.structured_data = {}
         
         collection = get_collection()
@@ -713,7 +1043,10 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
         total_chunks = 0
         structured_files_count = 0
         
-        for file_obj in uploaded_files:
+        # Parse PDFs concurrently up front; results are consumed in upload order below
+        extracted_pdfs = extract_pdfs_in_parallel(uploaded_files, extraction_callback)
+        
+        for file_index, file_obj in enumerate(uploaded_files):
             filename = getattr(file_obj, 'name', f'unknown_file_{files_processed}')
             
             try:
@@ -731,7 +1064,7 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
                     
                     try:
                         # Process as structured data (no vector embeddings)
-                        markdown_text, metadata = process_structured_data_file(file_obj, filename)
+                        markdown_text, metadata = process_structured_data_file(file_obj, filename, structured_data)
                         
                         # Store as a single "chunk" in vector DB for tracking
                         # But mark it as structured so we know to use direct data access
@@ -765,8 +1098,16 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
                         # Fall through to text extraction
                         file_obj.seek(0)  # Reset file pointer
                 
-                # Extract text from document (PDF/TXT or failed structured parsing)
-                text = extract_text_from_file(file_obj, filename)
+                if file_index in extracted_pdfs:
+                    # Already extracted and chunked by an extraction pool worker
+                    extracted = extracted_pdfs[file_index]
+                    if isinstance(extracted, Exception):
+                        raise extracted
+                    text, chunks = extracted
+                else:
+                    # Extract text from document (PDF/TXT or failed structured parsing)
+                    text = extract_text_from_file(file_obj, filename)
+                    chunks = None
                 
                 # Skip empty files
                 if not text or not text.strip():
@@ -774,7 +1115,8 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
                     continue
                 
                 # Chunk the text
-                chunks = chunk_text(text, filename)
+                if chunks is None:
+                    chunks = chunk_text(text, filename)
                 
                 # Prepare data for vector store
                 for chunk_idx, chunk in enumerate(chunks):
@@ -806,15 +1148,19 @@ def ingest_documents(uploaded_files: List[BinaryIO], session_doc_hash: Optional[
         
         # Generate embeddings for all chunks
         logger.info(f"Generating embeddings for {len(all_texts)} chunks...")
-        embeddings = generate_embeddings(all_texts)
-        
-        # Store in ChromaDB
-        collection.add(
-            documents=all_texts,
-            metadatas=all_metadatas,
-            ids=all_ids,
-            embeddings=embeddings
-        )
+        embeddings = generate_embeddings(all_texts, _progress_callback=progress_callback)
+        
+        # Store in ChromaDB, in slices so large uploads don't spike memory or exceed Chroma's batch limit
+        for start in range(0, len(all_texts), CHROMADB_ADD_BATCH_SIZE):
+            end = start + CHROMADB_ADD_BATCH_SIZE
+            collection.add(
+                documents=all_texts[start:end],
+                metadatas=all_metadatas[start:end],
+                ids=all_ids[start:end],
+                embeddings=embeddings[start:end]
+            )
+        _invalidate_query_cache()
+        _bump_store_fingerprint()
         
         logger.info(f"Successfully ingested {files_processed} files with {total_chunks} chunks into vector store")
         return total_chunks, files_processed, current_hash
@@ -15,17 +15,20 @@ Created: August 2025
 Last Updated: October 2025
 """
 
+import atexit
 import logging
 import os
 from typing import List, Tuple, Dict, Any, Optional, Generator
 import time
+import threading
 from datetime import datetime, timedelta
 import hashlib
 
 import streamlit as st
 import chromadb
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 import numpy as np
 
 from ingestion import get_collection, DocumentIngestionError
@@ -40,11 +43,16 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "tngtech/deepseek-r1t2-chimera:free")
 DEFAULT_TEMPERATURE = 0.1
 MAX_RETRIES = 3  # Retry attempts with exponential backoff
+MAX_RETRY_WAIT = 10.0  # Seconds; a longer Retry-After fails the answer instead of blocking the UI
 TOP_K_RESULTS = 5  # Retrieve more chunks for better context (increased from 3)
 CHUNK_SIZE = 1000  # Optimal chunk size for processing
 CHUNK_OVERLAP = 200  # Overlap between chunks to maintain context continuity
 CACHE_EXPIRY_MINUTES = 30
 CHUNK_SEPARATOR = "\n---\n"  # Clear separator between document chunks
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 32))  # In-flight completions across all sessions
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+HTTP_KEEPALIVE_EXPIRY = 300.0  # Seconds an idle connection is kept; httpx's 5s default drops it between questions
 
 
 class QueryEngineError(Exception):
@@ -52,6 +60,19 @@ class QueryEngineError(Exception):
     pass
 
 
+def _retry_after_seconds(error: RateLimitError) -> float:
+    """
+    Seconds to wait before retrying, from a 429 response's Retry-After header.
+    
+    Returns:
+        Header value in seconds, or 0 if absent or not a number
+    """
+    try:
+        return float(error.response.headers.get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
 class QueryEngine:
     """
     OPTIMIZED query engine for semantic search and question answering.
@@ -88,11 +109,26 @@ class QueryEngine:
             self.site_url = os.getenv("SITE_URL", "http://localhost:8501")
             self.site_name = os.getenv("SITE_NAME", "DocSense Research Assistant")
             
-            # Initialize OpenRouter client
+            # Initialize OpenRouter client. Idle connections are kept alive long enough
+            # to be reused by the next question instead of paying a new TLS handshake.
+            # Retries are done by our own loops, so the SDK's are disabled.
             self.client = OpenAI(
                 base_url=self.base_url,
-                api_key=self.api_key
+                api_key=self.api_key,
+                max_retries=0,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                    )
+                )
             )
+            atexit.register(self.client.close)
+            
+            # The engine is shared by every session (get_query_engine is a cache_resource),
+            # so this bounds concurrent completions process-wide to stay under rate limits
+            self._request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
             
             # Test the connection with retry logic
             self._test_connection()
@@ -316,43 +352,55 @@ ANSWER:"""
                 # Track time to first token
                 api_call_start = time.time()
                 
-                # Create streaming completion
-                stream = self.client.chat.completions.create(
-                    extra_headers={
-                        "HTTP-Referer": self.site_url,
-                        "X-Title": self.site_name,
-                    },
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=self.temperature,
-                    max_tokens=1500,
-                    stream=True
-                )
-                
-                # Track if first token received
-                first_token_received = False
-                first_token_time = None
-                
-                # Stream the response
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        # Clear thinking placeholder on first token
-                        if not first_token_received:
-                            first_token_time = time.time() - api_call_start
-                            logger.info(f"⚡ First token received in {first_token_time:.2f}s")
-                            if thinking_placeholder:
-                                thinking_placeholder.empty()
-                            first_token_received = True
-                        
-                        yield chunk.choices[0].delta.content
+                # Hold a request slot for the lifetime of the stream
+                with self._request_slots:
+                    # Create streaming completion
+                    stream = self.client.chat.completions.create(
+                        extra_headers={
+                            "HTTP-Referer": self.site_url,
+                            "X-Title": self.site_name,
+                        },
+                        model=self.model_name,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=1500,
+                        stream=True
+                    )
+                    
+                    # Track if first token received
+                    first_token_received = False
+                    first_token_time = None
+                    
+                    # Stream the response
+                    for chunk in stream:
+                        if chunk.choices[0].delta.content:
+                            # Clear thinking placeholder on first token
+                            if not first_token_received:
+                                first_token_time = time.time() - api_call_start
+                                logger.info(f"⚡ First token received in {first_token_time:.2f}s")
+                                if thinking_placeholder:
+                                    thinking_placeholder.empty()
+                                first_token_received = True
+                            
+                            yield chunk.choices[0].delta.content
                 
                 return  # Successful streaming, exit retry loop
                 
             except Exception as e:
                 wait_time = 2 ** attempt
+                if isinstance(e, RateLimitError):
+                    # Rate limited: wait at least as long as the server asks
+                    wait_time = max(wait_time, _retry_after_seconds(e))
                 logger.warning(f"Streaming attempt {attempt + 1}/{MAX_RETRIES} failed: {str(e)}")
                 
-                if attempt < MAX_RETRIES - 1:
+                if wait_time > MAX_RETRY_WAIT:
+                    # Don't hold the script thread for a long Retry-After
+                    logger.error(f"Rate limited; server asked to wait {wait_time:.0f}s")
+                    if thinking_placeholder:
+                        thinking_placeholder.empty()
+                    yield f"\n\n❌ Error: The model is rate limited. Please try again in {wait_time:.0f} seconds."
+                    return
+                elif attempt < MAX_RETRIES - 1:
                     logger.info(f"Retrying in {wait_time}s...")
                     time.sleep(wait_time)
                 else:
@@ -0,0 +1,137 @@
+"""
+Semantic Query Cache for DocSense
+
+Caches answers keyed by query embedding so that repeated or near-identical
+questions are served without re-running retrieval and generation.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+INT8_MAX = 127
+
+
+def conversation_digest(messages: Sequence[Dict[str, Any]]) -> str:
+    """
+    Digest the prior turns an answer was generated with.
+
+    Follow-ups like "and the second one?" embed alike in every conversation,
+    so callers add this to the cache scope; an empty history always gives
+    the same digest, so first questions are still shared.
+    """
+    turns = [(message.get("role"), message.get("content")) for message in messages]
+    return hashlib.sha256(json.dumps(turns, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    In-memory LRU cache of (scope, query embedding) -> value.
+
+    Lookups only consider entries stored under the same scope (for example
+    the current document hash and detail level), and return the value of the
+    most similar entry when its cosine similarity reaches the threshold.
+
+    Stored embeddings are quantized to int8 with a per-vector scale (a
+    quarter of the float32 memory); the cosine error this adds is well
+    under 0.01, far below the gap between a paraphrase and a new question.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+        """Return a unit-length float32 copy of the embedding, or None if degenerate."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> tuple:
+        """Quantize a unit vector to int8 with a per-vector scale."""
+        scale = float(np.max(np.abs(vector))) / INT8_MAX
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def lookup(self, scope: Hashable, embedding: Sequence[float]) -> Optional[Any]:
+        """
+        Find the cached value for the most similar query in this scope.
+
+        Args:
+            scope: Cache partition key (e.g. document hash + detail level)
+            embedding: Query embedding
+
+        Returns:
+            Cached value on a hit, None on a miss
+        """
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+
+        with self._lock:
+            entry_ids: List[int] = []
+            vectors: List[np.ndarray] = []
+            scales: List[float] = []
+            for entry_id, (entry_scope, (vector, scale), _) in self._entries.items():
+                if entry_scope == scope and vector.shape == query.shape:
+                    entry_ids.append(entry_id)
+                    vectors.append(vector)
+                    scales.append(scale)
+
+            if not vectors:
+                return None
+
+            # One matrix-vector product scores every candidate, rescaled per entry
+            similarities = (np.vstack(vectors).astype(np.float32) @ query) * np.asarray(scales, dtype=np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+            logger.info(f"Semantic cache hit (similarity: {similarities[best]:.3f})")
+            return self._entries[entry_id][2]
+
+    def store(self, scope: Hashable, embedding: Sequence[float], value: Any) -> None:
+        """
+        Cache a value for a query embedding, evicting the least recently used entries.
+
+        Args:
+            scope: Cache partition key
+            embedding: Query embedding
+            value: Value to return for similar queries
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+
+        with self._lock:
+            self._entries[self._next_id] = (scope, self._quantize(vector), value)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
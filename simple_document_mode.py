@@ -23,6 +23,9 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Leading PDF pages scanned for production/structured data
+STRUCTURE_SCAN_PAGES = 3
+
 
 class SimpleDocumentStore:
     """In-memory document storage with simple text-based retrieval."""
@@ -203,6 +206,9 @@ def process_uploaded_files(uploaded_files, progress_callback=None) -> bool:
                 total_pages = len(pdf_reader.pages)
                 logger.info(f"PDF has {total_pages} pages - using pypdf extraction")
                 
+                # First pages' text is kept for the structured-data pass below
+                leading_texts = []
+                
                 for page_num, page in enumerate(pdf_reader.pages):
                     # Update progress
                     if progress_callback:
@@ -216,6 +222,8 @@ def process_uploaded_files(uploaded_files, progress_callback=None) -> bool:
                         logger.info(f"Processing page {page_num + 1}/{total_pages}")
                     
                     text = page.extract_text()
+                    if page_num < STRUCTURE_SCAN_PAGES:
+                        leading_texts.append(text)
                     
                     if text and text.strip():
                         # Split into chunks
@@ -231,11 +239,8 @@ def process_uploaded_files(uploaded_files, progress_callback=None) -> bool:
                 logger.info(f"pypdf extracted {len(all_docs)} chunks from {filename}")
                 
                 # Try to extract structured production data
-                pdf_file.seek(0)
-                full_text = ""
-                pdf_reader = pypdf.PdfReader(pdf_file)
-                for page in pdf_reader.pages[:3]:  # Check first 3 pages for structure
-                    full_text += page.extract_text() + "\n"
+                # Reuse the first pages' text instead of parsing the PDF a second time
+                full_text = "".join(text + "\n" for text in leading_texts)
                 
                 # Parse production metrics
                 prod_df = extract_production_metrics(full_text)
@@ -211,6 +211,21 @@ def create_chart(df: pd.DataFrame, chart_type: str = 'auto', title: str = "Data
         return None
 
 
+@st.cache_data(show_spinner=False, max_entries=256)
+def _build_visuals(response: str, show_charts: bool) -> Tuple[Optional[pd.DataFrame], Optional[go.Figure]]:
+    """
+    Parse a response's table and build its chart.
+    
+    Memoized per response text, so chat history re-renders reuse the
+    DataFrame and figure instead of re-parsing and re-charting every rerun.
+    """
+    df = extract_numerical_data(response)
+    chart = None
+    if df is not None and not df.empty and show_charts:
+        chart = create_chart(df, chart_type='auto', title="Extracted Data Visualization")
+    return df, chart
+
+
 def display_response_with_visuals(response: str, show_charts: bool = True):
     """
     Display response with automatic table formatting and chart generation.
@@ -219,19 +234,16 @@ def display_response_with_visuals(response: str, show_charts: bool = True):
         response: LLM response text
         show_charts: Whether to show charts
     """
-    # Extract and display tables
-    df = extract_numerical_data(response)
+    # Extract and display tables (parsed and charted once per response)
+    df, chart = _build_visuals(response, show_charts)
     
     if df is not None and not df.empty:
         st.markdown("### 📊 Data Table")
         st.dataframe(df, use_container_width=True)
         
-        if show_charts:
-            # Create and display chart
-            chart = create_chart(df, chart_type='auto', title="Extracted Data Visualization")
-            if chart:
-                st.markdown("### 📈 Visualization")
-                st.plotly_chart(chart, use_container_width=True)
+        if chart:
+            st.markdown("### 📈 Visualization")
+            st.plotly_chart(chart, use_container_width=True)
     
     # Display text response
     st.markdown("### 💬 Analysis")
@@ -0,0 +1,75 @@
+"""
+Test Persistent Answer Cache
+
+Verifies round-tripping, persistence across instances and LRU eviction.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from answer_cache import AnswerCache
+
+
+def test_round_trip_and_persistence():
+    """Test that stored answers are returned, including from a new instance."""
+    print("Testing round trip and persistence...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / "cache" / "answers.sqlite")
+        value = ["answer", [{"source": "a.pdf", "page": 1}], {"total_time": 1.5}]
+        AnswerCache(path).set(b"key", value)
+
+        cache = AnswerCache(path)
+        assert cache.get(b"key") == value, "Answer should round-trip"
+        assert cache.get(b"missing") is None, "Missing key should return None"
+        assert len(cache) == 1, "Cache should hold one entry"
+    print("✓ Round trip and persistence working")
+
+
+def test_lru_eviction():
+    """Test that the least recently used answer is evicted first."""
+    print("\nTesting LRU eviction...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = AnswerCache(str(Path(tmp_dir) / "answers.sqlite"), max_entries=2)
+        cache.set(b"first", "1")
+        time.sleep(0.01)
+        cache.set(b"second", "2")
+        time.sleep(0.01)
+        cache.get(b"first")  # Touch "first"
+        time.sleep(0.01)
+        cache.set(b"third", "3")
+        assert len(cache) == 2, "Cache should stay at max_entries"
+        assert cache.get(b"first") == "1", "Recently used entry should survive"
+        assert cache.get(b"second") is None, "LRU entry should be evicted"
+    print("✓ LRU eviction working")
+
+
+def main():
+    """Run all tests."""
+    print("=" * 60)
+    print("ANSWER CACHE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_round_trip_and_persistence()
+        test_lru_eviction()
+
+        print("\n" + "=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print(f"❌ TEST FAILED: {str(e)}")
+        print("=" * 60)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
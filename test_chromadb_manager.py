@@ -0,0 +1,287 @@
+"""
+Test ChromaDB Manager Query Path
+
+Verifies the query result cache, query batching, MMR selection and the
+int8 sqlite-vec index against exact fp32 search.
+"""
+
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+import chromadb_manager
+from chromadb_manager import (
+    ChromaDBManager,
+    QueryCache,
+    SQLITE_VEC_AVAILABLE,
+    SQLITE_VEC_RERANK_FACTOR,
+    _BatchQueryScheduler,
+    _mmr_select,
+    _SqliteVecIndex,
+)
+
+
+class TableEmbeddingFunction(EmbeddingFunction):
+    """Embeds texts by looking them up in a fixed table (no model download)."""
+
+    def __init__(self, table=None):
+        self.table = table or {}
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [np.asarray(self.table[text], dtype=np.float32) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "table"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return TableEmbeddingFunction()
+
+
+class RecordingCollection:
+    """Collection stand-in that answers each query embedding with its first component."""
+
+    def __init__(self, gate: threading.Event = None, error: Exception = None):
+        self.gate = gate
+        self.error = error
+        self.calls = []
+        self.entered = threading.Event()
+
+    def query(self, query_embeddings, n_results, where):
+        self.calls.append(len(query_embeddings))
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {
+            "ids": [[f"id-{int(vector[0])}"] for vector in query_embeddings],
+            "embeddings": None,
+            "documents": [[f"doc-{int(vector[0])}"] for vector in query_embeddings],
+            "uris": None,
+            "data": None,
+            "metadatas": [[{}] for _ in query_embeddings],
+            "distances": [[0.0] for _ in query_embeddings],
+            "included": ["documents", "metadatas", "distances"],
+        }
+
+
+def _mmr_reference(embeddings, query_embedding, k, lambda_mult):
+    """Textbook MMR: recompute every similarity from scratch each round."""
+    def cosine(a, b):
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    picked = []
+    remaining = list(range(len(embeddings)))
+    while remaining and len(picked) < k:
+        def score(i):
+            redundancy = max((cosine(embeddings[i], embeddings[j]) for j in picked), default=0.0)
+            return lambda_mult * cosine(embeddings[i], query_embedding) - (1.0 - lambda_mult) * redundancy
+        best = max(remaining, key=score)
+        picked.append(best)
+        remaining.remove(best)
+    return picked
+
+
+def test_query_cache_ttl_and_invalidation():
+    """Test that cached results expire and are dropped when the collection changes."""
+    print("Testing query cache...")
+    key = QueryCache.make_key(["what is the capacity?"], 5, None, 10)
+    cache = QueryCache(ttl=0.05)
+    cache.store(key, {"ids": [["a"]]}, cache.lookup(key)[1])
+    assert cache.lookup(key)[0] == {"ids": [["a"]]}, "Fresh entry should hit"
+    time.sleep(0.1)
+    assert cache.lookup(key)[0] is None, "Expired entry should miss"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = ChromaDBManager(persist_dir=tmp_dir)
+        _, generation = manager._query_cache.lookup(key)
+        manager._query_cache.store(key, {"ids": [["a"]]}, generation)
+        assert manager._query_cache.lookup(key)[0] is not None, "Stored entry should hit"
+        manager.invalidate_query_cache()
+        assert manager._query_cache.lookup(key)[0] is None, "Invalidation should drop entries"
+        manager._query_cache.store(key, {"ids": [["stale"]]}, generation)
+        assert manager._query_cache.lookup(key)[0] is None, "Results from before the write should not be stored"
+    print("✓ Query cache working")
+
+
+def test_batcher_fan_out():
+    """Test that queued queries share one call and each caller gets its own rows."""
+    print("\nTesting query batching...")
+    gate = threading.Event()
+    collection = RecordingCollection(gate=gate)
+    batcher = _BatchQueryScheduler()
+    results = {}
+
+    def run(value):
+        results[value] = batcher.query(collection, [[float(value)]], 1, None)
+
+    first = threading.Thread(target=run, args=(0,))
+    first.start()
+    assert collection.entered.wait(5), "First query should reach the collection"
+    # Queries arriving while Chroma is busy are queued for the next round
+    others = [threading.Thread(target=run, args=(value,)) for value in (1, 2, 3)]
+    for thread in others:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while batcher._queue.qsize() < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for thread in [first] + others:
+        thread.join(5)
+
+    assert collection.calls == [1, 3], f"Queued queries should share one call, got {collection.calls}"
+    for value in range(4):
+        assert results[value]["ids"] == [[f"id-{value}"]], "Each caller should get its own rows"
+        assert results[value]["documents"] == [[f"doc-{value}"]], "Each caller should get its own documents"
+    print("✓ Query batching working")
+
+
+def test_batcher_errors():
+    """Test that a failing query raises in its caller and the worker keeps serving."""
+    print("\nTesting query batching errors...")
+    batcher = _BatchQueryScheduler()
+    try:
+        batcher.query(RecordingCollection(error=ValueError("hnsw failure")), [[1.0]], 1, None)
+        raise AssertionError("Query error should reach the caller")
+    except ValueError as e:
+        assert str(e) == "hnsw failure", "Caller should get the original exception"
+    result = batcher.query(RecordingCollection(), [[7.0]], 1, None)
+    assert result["ids"] == [["id-7"]], "Worker should keep serving after an error"
+    print("✓ Query batching errors working")
+
+
+def test_mmr_select():
+    """Test MMR picks against a brute-force reference."""
+    print("\nTesting MMR selection...")
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(16).astype(np.float32)
+    base = rng.standard_normal((12, 16)).astype(np.float32)
+    # Near-duplicates of the first rows make diversity matter
+    embeddings = np.vstack([base, base[:4] + 0.01 * rng.standard_normal((4, 16)).astype(np.float32)])
+
+    relevance = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    for lambda_mult in (1.0, 0.7, 0.5, 0.2, 0.0):
+        picked = _mmr_select(embeddings, query, 6, lambda_mult)
+        assert picked == _mmr_reference(embeddings, query, 6, lambda_mult), \
+            f"Picks should match the reference (lambda={lambda_mult})"
+        if lambda_mult > 0.0:
+            assert picked[0] == int(np.argmax(relevance)), "First pick should be the most relevant"
+    assert _mmr_select(embeddings, query, 6, 1.0) == list(np.argsort(-relevance)[:6]), \
+        "lambda=1.0 should rank by relevance"
+    print("✓ MMR selection working")
+
+
+def test_mmr_query():
+    """Test that mmr_query swaps a near-duplicate for a more diverse chunk."""
+    print("\nTesting MMR query...")
+    table = {
+        "question": [1.0, 0.0, 0.0],
+        "pump p-1 capacity": [0.9, 0.1, 0.0],
+        "pump p-1 capacity (copy)": [0.9, 0.11, 0.0],
+        "tank t-1 volume": [0.6, 0.0, 0.8],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chromadb_manager.QUERY_EMBEDDING_CACHE_PATH = str(Path(tmp_dir) / "query_embeddings.sqlite")
+        manager = ChromaDBManager(persist_dir=tmp_dir)
+        manager._collection = manager.get_client().get_or_create_collection(
+            name="document_chunks",
+            embedding_function=TableEmbeddingFunction(table),
+            metadata={"hnsw:space": "cosine"}
+        )
+        documents = [text for text in table if text != "question"]
+        manager._collection.add(documents=documents, ids=documents)
+
+        relevant = manager.mmr_query("question", n_results=2, fetch_k=3, lambda_mult=1.0)
+        assert relevant["ids"] == [["pump p-1 capacity", "pump p-1 capacity (copy)"]], "lambda=1.0 should rank by relevance"
+        diverse = manager.mmr_query("question", n_results=2, fetch_k=3, lambda_mult=0.3)
+        assert diverse["ids"] == [["pump p-1 capacity", "tank t-1 volume"]], "Near-duplicate should be skipped"
+        assert diverse["documents"] == diverse["ids"], "Documents should follow the picked order"
+    print("✓ MMR query working")
+
+
+def test_int8_index_matches_fp32():
+    """Test that the int8 index, after re-ranking, returns the exact fp32 top-k."""
+    print("\nTesting int8 sqlite-vec index...")
+    if not SQLITE_VEC_AVAILABLE or not hasattr(sqlite3.Connection, "enable_load_extension"):
+        print("⚠️ sqlite-vec not available, skipped")
+        return
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((300, 32)).astype(np.float32)
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    queries = rng.standard_normal((5, 32)).astype(np.float32)
+    k = 5
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = _SqliteVecIndex(str(Path(tmp_dir) / "vec.sqlite"), quantize=True)
+        index.upsert(ids, vectors.tolist())
+
+        class StoredCollection:
+            def get(self, ids, include):
+                rows = [int(chunk_id.split("-")[1]) for chunk_id in ids]
+                return {
+                    "ids": ids,
+                    "documents": [f"doc-{row}" for row in rows],
+                    "metadatas": [{"row": row} for row in rows],
+                    "embeddings": vectors[rows],
+                }
+
+        chromadb_manager.USE_SQLITE_VEC = True
+        manager = ChromaDBManager(persist_dir=tmp_dir)
+        manager._vec_index = index
+        manager._vec_synced_generation = manager._vec_generation
+        results = manager._vec_query(StoredCollection(), queries.tolist(), k)
+        index.close()
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for query, result_ids in zip(queries, results["ids"]):
+        exact = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:k]
+        assert result_ids == [ids[row] for row in exact], "Re-ranked int8 results should equal the fp32 top-k"
+    assert all(len(hits) == k for hits in results["distances"]), "Each query should get k distances"
+    assert SQLITE_VEC_RERANK_FACTOR > 1, "int8 candidates should be over-fetched for re-ranking"
+    print("✓ int8 sqlite-vec index working")
+
+
+def main():
+    """Run all tests."""
+    print("=" * 60)
+    print("CHROMADB MANAGER TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_query_cache_ttl_and_invalidation()
+        test_batcher_fan_out()
+        test_batcher_errors()
+        test_mmr_select()
+        test_mmr_query()
+        test_int8_index_matches_fp32()
+
+        print("\n" + "=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print(f"❌ TEST FAILED: {str(e)}")
+        print("=" * 60)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
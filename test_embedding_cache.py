@@ -0,0 +1,66 @@
+"""
+Test Persistent Embedding Cache
+
+Verifies round-tripping, missing keys and persistence across instances.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+def test_keys():
+    """Test that keys depend on both the text and the model."""
+    print("Testing cache keys...")
+    key = embedding_cache_key("hello", "model-a")
+    assert key == embedding_cache_key("hello", "model-a"), "Keys should be deterministic"
+    assert key != embedding_cache_key("hello", "model-b"), "Model should change the key"
+    assert key != embedding_cache_key("hello!", "model-a"), "Text should change the key"
+    print("✓ Cache keys working")
+
+
+def test_round_trip_and_persistence():
+    """Test that stored vectors are returned, including from a new instance."""
+    print("\nTesting round trip and persistence...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / "cache" / "embeddings.sqlite")
+        cache = EmbeddingCache(path)
+        cache.set_many([("a", [0.5, -1.0, 2.0]), ("b", [1.0, 0.0, 0.25])])
+
+        found = EmbeddingCache(path).get_many(["a", "b", "missing"])
+        assert set(found) == {"a", "b"}, "Only stored keys should be found"
+        assert found["a"] == [0.5, -1.0, 2.0], "Vector should round-trip"
+        assert len(cache) == 2, "Cache should hold two entries"
+    print("✓ Round trip and persistence working")
+
+
+def main():
+    """Run all tests."""
+    print("=" * 60)
+    print("EMBEDDING CACHE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_keys()
+        test_round_trip_and_persistence()
+
+        print("\n" + "=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print(f"❌ TEST FAILED: {str(e)}")
+        print("=" * 60)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Test Semantic Query Cache
+
+Verifies hit/miss behaviour, scope and conversation isolation and LRU eviction.
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+
+from semantic_cache import SemanticCache, conversation_digest
+
+
+def test_exact_and_near_hits():
+    """Test that identical and near-identical embeddings hit the cache."""
+    print("Testing cache hits...")
+    cache = SemanticCache(threshold=0.95)
+    cache.store("docs", [1.0, 0.0, 0.0], "answer")
+    assert cache.lookup("docs", [1.0, 0.0, 0.0]) == "answer", "Exact query should hit"
+    assert cache.lookup("docs", [0.99, 0.05, 0.0]) == "answer", "Near query should hit"
+    assert cache.lookup("docs", [0.0, 1.0, 0.0]) is None, "Orthogonal query should miss"
+    print("✓ Hits and misses working")
+
+
+def test_quantized_similarity():
+    """Test that int8-quantized entries keep full-size embeddings distinguishable."""
+    print("\nTesting quantized similarity...")
+    rng = np.random.default_rng(0)
+    stored = rng.standard_normal(1536)
+    paraphrase = stored + 0.1 * rng.standard_normal(1536)  # cosine ~0.995
+    cache = SemanticCache(threshold=0.95)
+    cache.store("docs", stored, "answer")
+    assert cache.lookup("docs", stored) == "answer", "Same embedding should hit"
+    assert cache.lookup("docs", paraphrase) == "answer", "Near embedding should hit"
+    assert cache.lookup("docs", rng.standard_normal(1536)) is None, "Unrelated embedding should miss"
+    print("✓ Quantized similarity working")
+
+
+def test_scope_isolation():
+    """Test that entries are only visible within their scope."""
+    print("\nTesting scope isolation...")
+    cache = SemanticCache()
+    cache.store(("hash-a", "brief"), [1.0, 0.0], "brief answer")
+    assert cache.lookup(("hash-a", "detailed"), [1.0, 0.0]) is None, "Other detail level should miss"
+    assert cache.lookup(("hash-b", "brief"), [1.0, 0.0]) is None, "Other documents should miss"
+    print("✓ Scope isolation working")
+
+
+def test_conversation_scope():
+    """Test that follow-ups only hit within the conversation they were asked in."""
+    print("\nTesting conversation scoping...")
+    cache = SemanticCache()
+    first = [{"role": "user", "content": "List the pumps"}, {"role": "assistant", "content": "P-1, P-2"}]
+    second = [{"role": "user", "content": "List the tanks"}, {"role": "assistant", "content": "T-1, T-2"}]
+    follow_up = [1.0, 0.0]  # "and the second one?" embeds alike in both conversations
+    cache.store(("hash-a", "brief", conversation_digest(first)), follow_up, "P-2")
+    assert cache.lookup(("hash-a", "brief", conversation_digest(second)), follow_up) is None, \
+        "Follow-up in another conversation should miss"
+    assert cache.lookup(("hash-a", "brief", conversation_digest(list(first))), follow_up) == "P-2", \
+        "Follow-up in the same conversation should hit"
+    assert conversation_digest([]) == conversation_digest([]), "First questions should share a scope"
+    print("✓ Conversation scoping working")
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    print("\nTesting LRU eviction...")
+    cache = SemanticCache(max_entries=2)
+    cache.store("docs", [1.0, 0.0, 0.0], "first")
+    cache.store("docs", [0.0, 1.0, 0.0], "second")
+    cache.lookup("docs", [1.0, 0.0, 0.0])  # Touch "first"
+    cache.store("docs", [0.0, 0.0, 1.0], "third")
+    assert len(cache) == 2, "Cache should stay at max_entries"
+    assert cache.lookup("docs", [1.0, 0.0, 0.0]) == "first", "Recently used entry should survive"
+    assert cache.lookup("docs", [0.0, 1.0, 0.0]) is None, "LRU entry should be evicted"
+    print("✓ LRU eviction working")
+
+
+def main():
+    """Run all tests."""
+    print("=" * 60)
+    print("SEMANTIC CACHE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_exact_and_near_hits()
+        test_quantized_similarity()
+        test_scope_isolation()
+        test_conversation_scope()
+        test_lru_eviction()
+
+        print("\n" + "=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print(f"❌ TEST FAILED: {str(e)}")
+        print("=" * 60)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,9 +11,26 @@ from typing import List, Dict, Any, Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# Candidates re-ranked per result (search pool = top_k * multiplier)
+DEFAULT_CANDIDATE_MULTIPLIER = 20
+
+# Recent search results kept per store (identical follow-up queries are common)
+SEARCH_CACHE_SIZE = 64
+
+# Score multipliers for priority document types
+DOC_TYPE_BOOSTS = {
+    'summary': 1.5,
+    'structured_data': 1.3,
+    'tank_summary': 2.0,  # Strong boost for complete tank summaries
+    'tank_data': 1.4,
+}
+ENTITY_BOOST = 3.0  # Very strong boost for exact entity matches
+
 
 class VectorDocumentStore:
     """
@@ -26,6 +43,9 @@ class VectorDocumentStore:
         self.vectorizer = None
         self.document_vectors = None
         self.documents = []
+        self._index_document_fields()
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()  # searches may run on worker threads
         
     def _initialize_vectorizer(self):
         """Initialize TF-IDF vectorizer."""
@@ -39,6 +59,20 @@ class VectorDocumentStore:
             )
             logger.info("✓ TF-IDF vectorizer initialized")
     
+    def _index_document_fields(self):
+        """
+        Precompute the per-document fields re-ranking reads, as parallel arrays.
+        
+        Case-folded texts and type boosts are built once per corpus change
+        instead of once per candidate on every search.
+        """
+        self._texts_lower = [doc['text'].lower() for doc in self.documents]
+        self._texts_upper = [doc['text'].upper() for doc in self.documents]
+        self._type_boosts = np.array(
+            [DOC_TYPE_BOOSTS.get(doc.get('type', 'text'), 1.0) for doc in self.documents],
+            dtype=np.float64
+        )
+    
     def add_documents(self, docs: List[Dict[str, Any]]):
         """
         Add documents and create TF-IDF vectors.
@@ -61,6 +95,8 @@ class VectorDocumentStore:
         
         # Create TF-IDF vectors for all documents
         self.document_vectors = self.vectorizer.fit_transform(all_texts)
+        self._index_document_fields()
+        self._search_cache.clear()
         
         logger.info(f"✓ Added {len(docs)} documents to vector store (total: {len(self.documents)})")
     
@@ -69,13 +105,16 @@ class VectorDocumentStore:
         self.documents = []
         self.document_vectors = None
         self.vectorizer = None
+        self._index_document_fields()
+        self._search_cache.clear()
         logger.info("Vector store cleared")
     
     def semantic_search(
         self,
         query: str,
         top_k: int = 5,
-        keyword_boost: float = 0.3
+        keyword_boost: float = 0.3,
+        candidate_multiplier: int = DEFAULT_CANDIDATE_MULTIPLIER
     ) -> List[Dict[str, Any]]:
         """
         Hybrid search: TF-IDF similarity + keyword matching.
@@ -83,7 +122,15 @@ class VectorDocumentStore:
         Args:
             query: Search query
             top_k: Number of results
-            keyword_boost: Weight for keyword matching (0-1)
+            keyword_boost: Weight for keyword matching (0-1). Scores are
+                (1 - boost) * tfidf + boost * keyword fraction, so at 0 the
+                ranking is pure TF-IDF and at 1 any chunk containing every
+                query word ties regardless of similarity; 0.2-0.4 keeps
+                TF-IDF as the primary signal.
+            candidate_multiplier: TF-IDF candidates re-ranked per result.
+                Lower is faster (re-ranking scans each candidate's text),
+                higher improves recall for entity queries whose best chunks
+                rank low on TF-IDF alone.
             
         Returns:
             List of relevant documents with scores
@@ -91,6 +138,13 @@ class VectorDocumentStore:
         if not self.documents or self.document_vectors is None:
             return []
         
+        cache_key = (query, top_k, keyword_boost, candidate_multiplier)
+        with self._search_cache_lock:
+            cached = self._search_cache.get(cache_key)
+            if cached is not None:
+                self._search_cache.move_to_end(cache_key)
+                return list(cached)
+        
         # Transform query using fitted vectorizer
         query_vector = self.vectorizer.transform([query])
         
@@ -100,11 +154,10 @@ class VectorDocumentStore:
         # Get top candidates (more than needed for re-ranking)
         # Use much larger pool for entity-specific queries (like "HALINI tank")
         # This ensures we don't miss chunks from later pages
-        search_k = min(top_k * 20, len(self.documents))  # Increased to 20x for better coverage
-        top_indices = np.argsort(similarities)[::-1][:search_k]
+        search_k = min(top_k * max(candidate_multiplier, 1), len(self.documents))
+        # Partition out the pool instead of sorting every document; order within it is not needed
+        top_indices = np.argpartition(-similarities, search_k - 1)[:search_k]
         
-        # Collect results with scores
-        results = []
         query_lower = query.lower()
         query_words = set(query_lower.split())
         
@@ -122,55 +175,33 @@ class VectorDocumentStore:
         # Remove duplicates
         entity_names = list(set(entity_names))
         
-        for idx in top_indices:
-            doc = self.documents[idx]
-            
-            # TF-IDF similarity score
-            tfidf_score = similarities[idx]
-            
-            # Keyword score
-            text_lower = doc['text'].lower()
-            keyword_matches = sum(1 for word in query_words if word in text_lower)
-            keyword_score = keyword_matches / max(len(query_words), 1)
-            
-            # Entity boost: if query has specific names (like "HALINI"), strongly boost exact matches
-            entity_boost = 0.0
-            text_upper = doc['text'].upper()
-            for entity in entity_names:
-                if entity in text_upper:
-                    entity_boost = 3.0  # Very strong boost for exact entity matches
-                    logger.debug(f"Entity '{entity}' found in doc, boosting score")
-                    break
-            
-            # Combined score
-            final_score = ((1 - keyword_boost) * tfidf_score + keyword_boost * keyword_score) * (1 + entity_boost)
-            
-            # Boost priority documents
-            doc_type = doc.get('type', 'text')
-            if doc_type == 'summary':
-                final_score *= 1.5
-            elif doc_type == 'structured_data':
-                final_score *= 1.3
-            elif doc_type == 'tank_summary':
-                final_score *= 2.0  # Strong boost for complete tank summaries
-            elif doc_type == 'tank_data':
-                final_score *= 1.4
-            
-            results.append({
-                'document': doc,
-                'score': final_score,
-                'tfidf_score': tfidf_score,
-                'keyword_score': keyword_score
-            })
+        # Keyword score: fraction of query words present in each candidate
+        keyword_scores = np.array(
+            [sum(1 for word in query_words if word in self._texts_lower[idx]) for idx in top_indices],
+            dtype=np.float64
+        ) / max(len(query_words), 1)
+        
+        # Entity boost: if query has specific names (like "HALINI"), strongly boost exact matches
+        entity_hits = np.array(
+            [any(entity in self._texts_upper[idx] for entity in entity_names) for idx in top_indices],
+            dtype=bool
+        )
         
-        # Sort by final score
-        results.sort(key=lambda x: x['score'], reverse=True)
+        # Combined score, then priority document types
+        scores = (1 - keyword_boost) * similarities[top_indices] + keyword_boost * keyword_scores
+        scores *= np.where(entity_hits, 1 + ENTITY_BOOST, 1.0)
+        scores *= self._type_boosts[top_indices]
         
-        # Return top_k documents
-        final_docs = [r['document'] for r in results[:top_k]]
+        # Return top_k documents (stable sort keeps candidate order on ties)
+        ranked = top_indices[np.argsort(-scores, kind='stable')[:top_k]]
+        final_docs = [self.documents[idx] for idx in ranked]
         
         logger.info(f"Found {len(final_docs)} documents (TF-IDF + keyword hybrid)")
-        return final_docs
+        with self._search_cache_lock:
+            self._search_cache[cache_key] = final_docs
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return list(final_docs)
     
     def save(self, filepath: str):
         """
@@ -211,6 +242,8 @@ class VectorDocumentStore:
                 self.documents = data['documents']
                 self.vectorizer = data['vectorizer']
                 self.document_vectors = data['document_vectors']
+            self._index_document_fields()
+            self._search_cache = OrderedDict()
             
             logger.info(f"✓ Vector store loaded from {filepath} ({len(self.documents)} docs)")
             return True